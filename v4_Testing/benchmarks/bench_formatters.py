@@ -0,0 +1,93 @@
+"""
+Throughput benchmark of the file formatters, in records & megabytes per second.
+
+Run from the repo root:
+    python -m v4_Testing.benchmarks.bench_formatters [--records N]
+
+Compares the text formatter of ConfiguredLogger, compiled or not, the
+JSON-lines formatter and a plain json.dumps of a dict per record,
+on the same mix of records.
+"""
+import json
+import time
+import logging
+import argparse
+
+from v4_Testing.log_helper_class import ConfiguredLogger
+from v4_Testing.log_formatters import CompiledFormatter, JsonLinesFormatter
+
+
+class DictJsonFormatter(logging.Formatter):
+    """The usual way of writing JSON logs - a dict per record for json.dumps."""
+
+    def format(self, record):
+        fields = {"time": self.formatTime(record),
+                  "level": record.levelname,
+                  "module": record.module,
+                  "function": record.funcName,
+                  "line": record.lineno,
+                  "message": record.getMessage()}
+        for name in ("wrapped_func", "duration_ns"):
+            if hasattr(record, name):
+                fields[name] = getattr(record, name)
+        return json.dumps(fields)
+
+
+def make_records(number: int) -> list:
+    """
+    Returns records like the ones func_wrapper & a program log:
+    start & end of calls, with the end ones timed, and plain messages.
+    """
+    records = []
+    for num in range(number):
+        kind = num % 3
+        extra = {"wrapped_func": "app.jobs.run_job"}
+        if kind == 0:
+            msg, args = "Starting:\t%s.%s", ("app.jobs", "run_job")
+        elif kind == 1:
+            msg, args = "Ending:\t%s.%s", ("app.jobs", "run_job")
+            extra["duration_ns"] = 1234 + num
+        else:
+            msg, args, extra = "Processed %s rows from %s", (num, "input.csv"), {}
+        record = logging.LogRecord("app", logging.DEBUG, "/src/app/jobs.py", 42,
+                                   msg, args, None, func="run_job")
+        record.__dict__.update(extra)
+        records.append(record)
+    return records
+
+
+def throughput(formatter: logging.Formatter, records: list, repeat: int = 3) -> tuple:
+    """
+    Returns the best records per second & megabytes per second
+    formatting every record - output included as it would be written.
+    """
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = sum(len(formatter.format(record)) + 1 for record in records)
+        best = min(best, time.perf_counter() - started)
+    return len(records) / best, size / best / 1e6
+
+
+def main():
+    """
+    Prints the throughput of every formatter.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    formatters = {"text (log_file_format)": ConfiguredLogger.log_file_format,
+                  "text, compiled": CompiledFormatter.from_formatter(
+                      ConfiguredLogger.log_file_format),
+                  "json.dumps of a dict": DictJsonFormatter(),
+                  "JsonLinesFormatter": JsonLinesFormatter()}
+    for name, formatter in formatters.items():
+        per_second, mb_per_second = throughput(formatter, records)
+        print(f"{name:<26}{per_second:>12,.0f} records/s{mb_per_second:>10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
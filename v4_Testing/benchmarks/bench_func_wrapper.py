@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the func_wrapper overhead against the bare function.
+
+Run from the repo root:
+    python -m v4_Testing.benchmarks.bench_func_wrapper
+"""
+import logging
+import tempfile
+import timeit
+
+from v4_Testing.log_helper_class import ConfiguredLogger
+
+
+def bare(value):
+    """Function being wrapped - as cheap as possible."""
+    return value
+
+
+def time_per_call(func, number: int, repeat: int = 5) -> float:
+    """
+    Returns the best time per call in nanoseconds.
+    """
+    timer = timeit.Timer(lambda: func(1))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def main(number: int = 200_000):
+    """
+    Prints the cost per call of the bare function,
+    then of the wrapped one with DEBUG off and on.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logger_obj = ConfiguredLogger(file_name_in="Bench_Func_Wrapper",
+                                      file_mode="w",
+                                      log_loc=tmp_dir,
+                                      init_console_setup=0)
+        logger_obj.logger.propagate = False
+        wrapped = logger_obj.func_wrapper(bare)
+
+        bare_ns = time_per_call(bare, number)
+        print(f"{'bare function':<24}{bare_ns:>10.1f} ns/call")
+
+        logger_obj.set_file_level(logging.WARNING)
+        off_ns = time_per_call(wrapped, number)
+        print(f"{'wrapped, DEBUG off':<24}{off_ns:>10.1f} ns/call"
+              f"  (+{off_ns - bare_ns:.1f} ns)")
+
+        logger_obj.set_file_level(logging.DEBUG)
+        on_ns = time_per_call(wrapped, number // 20)
+        print(f"{'wrapped, DEBUG on':<24}{on_ns:>10.1f} ns/call"
+              f"  (+{on_ns - bare_ns:.1f} ns)")
+
+        logger_obj.disable_all_logging()
+        logger_obj.logger.propagate = True
+
+
+if __name__ == "__main__":
+    main()
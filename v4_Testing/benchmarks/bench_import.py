@@ -0,0 +1,69 @@
+"""
+Import-time benchmark of log_helper_class, based on 'python -X importtime'.
+
+Run from the repo root:
+    python -m v4_Testing.benchmarks.bench_import [--runs N] [--max-us LIMIT]
+
+With --max-us the script exits with an error when the median import
+time goes over LIMIT microseconds, so it can guard against regressions.
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+MODULE = "v4_Testing.log_helper_class"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_times(module: str = MODULE) -> dict:
+    """
+    Imports 'module' in a fresh interpreter and returns the cumulative
+    import time in microseconds of every module imported along with it.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    # cached bytecode is what users get - do not time compiling the source
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+                            check=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    """
+    Prints the median import time of log_helper_class and of the
+    modules imported directly by it.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-us", type=int, default=None)
+    args = parser.parse_args()
+
+    # first run writes the bytecode cache
+    import_times()
+    runs = [import_times() for _ in range(args.runs)]
+
+    totals = [run[MODULE] for run in runs]
+    median = statistics.median(totals)
+    print(f"{MODULE:<36}{median:>10.0f} us  (min {min(totals)} us, {args.runs} runs)")
+    for name in ("logging", "dataclasses", "v4_Testing.log_handlers", "v4_Testing.call_stats"):
+        found = [run[name] for run in runs if name in run]
+        if found:
+            print(f"  {name:<34}{statistics.median(found):>10.0f} us")
+
+    if args.max_us is not None and median > args.max_us:
+        sys.exit(f"Import time regression: {median:.0f} us > {args.max_us} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Benchmark suite of the hot paths of the logging helper, comparing the
+v1 functions (create_logger & func_wrapper) with the v4 ConfiguredLogger.
+
+Run from the repo root:
+    python -m v4_Testing.benchmarks.bench_suite [--output results.json]
+                                                [--baseline old.json] [--max-slowdown 1.25]
+                                                [--case NAME ...] [--quick]
+
+Each case runs in a fresh interpreter, as v1 configures the root logger
+for the whole process. Results are printed & written as JSON, e.g.
+    {"meta": {...}, "results": [{"case": "func_wrapper", "version": "v4",
+     "variant": "debug_off", "value": 180.2, "unit": "ns/call", "better": "lower"}]}
+With --baseline, results are compared with those of an earlier run, and
+the script exits with an error when any is slower than --max-slowdown times.
+
+Cases:
+    func_wrapper    overhead per call of func_wrapper, DEBUG on & off
+    sinks           records per second through the file & console sinks
+    construction    first logger set up in a process
+    import          import of the module
+    retained        memory per record kept in memory - v1's io.StringIO
+                    buffer, which keeps every record as text, against
+                    v4's flight recorder, which keeps the last records
+                    as they are, up to its capacity
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+import timeit
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CASES = ("func_wrapper", "sinks", "construction", "import", "retained")
+VERSIONS = ("v1", "v4")
+MODULES = {"v1": "v1.log_helper", "v4": "v4_Testing.log_helper_class"}
+
+
+def result(case: str, version: str, variant: str, value: float, unit: str,
+           better: str = "lower") -> dict:
+    return {"case": case, "version": version, "variant": variant,
+            "value": round(value, 3), "unit": unit, "better": better}
+
+
+def best_per_call(func, number: int, repeat: int = 5) -> float:
+    """
+    Returns the best time per call of 'func' in nanoseconds.
+    """
+    return min(timeit.Timer(func).repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def make_v1_logger(log_dir: str) -> logging.Logger:
+    from v1 import log_helper
+
+    logger = log_helper.create_logger(file_name="Bench_Suite", file_mode="w", log_loc=log_dir)
+    logger.propagate = True
+    return logger
+
+
+def make_v4_logger(log_dir: str, **kwargs):
+    from v4_Testing.log_helper_class import ConfiguredLogger
+
+    kwargs.setdefault("init_console_setup", 0)
+    logger_obj = ConfiguredLogger(file_name_in="Bench_Suite", file_mode="w",
+                                  log_loc=log_dir, **kwargs)
+    logger_obj.logger.propagate = False
+    return logger_obj
+
+
+def v1_console(logger: logging.Logger) -> logging.StreamHandler:
+    """
+    Returns the console handler create_logger added.
+    """
+    return next(handler for handler in logger.handlers
+                if isinstance(handler, logging.StreamHandler)
+                and handler.stream is sys.stderr)
+
+
+# =========================================
+# Cases - each run in its own interpreter
+# =========================================
+
+def case_func_wrapper(version: str, log_dir: str, number: int) -> list:
+    """
+    Overhead per call of func_wrapper over the bare function.
+    """
+    def bare(logger, value):
+        return value
+
+    if version == "v1":
+        from v1 import log_helper
+
+        logger = make_v1_logger(log_dir)
+        wrapped = log_helper.func_wrapper(bare)
+        set_debug = lambda on: logging.getLogger().setLevel(
+            logging.DEBUG if on else logging.WARNING)
+        arg = logger
+    else:
+        logger_obj = make_v4_logger(log_dir)
+        wrapped = logger_obj.func_wrapper(bare)
+        set_debug = lambda on: logger_obj.set_file_level(
+            logging.DEBUG if on else logging.WARNING)
+        arg = logger_obj.logger
+
+    bare_ns = best_per_call(lambda: bare(arg, 1), number)
+    set_debug(False)
+    off_ns = best_per_call(lambda: wrapped(arg, 1), number)
+    set_debug(True)
+    on_ns = best_per_call(lambda: wrapped(arg, 1), max(number // 20, 1))
+    return [result("func_wrapper", version, "debug_off", off_ns - bare_ns, "ns/call"),
+            result("func_wrapper", version, "debug_on", on_ns - bare_ns, "ns/call")]
+
+
+def case_sinks(version: str, log_dir: str, number: int) -> list:
+    """
+    Records per second through the file sink, then the console sink.
+    """
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    if version == "v1":
+        logger = make_v1_logger(log_dir)
+        console = v1_console(logger)
+        file_handlers = logging.getLogger().handlers
+    else:
+        logger_obj = make_v4_logger(log_dir, init_console_setup=1)
+        logger = logger_obj.logger
+        console = logger_obj.console_handler
+        file_handlers = [logger_obj.file_handler]
+    console.setStream(devnull)
+
+    def throughput() -> float:
+        started = time.perf_counter()
+        for num in range(number):
+            logger.debug("Processed %s rows from %s", num, "input.csv")
+        for handler in file_handlers:
+            handler.flush()
+        return number / (time.perf_counter() - started)
+
+    file_rate = max(throughput() for _ in range(3))
+    console.setLevel(logging.DEBUG)
+    if version == "v4":
+        logger_obj.refresh_effective_level()
+    both_rate = max(throughput() for _ in range(3))
+    devnull.close()
+    return [result("sinks", version, "file", file_rate, "records/s", "higher"),
+            result("sinks", version, "file_and_console", both_rate, "records/s", "higher")]
+
+
+def case_construction(version: str, log_dir: str, number: int) -> list:
+    """
+    Time to set up the first logger of the process, module already imported.
+    """
+    __import__(MODULES[version])
+    started = time.perf_counter()
+    if version == "v1":
+        make_v1_logger(log_dir)
+    else:
+        make_v4_logger(log_dir)
+    return [result("construction", version, "first", (time.perf_counter() - started) * 1e6,
+                   "us")]
+
+
+def case_import(version: str, log_dir: str, number: int) -> list:
+    """
+    Time to import the module, with what it imports - in an interpreter
+    of its own, as this one already imported logging & more.
+    """
+    code = ("import time\n"
+            "started = time.perf_counter()\n"
+            f"import {MODULES[version]}\n"
+            "print((time.perf_counter() - started) * 1e6)\n")
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    # cached bytecode is what users get - do not time compiling the source
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=log_dir, env=env,
+                               capture_output=True, text=True, check=True)
+    return [result("import", version, "cold", float(completed.stdout), "us")]
+
+
+def case_retained(version: str, log_dir: str, number: int) -> list:
+    """
+    Bytes of memory per record kept in memory after logging 'number' records.
+    """
+    tracemalloc.start()
+    if version == "v1":
+        logger = make_v1_logger(log_dir)
+        logging.getLogger().handlers[0].setLevel(logging.WARNING)
+    else:
+        logger_obj = make_v4_logger(log_dir, file_lvl=logging.WARNING,
+                                    flight_recorder=number)
+        logger = logger_obj.logger
+    logging.getLogger().setLevel(logging.DEBUG)
+    before = tracemalloc.get_traced_memory()[0]
+    for num in range(number):
+        logger.debug("Processed %s rows from %s", num, "input.csv")
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return [result("retained", version, "per_record", retained / number, "bytes")]
+
+
+def run_case(case: str, version: str, quick: bool) -> list:
+    """
+    Runs one case in this interpreter & returns its results.
+    """
+    number = {"func_wrapper": 200_000, "sinks": 20_000, "retained": 20_000}.get(case, 0)
+    if quick:
+        number //= 20
+    with tempfile.TemporaryDirectory() as log_dir:
+        # v1 resolves its default folder at import - keep it out of the repo
+        os.chdir(log_dir)
+        results = globals()[f"case_{case}"](version, log_dir, number)
+        logging.shutdown()
+        os.chdir(REPO_ROOT)
+    return results
+
+
+def run_isolated(case: str, version: str, quick: bool) -> list:
+    """
+    Runs one case in a fresh interpreter & returns its results.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    command = [sys.executable, "-m", "v4_Testing.benchmarks.bench_suite",
+               "--run-case", case, version]
+    if quick:
+        command.append("--quick")
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True,
+                               text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def median_results(runs: list) -> list:
+    """
+    Returns the results of several runs of a case, each the median of the runs.
+    """
+    merged = []
+    for results in zip(*runs):
+        merged.append(dict(results[0],
+                           value=round(statistics.median(item["value"] for item in results), 3)))
+    return merged
+
+
+def compare(results: list, baseline: list, max_slowdown: float) -> list:
+    """
+    Prints how each result changed from 'baseline', returning
+    the ones more than 'max_slowdown' times worse.
+    """
+    old = {(item["case"], item["version"], item["variant"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        before = old.get((item["case"], item["version"], item["variant"]))
+        if before is None or not before["value"] or not item["value"]:
+            continue
+        ratio = item["value"] / before["value"]
+        slowdown = ratio if item["better"] == "lower" else 1 / ratio
+        change = f"x{slowdown:.2f} slower" if slowdown > 1 else f"x{1 / slowdown:.2f} faster"
+        print(f"  {item['case']:<14}{item['version']:<4}{item['variant']:<18}"
+              f"{before['value']:>14,.1f} -> {item['value']:>14,.1f} {item['unit']:<10}{change}")
+        if slowdown > max_slowdown:
+            regressions.append(item)
+    return regressions
+
+
+def main():
+    """
+    Runs the cases, prints & writes the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--case", nargs="*", choices=CASES, default=list(CASES))
+    parser.add_argument("--runs", type=int, default=5,
+                        help="interpreters per case & version, the median kept")
+    parser.add_argument("--output", default=None, help="JSON file to write")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--quick", action="store_true", help="fewer calls & records")
+    parser.add_argument("--run-case", nargs=2, metavar=("CASE", "VERSION"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        # inside the interpreter of one case
+        print(json.dumps(run_case(*args.run_case, args.quick)))
+        return
+
+    results = []
+    for case in args.case:
+        for version in VERSIONS:
+            runs = [run_isolated(case, version, args.quick) for _ in range(args.runs)]
+            for item in median_results(runs):
+                results.append(item)
+                print(f"{item['case']:<14}{item['version']:<4}{item['variant']:<18}"
+                      f"{item['value']:>14,.1f} {item['unit']}")
+
+    report = {"meta": {"python": platform.python_version(),
+                       "implementation": platform.python_implementation(),
+                       "platform": platform.platform(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "runs": args.runs,
+                       "quick": args.quick},
+              "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        print(f"Compared with {args.baseline}:")
+        regressions = compare(results, baseline, args.max_slowdown)
+        if regressions:
+            sys.exit(f"{len(regressions)} results over x{args.max_slowdown} slower")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"Module providing per function bookkeeping for the logging wrappers."
+
+import math
+import time
+import logging
+import threading
+
+# CallMemory objects tracking memory - tracemalloc traces the whole process,
+# so it is only stopped once none is left, and only if started by one of them
+tracing_users = 0
+started_tracing = False
+
+
+class CallSite:
+    """
+    What the wrappers know about a wrapped function,
+    worked out once at decoration time.
+    """
+
+    def __init__(self, func, caller: tuple, sampler=None, timer=None, profiler=None,
+                 memory=None):
+        self.func = func
+        self.module = func.__module__
+        self.name = func.__name__
+        self.qualified_name = f"{self.module}.{self.name}"
+        self.caller = caller
+        self.sampler = sampler
+        self.timer = timer
+        self.profiler = profiler
+        self.memory = memory
+
+        # lowest level any record about a call would be logged at
+        self.min_lvl = logging.INFO if timer is not None else logging.DEBUG
+        if profiler is not None:
+            # profiles dumped to file are kept whatever the log levels,
+            # so the wrappers never skip the bookkeeping of such calls
+            self.min_lvl = math.inf if profiler.dump else logging.INFO
+        if memory is not None:
+            # allocation sites that grew are reported at WARNING
+            self.min_lvl = max(self.min_lvl, logging.WARNING)
+
+
+class PeriodicSummary:
+    """
+    Base for bookkeeping that is summarised every 'summary_interval' seconds.
+    """
+
+    def __init__(self, summary_interval: float = 60.0):
+        self.summary_interval = summary_interval
+        self._summary_at = time.monotonic() + summary_interval
+        self._lock = threading.Lock()
+
+    def summary_due(self) -> bool:
+        """
+        Returns whether 'summary_interval' has passed since the last summary.
+        """
+        now = time.monotonic()
+        if now < self._summary_at:
+            return False
+        self._summary_at = now + self.summary_interval
+        return True
+
+
+class CallSampler(PeriodicSummary):
+    """
+    Decides which calls of a wrapped function get start / end records
+    and counts the ones left out.
+
+    Any combination of the limits can be used - a call is logged
+    only when it passes all of them:
+        sample_every    INT log 1 in every N calls
+        max_per_second  INT log at most N calls each second
+        first_n         INT log only the first N calls
+    """
+
+    def __init__(self, sample_every: int = 0, max_per_second: int = 0,
+                 first_n: int = 0, summary_interval: float = 60.0):
+        super().__init__(summary_interval)
+        self.sample_every = sample_every
+        self.max_per_second = max_per_second
+        self.first_n = first_n
+
+        self.calls = 0
+        self.suppressed = 0
+        self._second = 0
+        self._second_calls = 0
+
+    def should_log(self) -> bool:
+        """
+        Counts a call and returns whether it should be logged.
+        """
+        with self._lock:
+            self.calls += 1
+            if ((self.first_n and self.calls > self.first_n)
+                    or (self.sample_every and (self.calls - 1) % self.sample_every)):
+                self.suppressed += 1
+                return False
+
+            if self.max_per_second:
+                second = int(time.monotonic())
+                if second != self._second:
+                    self._second = second
+                    self._second_calls = 0
+                if self._second_calls >= self.max_per_second:
+                    self.suppressed += 1
+                    return False
+                self._second_calls += 1
+            return True
+
+    def take_suppressed(self) -> int:
+        """
+        Returns the number of calls left out since the last summary.
+        """
+        with self._lock:
+            suppressed, self.suppressed = self.suppressed, 0
+        return suppressed
+
+
+class CallTimer(PeriodicSummary):
+    """
+    Histogram of the call durations of a wrapped function, in nanoseconds.
+
+    Durations are counted in log-linear buckets - 16 per power of two -
+    so percentiles are within about 6% of the real value while memory
+    stays fixed no matter how many calls are timed.
+    """
+
+    SUB_BUCKET_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, summary_interval: float = 60.0):
+        super().__init__(summary_interval)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every duration recorded so far.
+        """
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.buckets = {}
+
+    @classmethod
+    def bucket_index(cls, duration: int) -> int:
+        """
+        Returns the bucket counting 'duration'.
+        """
+        if duration < cls.SUB_BUCKETS:
+            return duration
+        shift = duration.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (shift + 1) * cls.SUB_BUCKETS + (duration >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def bucket_bounds(cls, index: int) -> tuple:
+        """
+        Returns the lowest & highest duration counted by bucket 'index'.
+        """
+        if index < cls.SUB_BUCKETS:
+            return index, index
+        shift = index // cls.SUB_BUCKETS - 1
+        mantissa = index % cls.SUB_BUCKETS + cls.SUB_BUCKETS
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def add(self, duration: int):
+        """
+        Records the duration of one call.
+        """
+        index = self.bucket_index(duration)
+        with self._lock:
+            if not self.count or duration < self.min:
+                self.min = duration
+            if duration > self.max:
+                self.max = duration
+            self.count += 1
+            self.total += duration
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns the duration 'percent' % of the calls took at most.
+        """
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                low, high = self.bucket_bounds(index)
+                return min(max((low + high) // 2, self.min), self.max)
+        return self.max
+
+    def take_summary(self) -> dict:
+        """
+        Returns count, min, max, mean & percentiles of the durations
+        recorded since the last summary, then starts over.
+        Returns None if nothing was recorded.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            summary = {"count": self.count,
+                       "min": self.min,
+                       "max": self.max,
+                       "mean": self.total // self.count}
+            for percent in self.PERCENTILES:
+                summary[f"p{percent}"] = self.percentile(percent)
+            self.reset()
+        return summary
+
+
+class CallProfiler:
+    """
+    Profiles 1 in every 'every' calls of a wrapped function with cProfile,
+    keeping the profiles of the calls slower than 'threshold' seconds:
+        every       INT profile 1 in every N calls
+        threshold   FLOAT seconds a profiled call has to take to be kept
+        top         INT functions listed, by cumulative time
+        dump        BOOL write a '.pstats' file instead of listing them
+
+    Only one call is profiled at a time in the whole process - calls
+    starting while another is profiled are left alone - so nested &
+    concurrent calls never fight over the profiler.
+    """
+
+    # held while any call is profiled
+    active = threading.Lock()
+
+    def __init__(self, every: int, threshold: float = 0.1, top: int = 20,
+                 dump: bool = False):
+        self.every = every
+        self.threshold = int(threshold * 1e9)
+        self.top = top
+        self.dump = dump
+        self.calls = 0
+        self.dumped = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Counts a call and starts profiling it if it is sampled.
+        Returns what 'stop' needs to know about the call, or None
+        when it is not profiled.
+        """
+        with self._lock:
+            self.calls += 1
+            if (self.calls - 1) % self.every:
+                return None
+        if not CallProfiler.active.acquire(blocking=False):
+            return None
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler already running in this process
+            CallProfiler.active.release()
+            return None
+        return profile, time.perf_counter_ns()
+
+    def stop(self, profiling: tuple) -> tuple:
+        """
+        Stops profiling a call, returning how long it took in nanoseconds
+        & its profile - None if it was faster than the threshold.
+        """
+        profile, started = profiling
+        profile.disable()
+        CallProfiler.active.release()
+        duration = time.perf_counter_ns() - started
+        if duration < self.threshold:
+            return duration, None
+        return duration, profile
+
+    def report(self, profile) -> str:
+        """
+        Returns the 'top' functions of a profile by cumulative time.
+        """
+        import io
+        import pstats
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+        return stream.getvalue().strip("\n")
+
+
+class CallMemory:
+    """
+    Memory taken by the calls of a wrapped function, traced with tracemalloc:
+    the bytes each call leaves allocated when it returns (net) and the
+    most it had allocated at once (peak), totalled over the calls.
+        threshold   INT bytes the calls can leave allocated, together,
+                    before the allocation sites that grew are reported -
+                    0 to never report them
+        top         INT allocation sites reported
+
+    tracemalloc is started by the first call tracked - allocations are
+    slower from then on - and traces the whole process, so allocations
+    of other threads running at the same time count as the call's too.
+    It is stopped once every CallMemory that used it stopped tracing,
+    unless it was already running before.
+    """
+
+    # holds the [memory at start, peak] of every call being tracked
+    open_calls = []
+    open_lock = threading.Lock()
+
+    def __init__(self, threshold: int = 1_000_000, top: int = 10):
+        self.threshold = threshold
+        self.top = top
+        self.baseline = None
+        self.growth = 0
+        # whether counted in tracing_users
+        self.tracing = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every call recorded so far.
+        """
+        self.count = 0
+        self.net = 0
+        self.max_net = 0
+        self.max_peak = 0
+
+    @classmethod
+    def update_peaks(cls, tracemalloc) -> int:
+        """
+        Passes the peak since the last update on to every call being tracked,
+        then starts a new peak. Returns the memory traced now.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        for memory in cls.open_calls:
+            memory[1] = max(memory[1], peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def start(self) -> list:
+        """
+        Starts tracking a call, returning what 'stop' needs to know about it.
+        """
+        import tracemalloc
+        global tracing_users, started_tracing
+
+        with CallMemory.open_lock:
+            if not self.tracing:
+                self.tracing = True
+                tracing_users += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            if self.threshold and self.baseline is None:
+                self.baseline = self.take_snapshot()
+            current = self.update_peaks(tracemalloc)
+            memory = [current, current]
+            CallMemory.open_calls.append(memory)
+        return memory
+
+    def stop(self, memory: list):
+        """
+        Stops tracking a call and records its net & peak bytes. Returns the
+        allocation sites that grew the most since the last report when the
+        calls went over the threshold, else None.
+        """
+        import tracemalloc
+
+        with CallMemory.open_lock:
+            if not tracemalloc.is_tracing():
+                # stopped from elsewhere while the call ran
+                CallMemory.open_calls.remove(memory)
+                return None
+            current = self.update_peaks(tracemalloc)
+            CallMemory.open_calls.remove(memory)
+        start, peak = memory
+        net = current - start
+
+        with self._lock:
+            self.count += 1
+            self.net += net
+            self.max_net = max(self.max_net, net)
+            self.max_peak = max(self.max_peak, peak - start)
+            self.growth += net
+            if not self.threshold or self.growth < self.threshold:
+                return None
+            growth, self.growth = self.growth, 0
+            snapshot = self.take_snapshot()
+            baseline, self.baseline = self.baseline, snapshot
+        sites = [stat for stat in snapshot.compare_to(baseline, "lineno")
+                 if stat.size_diff > 0]
+        return growth, sites[:self.top]
+
+    @staticmethod
+    def take_snapshot():
+        import tracemalloc
+
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")))
+
+    def take_summary(self) -> dict:
+        """
+        Returns count, net, max net & max peak bytes of the calls
+        recorded since the last summary, then starts over.
+        Returns None if nothing was recorded.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            summary = {"count": self.count,
+                       "net": self.net,
+                       "mean": self.net // self.count,
+                       "max_net": self.max_net,
+                       "max_peak": self.max_peak}
+            self.reset()
+        return summary
+
+    def stop_tracing(self):
+        """
+        Stops tracking memory, stopping tracemalloc if it was started by
+        a tracked call & no other CallMemory still tracks memory.
+        """
+        import tracemalloc
+        global tracing_users, started_tracing
+
+        with CallMemory.open_lock:
+            if not self.tracing:
+                return
+            self.tracing = False
+            tracing_users -= 1
+            # a later trace cannot be compared with this one
+            self.baseline = None
+            self.growth = 0
+            if started_tracing and not tracing_users and not CallMemory.open_calls:
+                tracemalloc.stop()
+                started_tracing = False
+
+
+def format_duration(duration: int) -> str:
+    """
+    Returns a duration in nanoseconds in the most readable unit.
+    """
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if duration >= scale:
+            return f"{duration / scale:.3g}{unit}"
+    return f"{duration}ns"
+
+
+def format_size(size: int) -> str:
+    """
+    Returns a number of bytes in the most readable unit.
+    """
+    for unit, scale in (("GiB", 1 << 30), ("MiB", 1 << 20), ("KiB", 1 << 10)):
+        if abs(size) >= scale:
+            return f"{size / scale:.3g}{unit}"
+    return f"{size}B"
@@ -0,0 +1,394 @@
+"""
+Compact binary log format, written by log_handlers.BinaryFileHandler.
+
+Decode a file back to the text layout of log_file_format, or to JSON lines:
+    python -m v4_Testing.log_binary FILE [FILE ...] [--json]
+
+A file is a series of entries, each starting with a tag byte:
+    MAGIC       starts a new string table - written every time the file
+                is opened, as appending runs each start their own table
+    STRING      adds the next string to the table: length, UTF-8 bytes
+    RECORD      level & flags bytes, then as varints: time since the
+                previous record in microseconds, IDs in the string table
+                of the message template, logger, path & function, line
+                number & the arguments of the message
+
+Repeated strings - templates like "Starting:\t%s.%s", module & function
+names - are only written once per table, and small numbers take a byte,
+so func_wrapper's records take around 20 bytes instead of a line of text.
+"""
+
+import os
+import sys
+import struct
+import logging
+
+MAGIC = b"\x00LOGBIN2"
+TAG_MAGIC = 0
+TAG_STRING = 1
+TAG_RECORD = 2
+
+FLOAT = struct.Struct("<d")
+
+# record flags
+HAS_EXCEPTION = 1
+HAS_DURATION = 2
+HAS_WRAPPED_FUNC = 4
+MESSAGE_INLINE = 8
+
+# argument types
+ARG_TABLE_STR = 0
+ARG_INLINE_STR = 1
+ARG_INT = 2
+ARG_FLOAT = 3
+ARG_TRUE = 4
+ARG_FALSE = 5
+ARG_NONE = 6
+
+MAX_STRINGS = 1 << 16
+MAX_ARGS = 255
+# longer argument strings are written inline, so unique values
+# like ids or paths do not fill up the string table
+MAX_TABLE_ARG = 64
+MAX_TABLE_MESSAGE = 128
+
+
+def write_varint(out: bytearray, value: int):
+    """
+    Appends a non-negative int, 7 bits a byte, lowest first.
+    """
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_signed(out: bytearray, value: int):
+    """
+    Appends an int of any sign - small ones of either sign stay small.
+    """
+    write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+class BinaryRecordEncoder:
+    """
+    Turns records into the bytes of the binary format,
+    keeping the string table of the file being written.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.last_time = 0
+        # set when the file may lack strings the table holds
+        self.new_table = False
+        self.exception_formatter = logging.Formatter()
+
+    def reset(self):
+        """
+        Forgets the string table - for a newly opened file, after MAGIC.
+        """
+        self.ids.clear()
+        self.last_time = 0
+        self.new_table = False
+
+    def discard(self):
+        """
+        Starts a new table with the next record, as the entries
+        encoded last never made it to the file.
+        """
+        self.new_table = True
+
+    def intern(self, text: str, strings: bytearray) -> int:
+        """
+        Returns the table ID of 'text', adding it to the table first
+        - along with its STRING entry in 'strings' - if it is new.
+        """
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.ids)
+            strings.append(TAG_STRING)
+            self.inline(text, strings)
+        return string_id
+
+    @staticmethod
+    def inline(text: str, out: bytearray):
+        data = text.encode("utf-8", "backslashreplace")
+        write_varint(out, len(data))
+        out += data
+
+    @staticmethod
+    def encodable(args) -> bool:
+        """
+        Returns whether the arguments can be stored as they are,
+        so the decoded message is the same as the logged one.
+        """
+        if not isinstance(args, tuple) or len(args) > MAX_ARGS:
+            return False
+        return all(arg is None or type(arg) in (str, int, float, bool) for arg in args)
+
+    def exception_text(self, record) -> str:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.exception_formatter.formatException(record.exc_info)
+        text = record.exc_text
+        if record.stack_info:
+            stack = self.exception_formatter.formatStack(record.stack_info)
+            text = f"{text}\n{stack}" if text else stack
+        return text
+
+    def encode(self, record) -> bytes:
+        """
+        Returns the entries for 'record' - any new strings, then the record.
+        """
+        args = record.args or ()
+        strings = bytearray()
+        if self.new_table or len(self.ids) + 5 + MAX_ARGS > MAX_STRINGS:
+            # table full or out of step with the file - start a new one
+            self.reset()
+            strings += MAGIC
+
+        exception = self.exception_text(record)
+        duration = getattr(record, "duration_ns", None)
+        wrapped_func = getattr(record, "wrapped_func", None)
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        flags = ((HAS_EXCEPTION if exception else 0)
+                 | (HAS_DURATION if duration is not None else 0)
+                 | (HAS_WRAPPED_FUNC if wrapped_func is not None else 0))
+        if not self.encodable(args) or (not args and len(msg) > MAX_TABLE_MESSAGE):
+            flags |= MESSAGE_INLINE
+
+        out = bytearray((TAG_RECORD, record.levelno & 0xFF, flags))
+        seconds = int(record.created)
+        msecs = int(record.msecs)
+        # the microseconds may round to another millisecond than the record shows
+        micros = min(max(int((record.created - seconds) * 1_000_000), msecs * 1000),
+                     msecs * 1000 + 999)
+        created = seconds * 1_000_000 + micros
+        write_signed(out, created - self.last_time)
+        self.last_time = created
+        write_varint(out, self.intern(record.name, strings))
+        write_varint(out, self.intern(record.pathname or "", strings))
+        write_varint(out, self.intern(record.funcName or "", strings))
+        write_varint(out, record.lineno or 0)
+
+        if flags & MESSAGE_INLINE:
+            self.inline(record.getMessage(), out)
+        else:
+            write_varint(out, self.intern(msg, strings))
+            out.append(len(args))
+            for arg in args:
+                arg_type = type(arg)
+                if arg_type is str:
+                    if len(arg) <= MAX_TABLE_ARG:
+                        out.append(ARG_TABLE_STR)
+                        write_varint(out, self.intern(arg, strings))
+                    else:
+                        out.append(ARG_INLINE_STR)
+                        self.inline(arg, out)
+                elif arg_type is int:
+                    out.append(ARG_INT)
+                    write_signed(out, arg)
+                elif arg_type is bool:
+                    out.append(ARG_TRUE if arg else ARG_FALSE)
+                elif arg_type is float:
+                    out.append(ARG_FLOAT)
+                    out += FLOAT.pack(arg)
+                else:
+                    out.append(ARG_NONE)
+
+        if exception:
+            self.inline(exception, out)
+        if duration is not None:
+            write_signed(out, duration)
+        if wrapped_func is not None:
+            write_varint(out, self.intern(wrapped_func, strings))
+        return bytes(strings + out)
+
+
+class TruncatedEntry(Exception):
+    """Raised when a file ends part way through an entry."""
+
+
+class CorruptEntry(ValueError):
+    """Raised when an entry cannot be decoded."""
+
+
+class BinaryRecordDecoder:
+    """
+    Reads records back from the bytes of the binary format,
+    as logging.LogRecords ready for any formatter.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.pos = 0
+        self.table = []
+        self.last_time = 0
+
+    def take(self, size: int) -> bytes:
+        start = self.pos
+        self.pos += size
+        if self.pos > self.size:
+            raise TruncatedEntry
+        return self.data[start:self.pos]
+
+    def byte(self) -> int:
+        if self.pos >= self.size:
+            raise TruncatedEntry
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def varint(self) -> int:
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def signed(self) -> int:
+        value = self.varint()
+        return -((value + 1) >> 1) if value & 1 else value >> 1
+
+    def inline(self) -> str:
+        return self.take(self.varint()).decode("utf-8", "replace")
+
+    def string(self) -> str:
+        string_id = self.varint()
+        if string_id >= len(self.table):
+            raise CorruptEntry(f"Unknown string ID {string_id} at offset {self.pos}")
+        return self.table[string_id]
+
+    def records(self):
+        """
+        Yields every complete record, stopping at the end
+        of the data or at an entry cut short.
+        An entry that cannot be decoded - left by a failed write - is
+        reported, and decoding goes on from the next string table.
+        """
+        while self.pos < self.size:
+            start = self.pos
+            try:
+                record = self.read_entry()
+            except (TruncatedEntry, CorruptEntry) as err:
+                next_table = self.data.find(MAGIC, start + 1)
+                if isinstance(err, TruncatedEntry) and next_table < 0:
+                    # still being written - or cut short by a crash
+                    self.pos = start
+                    return
+                sys.stderr.write(f"--- Corrupt entry at offset {start}: "
+                                 f"{err or 'cut short'}\n")
+                if next_table < 0:
+                    return
+                self.pos = next_table
+                continue
+            if record is not None:
+                yield record
+
+    def read_entry(self):
+        """
+        Reads one entry, returning the record if it was one.
+        """
+        tag = self.byte()
+        if tag == TAG_MAGIC:
+            if self.take(len(MAGIC) - 1) != MAGIC[1:]:
+                raise CorruptEntry(f"Not a binary log at offset {self.pos - len(MAGIC)}")
+            self.table = []
+            self.last_time = 0
+            return None
+        if tag == TAG_STRING:
+            self.table.append(self.inline())
+            return None
+        if tag != TAG_RECORD:
+            raise CorruptEntry(f"Unknown entry {tag} at offset {self.pos - 1}")
+
+        level = self.byte()
+        flags = self.byte()
+        created = self.last_time + self.signed()
+        self.last_time = created
+        name = self.string()
+        path = self.string()
+        func = self.string()
+        line = self.varint()
+        if flags & MESSAGE_INLINE:
+            msg, args = self.inline(), None
+        else:
+            msg = self.string()
+            args = tuple(self.read_arg() for _ in range(self.byte())) or None
+
+        record = logging.LogRecord(name, level, path, line, msg, args, None,
+                                   func=func or None)
+        record.created = created / 1_000_000
+        record.msecs = (created // 1000) % 1000 + 0.0
+        # not stored - do not report the decoding process instead
+        record.process = record.processName = record.thread = record.threadName = None
+        if flags & HAS_EXCEPTION:
+            record.exc_text = self.inline()
+        if flags & HAS_DURATION:
+            record.duration_ns = self.signed()
+        if flags & HAS_WRAPPED_FUNC:
+            record.wrapped_func = self.string()
+        return record
+
+    def read_arg(self):
+        arg_type = self.byte()
+        if arg_type == ARG_TABLE_STR:
+            return self.string()
+        if arg_type == ARG_INLINE_STR:
+            return self.inline()
+        if arg_type == ARG_INT:
+            return self.signed()
+        if arg_type == ARG_FLOAT:
+            return FLOAT.unpack(self.take(FLOAT.size))[0]
+        if arg_type in (ARG_TRUE, ARG_FALSE):
+            return arg_type == ARG_TRUE
+        return None
+
+
+def read_records(path: str):
+    """
+    Yields the records of a binary log file as logging.LogRecords,
+    mapping the file instead of reading it into memory.
+    """
+    import mmap
+
+    with open(path, "rb") as log_file:
+        if not os.fstat(log_file.fileno()).st_size:
+            return
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from BinaryRecordDecoder(data).records()
+
+
+def main(argv: list = None):
+    """
+    Prints the records of binary log files as text or JSON lines.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Decodes binary log files.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--json", action="store_true",
+                        help="print JSON lines instead of the text layout")
+    args = parser.parse_args(argv)
+
+    if args.json:
+        from v4_Testing.log_formatters import JsonLinesFormatter
+
+        formatter = JsonLinesFormatter()
+    else:
+        from v4_Testing.log_helper_class import ConfiguredLogger
+
+        formatter = ConfiguredLogger.log_file_format
+
+    for path in args.files:
+        for record in read_records(path):
+            try:
+                sys.stdout.write(formatter.format(record) + "\n")
+            except (TypeError, ValueError):
+                # template & arguments that never matched when logged
+                sys.stdout.write(f"{record.msg!r} % {record.args!r}\n")
+
+
+if __name__ == "__main__":
+    main()
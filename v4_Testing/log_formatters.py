@@ -0,0 +1,265 @@
+"Module providing the formatters used by the logging helper."
+# ===========================================================================
+# More information on formatters can be found here:
+#   https://docs.python.org/3/library/logging.html#formatter-objects
+#   https://jsonlines.org/
+# ===========================================================================
+
+import re
+import time
+import logging
+from json.encoder import encode_basestring_ascii
+
+
+class CompiledFormatter(logging.Formatter):
+    """
+    Formatter giving the same output as logging.Formatter for a
+    '%(name)s' style format, only cheaper per record:
+    - the format is compiled once into a function filling in every
+      field with a single '%' operation
+    - 'asctime' is rendered once a minute, with only seconds &
+      milliseconds filled in per record when 'datefmt' has them
+    """
+
+    FIELD_PATTERN = re.compile(r"%%|%\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])")
+    # strftime directives finer than a minute - or too wide to tell
+    SECOND_DIRECTIVES = re.compile(r"%[-#]?[ScsTXrf+]")
+
+    def __init__(self, fmt: str = None, datefmt: str = None):
+        super().__init__(fmt, datefmt)
+        self._time_cache = None
+        self.render = self.compile_format(self._fmt)
+
+    @classmethod
+    def from_formatter(cls, formatter: logging.Formatter) -> logging.Formatter:
+        """
+        Returns a compiled copy of a plain '%' style logging.Formatter,
+        or 'formatter' itself for any other kind of formatter.
+        """
+        # the '{' & '$' styles are subclasses of the '%' one
+        if (type(formatter) is not logging.Formatter
+                or type(formatter._style) is not logging.PercentStyle):
+            return formatter
+        return cls(formatter._fmt, formatter.datefmt)
+
+    def compile_format(self, fmt: str):
+        """
+        Returns a function rendering a record with 'fmt',
+        exception & stack aside.
+        """
+        expressions = []
+
+        def positional(match):
+            name = match.group(1)
+            if name is None:
+                # a literal '%' stays as it is
+                return match.group(0)
+            if name == "asctime":
+                expressions.append("_asctime(record)")
+            elif name == "message":
+                expressions.append("record.getMessage()")
+            else:
+                expressions.append(f"record.{name}")
+            return f"%{match.group(2)}"
+
+        template = self.FIELD_PATTERN.sub(positional, fmt)
+        source = f"def render(record):\n    return _template % ({', '.join(expressions)},)"
+        if not expressions:
+            source = "def render(record):\n    return _template % ()"
+        namespace = {"_template": template, "_asctime": self.cached_asctime}
+        exec(source, namespace)
+        return namespace["render"]
+
+    def cached_asctime(self, record) -> str:
+        """
+        Returns the 'asctime' of the record, rendering the date & time
+        only when the minute changes.
+        """
+        second = int(record.created)
+        cached = self._time_cache
+        if cached is None or not cached[0] <= second < cached[1]:
+            cached = self._time_cache = self.cache_minute(second)
+        start, _, text, with_seconds = cached
+        if with_seconds:
+            return text % (second - start, record.msecs)
+        return text
+
+    def cache_minute(self, second: int) -> tuple:
+        """
+        Returns the start & end of the minute holding 'second' and what
+        asctime is in that minute - with placeholders for seconds
+        & milliseconds when the date format shows them.
+        """
+        local = self.converter(second)
+        minute_start = second - local.tm_sec
+        if self.datefmt is None:
+            # same as logging's default_time_format & default_msec_format
+            prefix = time.strftime("%Y-%m-%d %H:%M:", local).replace("%", "%%")
+            return minute_start, minute_start + 60, prefix + "%02d,%03d", True
+        if self.SECOND_DIRECTIVES.search(self.datefmt):
+            # finer than a minute - render it once a second instead
+            return second, second + 1, time.strftime(self.datefmt, local), False
+        return minute_start, minute_start + 60, time.strftime(self.datefmt, local), False
+
+    def usesTime(self) -> bool:
+        return "%(asctime)" in self._fmt
+
+    def format(self, record) -> str:
+        """
+        Returns the record rendered with the compiled format, followed by
+        any exception & stack like logging.Formatter does.
+        """
+        text = self.render(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if text[-1:] != "\n":
+                text += "\n"
+            text += record.exc_text
+        if record.stack_info:
+            if text[-1:] != "\n":
+                text += "\n"
+            text += self.formatStack(record.stack_info)
+        return text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formatter writing each record as one line of JSON, e.g.
+        {"time":"2024-02-17T23:58:00.123+0100","level":"DEBUG",...}
+
+    The encoder for the chosen 'fields' is generated & compiled once,
+    writing every field straight from the record - there is no dict
+    built per record for json.dumps to walk through.
+
+    Fields, in the order given:
+        time            STR local time with milliseconds & UTC offset
+        level           STR level name
+        logger          STR logger name
+        module          STR module name
+        function        STR function name
+        line            INT line number
+        message         STR message with its arguments filled in
+        process         INT process id
+        thread          STR thread name
+        exception       STR formatted exception, or the deferred traceback
+                        of the record's 'exc_snapshot' - only when there is one
+        wrapped_func    STR 'module.name' of the function func_wrapper
+                        logged the record about - only then
+        duration_ns     INT duration of the call in nanoseconds,
+                        on func_wrapper's end records - only then
+    """
+
+    # field: (expression giving its value, JSON type, left out when None)
+    # - types ending in '?' may be None, written as null
+    FIELDS = {
+        "time": ("self.format_time(record)", "str", False),
+        "level": ("record.levelname", "str", False),
+        "logger": ("record.name", "str", False),
+        "module": ("record.module", "str", False),
+        "function": ("record.funcName", "str?", False),
+        "line": ("record.lineno", "int", False),
+        "message": ("record.getMessage()", "str", False),
+        "process": ("record.process", "int?", False),
+        "thread": ("record.threadName", "str?", False),
+        "exception": ("self.exception_text(record)", "str", True),
+        "wrapped_func": ("getattr(record, 'wrapped_func', None)", "str", True),
+        "duration_ns": ("getattr(record, 'duration_ns', None)", "int", True),
+    }
+    DEFAULT_FIELDS = ("time", "level", "module", "function", "line", "message",
+                      "exception", "wrapped_func", "duration_ns")
+
+    def __init__(self, fields: tuple = DEFAULT_FIELDS):
+        super().__init__()
+        self.check_fields(fields)
+        self.fields = tuple(fields)
+        self._time_cache = None
+        self.encode = self.compile_encoder(self.fields)
+
+    @classmethod
+    def check_fields(cls, fields: tuple):
+        """
+        Raises ValueError if any of 'fields' is not one of FIELDS.
+        """
+        unknown = set(fields) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown JSON fields: {', '.join(sorted(unknown))}")
+
+    def compile_encoder(self, fields: tuple):
+        """
+        Returns a function encoding a record as a JSON object of 'fields'.
+        """
+        # plain types are encoded by the C escape & str directly
+        encoders = {"str": "_escape", "str?": "_str", "int": "str", "int?": "_int"}
+        lines = ["def encode(record):", "    text = ''"]
+        for name in fields:
+            expression, kind, optional = self.FIELDS[name]
+            key = encode_basestring_ascii(name)
+            if optional:
+                lines += [f"    value = {expression}",
+                          "    if value is not None:",
+                          f"        text += ',{key}:' + {encoders[kind]}(value)"]
+            else:
+                lines.append(f"    text += ',{key}:' + {encoders[kind]}({expression})")
+        # every field starts with a comma - drop the first one
+        lines.append("    return '{' + text[1:] + '}'")
+
+        namespace = {"self": self, "_escape": encode_basestring_ascii,
+                     "_str": self.encode_str, "_int": self.encode_int}
+        exec("\n".join(lines), namespace)
+        return namespace["encode"]
+
+    @staticmethod
+    def encode_str(value) -> str:
+        """
+        Returns 'value' as a JSON string, or null.
+        """
+        if value is None:
+            return "null"
+        return encode_basestring_ascii(value if isinstance(value, str) else str(value))
+
+    @staticmethod
+    def encode_int(value) -> str:
+        """
+        Returns 'value' as a JSON number, or null.
+        """
+        if value is None:
+            return "null"
+        return str(int(value))
+
+    def format_time(self, record) -> str:
+        """
+        Returns the ISO 8601 local time of the record, with milliseconds.
+        Everything but the milliseconds is only worked out once a second.
+        """
+        second = int(record.created)
+        cached = self._time_cache
+        if cached is None or cached[0] != second:
+            local = time.localtime(second)
+            cached = (second,
+                      time.strftime("%Y-%m-%dT%H:%M:%S", local),
+                      time.strftime("%z", local))
+            self._time_cache = cached
+        return f"{cached[1]}.{int(record.msecs):03d}{cached[2]}"
+
+    def exception_text(self, record) -> str:
+        """
+        Returns the formatted exception & stack of the record, if any.
+        """
+        snapshot = getattr(record, "exc_snapshot", None)
+        if snapshot is not None:
+            text = str(snapshot)
+        else:
+            if record.exc_info and not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            text = record.exc_text
+        if record.stack_info:
+            stack = self.formatStack(record.stack_info)
+            text = f"{text}\n{stack}" if text else stack
+        return text or None
+
+    def format(self, record) -> str:
+        """
+        Returns the record as one line of JSON.
+        """
+        return self.encode(record)
@@ -0,0 +1,772 @@
+"Module providing the handlers used by the logging helper."
+# ===========================================================================
+# More information on handlers can be found here:
+#   https://docs.python.org/3/library/logging.handlers.html
+#   https://docs.python.org/3/howto/logging-cookbook.html#dealing-with-handlers-that-block
+# ===========================================================================
+
+import os
+import re
+import copy
+import time
+import collections
+import logging
+import threading
+from v4_Testing.log_traceback import TracebackSnapshot
+
+# argument types whose value cannot change once logged
+FROZEN_ARG_TYPES = (str, int, float, bool, bytes, type(None), TracebackSnapshot)
+# attribute set on records dumped by the flight recorder,
+# written whatever the level of the file handler
+DUMPED_MARK = "_log_helper_dumped"
+
+
+def freeze_args(record):
+    """
+    Returns the record if its arguments cannot change any more, else a
+    copy of it with the message filled in now - so a record formatted
+    later shows the arguments as they were when it was logged.
+    """
+    args = record.args
+    if not args or (isinstance(args, tuple)
+                    and all(type(arg) in FROZEN_ARG_TYPES for arg in args)):
+        return record
+    frozen = copy.copy(record)
+    frozen.msg = record.getMessage()
+    frozen.args = None
+    return frozen
+
+
+class LocalQueueHandler(logging.Handler):
+    """
+    Queue handler for a writer thread within the same process,
+    meant to be drained by a FileQueueListener.
+
+    Records are not pickled, so records whose arguments cannot change
+    are left for the writer thread to format. Any other record has its
+    message filled in on the calling thread, as the caller may change
+    the arguments before the writer thread gets to it.
+    """
+
+    def __init__(self, queue):
+        super().__init__()
+        self.queue = queue
+
+    def prepare(self, record):
+        """
+        Returns a shallow copy of the record so other handlers
+        on the calling thread cannot change it while it is queued.
+        """
+        frozen = freeze_args(record)
+        return copy.copy(record) if frozen is record else frozen
+
+    def emit(self, record):
+        """
+        Puts the record on the queue for the writer thread.
+        """
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class FileQueueListener:
+    """
+    Writer thread draining a queue filled by LocalQueueHandler into
+    a handler, like logging.handlers.QueueListener with its handler
+    level respected - but which can be waited on to have written all
+    records queued so far while it keeps running. Also drains the
+    multiprocessing queue worker processes send their records on.
+    """
+
+    # how often a flush checks the writer thread is still running
+    poll_interval = 0.1
+
+    def __init__(self, queue, handler: logging.Handler):
+        self.queue = queue
+        self.handler = handler
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the writer thread.
+        """
+        self.thread = threading.Thread(target=self.monitor, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Writes out the records queued so far then stops the writer thread.
+        """
+        if self.thread is not None:
+            self.queue.put_nowait(None)
+            self.thread.join()
+            self.thread = None
+
+    def flush(self):
+        """
+        Waits until the records queued so far are written.
+        """
+        thread = self.thread
+        if thread is None or thread is threading.current_thread():
+            return
+        done = threading.Event()
+        self.queue.put_nowait(done)
+        # the thread may be stopped before getting to it
+        while not done.wait(self.poll_interval) and thread.is_alive():
+            pass
+
+    def handle(self, record):
+        """
+        Writes the record if at or above the handler level,
+        or dumped by the flight recorder.
+        """
+        if record.levelno >= self.handler.level or getattr(record, DUMPED_MARK, False):
+            self.handler.handle(record)
+
+    def monitor(self):
+        """
+        Writes the queued records until told to stop,
+        waking up anyone waiting for the queue to be drained.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                self.handle(item)
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Handler keeping only the last 'capacity' records in memory - the
+    oldest are dropped as new ones come in, so memory stays bounded
+    however long the program runs.
+
+    Records whose arguments cannot change are kept as they are: formatting
+    is only paid for the ones taken out to be written somewhere.
+    """
+
+    def __init__(self, capacity: int, level: int = logging.DEBUG):
+        super().__init__(level)
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        """
+        Keeps the record, dropping the oldest one when full.
+        """
+        try:
+            self.records.append(freeze_args(record))
+        except Exception:
+            self.handleError(record)
+
+    def take(self) -> list:
+        """
+        Returns the records kept so far, oldest first, and forgets them.
+        """
+        self.acquire()
+        try:
+            records = list(self.records)
+            self.records.clear()
+        finally:
+            self.release()
+        return records
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Logger filter holding back records identical to the one before -
+    same level, template & arguments - so a record repeated over & over
+    is written once, then summed up by a record at its level:
+        Last message repeated N times over T
+    The summary goes to the handlers of 'logger' when a different record
+    comes along, or once 'max_interval' seconds of repeats were held back.
+    Records with an exception are never held back.
+
+    Records are compared as they were when logged - arguments that can
+    change are compared by the message they gave. Only records in a row
+    are coalesced, so the alternating start & end records of a hot
+    wrapped function are not - func_wrapper's sampling options are
+    meant for those.
+    """
+
+    SUMMARY = "Last message repeated %s times over %s"
+
+    def __init__(self, logger: logging.Logger, max_interval: float = 60.0):
+        super().__init__()
+        self.logger = logger
+        self.max_interval = max_interval
+        self.last = None
+        self.last_key = None
+        self.repeats = 0
+        # time of the record the repeats being counted came after
+        self.since = 0.0
+        self.last_repeat = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def repeat_key(record):
+        """
+        Returns what tells the record apart from others as it is now, or
+        None for a record never held back - one with an exception.
+        """
+        if record.exc_info or getattr(record, "exc_snapshot", None) is not None:
+            return None
+        args = record.args
+        if not args or (isinstance(args, tuple)
+                        and all(type(arg) in FROZEN_ARG_TYPES for arg in args)):
+            return record.levelno, record.msg, args
+        try:
+            # arguments that may change before the next record
+            return record.levelno, None, record.getMessage()
+        except Exception:
+            return None
+
+    def is_repeat(self, key) -> bool:
+        if key is None or self.last_key is None:
+            return False
+        try:
+            return bool(key == self.last_key)
+        except Exception:
+            # arguments that cannot tell whether they are equal
+            return False
+
+    def filter(self, record) -> bool:
+        """
+        Returns whether the record is written - not if it is a repeat.
+        """
+        key = self.repeat_key(record)
+        with self._lock:
+            repeat = self.is_repeat(key)
+            if repeat:
+                self.repeats += 1
+                self.last_repeat = record.created
+                if record.created - self.since < self.max_interval:
+                    return False
+            summary = self.take_summary()
+            if not repeat:
+                self.last = record
+                self.last_key = key
+                self.since = record.created
+        if summary is not None:
+            self.logger.callHandlers(summary)
+        return not repeat
+
+    def take_summary(self):
+        """
+        Returns the summary of the repeats held back so far, if any,
+        and starts counting afresh.
+        """
+        if not self.repeats:
+            return None
+        from v4_Testing.call_stats import format_duration
+
+        last = self.last
+        duration = int((self.last_repeat - self.since) * 1e9)
+        summary = self.logger.makeRecord(last.name, last.levelno, last.pathname,
+                                         last.lineno, self.SUMMARY,
+                                         (self.repeats, format_duration(max(duration, 0))),
+                                         None, last.funcName)
+        self.repeats = 0
+        self.since = self.last_repeat
+        return summary
+
+    def flush(self):
+        """
+        Writes the summary of the repeats held back so far, if any.
+        """
+        with self._lock:
+            summary = self.take_summary()
+        if summary is not None:
+            self.logger.callHandlers(summary)
+
+
+class LogFileHandler(logging.FileHandler):
+    """
+    File handler that only creates its file - and folder - once
+    the first record is written to it.
+
+    A '{date}' placeholder in the file name is filled in with the date.
+    With 'daily_rollover' records go to the file of the day they were made,
+    with the end of logs marked in the old file & the start of logs in the
+    new one. Checking for a new day is a single comparison per record.
+
+    With 'max_bytes' the file is moved aside to a numbered segment
+    ('..._name.1.log', '..._name.2.log', ...) once it would grow past
+    roughly that many bytes. 'retention' is a LogRetention compressing
+    those segments & pruning the log folder in the background.
+    """
+
+    DATE_PLACEHOLDER = "{date}"
+
+    def __init__(self, filename, mode="a", encoding=None, delay=True,
+                 errors=None, daily_rollover: bool = False,
+                 max_bytes: int = 0, retention=None):
+        now = time.time()
+        self.name_pattern = os.path.abspath(filename)
+        self.rollover_at = self.next_midnight(now) if daily_rollover else float("inf")
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.written = 0
+        self.rotated = None
+        filename = self.dated_file_name(now)
+        super().__init__(filename, mode=mode, encoding=encoding,
+                         delay=delay, errors=errors)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        stream = super()._open()
+        self.written = stream.seek(0, os.SEEK_END)
+        if self.retention is not None:
+            self.retention.submit(self.rotated, keep=self.baseFilename)
+        self.rotated = None
+        return stream
+
+    def write(self, text: str):
+        """
+        Writes 'text' to the current file, moving the file aside first
+        if 'text' would grow it past 'max_bytes'.
+        """
+        if self.make_room(len(text)):
+            self.write_out(text)
+
+    def make_room(self, size: int) -> bool:
+        """
+        Opens the file if needed, moving it aside first if 'size' more
+        would grow it past 'max_bytes'.
+        Returns False if there is no file to write to anymore.
+        """
+        if self.stream is None:
+            if self.mode.startswith("w") and self._closed:
+                return False
+            self.stream = self._open()
+        if self.max_bytes and self.written and self.written + size > self.max_bytes:
+            self.rotate()
+            self.stream = self._open()
+        return True
+
+    def write_out(self, text: str):
+        """
+        Writes 'text' to the open file.
+        """
+        self.stream.write(text)
+        self.stream.flush()
+        self.written += len(text)
+
+    def rotate(self):
+        """
+        Closes the current file & renames it to the next free segment,
+        leaving compression & pruning to the retention thread
+        once the next file is opened.
+        """
+        stream, self.stream = self.stream, None
+        stream.close()
+
+        root, ext = os.path.splitext(self.baseFilename)
+        segment = 1
+        while (os.path.exists(f"{root}.{segment}{ext}")
+               or os.path.exists(f"{root}.{segment}{ext}.gz")):
+            segment += 1
+        self.rotated = f"{root}.{segment}{ext}"
+        os.replace(self.baseFilename, self.rotated)
+        # the next file is a continuation of this run - never truncate it
+        self.mode = self.mode.replace("w", "a")
+
+    def dated_file_name(self, timestamp: float) -> str:
+        """
+        Returns the file name for records made at 'timestamp'.
+        """
+        return self.name_pattern.replace(self.DATE_PLACEHOLDER,
+                                         time.strftime("%Y-%m-%d", time.localtime(timestamp)))
+
+    @staticmethod
+    def next_midnight(timestamp: float) -> float:
+        """
+        Returns the timestamp of the first local midnight after 'timestamp'.
+        """
+        day = time.localtime(timestamp)
+        return time.mktime((day.tm_year, day.tm_mon, day.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+    def emit(self, record):
+        """
+        Writes the record to the file of the day it was made.
+        """
+        if record.created >= self.rollover_at:
+            self.roll_over(record)
+        try:
+            self.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def roll_over(self, record):
+        """
+        Moves on to the file of the day 'record' was made,
+        marking the end & start of logs in the old & new file.
+        Called with the handler lock held, before 'record' is written.
+        """
+        self.rollover_at = self.next_midnight(record.created)
+        file_name = self.dated_file_name(record.created)
+        if file_name == self.baseFilename:
+            return
+
+        if self.has_output():
+            self.emit_marker(record, "%s Ending of Logs %s")
+        self.flush()
+        if self.stream is not None:
+            stream, self.stream = self.stream, None
+            stream.close()
+
+        self.baseFilename = file_name
+        # never truncate what another run may have written on that day
+        self.mode = self.mode.replace("w", "a")
+        self.emit_marker(record, "%s Starting of Logs %s")
+
+    def has_output(self) -> bool:
+        """
+        Returns whether anything was written to the current file.
+        """
+        return self.stream is not None
+
+    def close(self):
+        """
+        Closes the file, then waits for the retention thread to finish.
+        """
+        super().close()
+        if self.retention is not None:
+            self.retention.close()
+
+    def discard(self):
+        """
+        Closes the handler without writing anything - for a copy
+        inherited by a forked process while the parent writes the file.
+        """
+        self.acquire()
+        try:
+            if self.stream is not None:
+                # records are flushed as they are written, nothing is pending
+                stream, self.stream = self.stream, None
+                stream.close()
+            # the parent keeps the folder tidy
+            self.retention = None
+        finally:
+            self.release()
+        logging.Handler.close(self)
+
+    def emit_marker(self, record, msg: str):
+        """
+        Writes a marker record like the ones marking the start
+        & end of logs, if DEBUG records are written at all.
+        """
+        if self.level <= logging.DEBUG:
+            marker = logging.LogRecord(record.name, logging.DEBUG, __file__,
+                                       self.roll_over.__code__.co_firstlineno,
+                                       msg, ("=" * 3, "=" * 3), None,
+                                       func="roll_over")
+            marker.created = record.created
+            marker.msecs = record.msecs
+            self.emit(marker)
+
+
+class BinaryFileHandler(LogFileHandler):
+    """
+    File handler writing records in the compact binary format of
+    log_binary, with repeated strings kept in a string table.
+
+    Every time the file is opened - first record, rotation, rollover
+    or appending to an earlier run's file - a new table is started,
+    so each part of the file can be decoded on its own.
+    """
+
+    def __init__(self, filename, mode="a", delay=True,
+                 daily_rollover: bool = False, max_bytes: int = 0, retention=None):
+        from v4_Testing.log_binary import BinaryRecordEncoder
+
+        self.encoder = BinaryRecordEncoder()
+        self.opened = 0
+        super().__init__(filename, mode=mode.replace("b", "") + "b", delay=delay,
+                         daily_rollover=daily_rollover, max_bytes=max_bytes,
+                         retention=retention)
+
+    def _open(self):
+        from v4_Testing.log_binary import MAGIC
+
+        stream = super()._open()
+        self.encoder.reset()
+        self.opened += 1
+        stream.write(MAGIC)
+        self.written += len(MAGIC)
+        return stream
+
+    def emit(self, record):
+        """
+        Writes the record to the file of the day it was made.
+        """
+        if record.created >= self.rollover_at:
+            self.roll_over(record)
+        try:
+            opened = self.opened
+            data = self.encoder.encode(record)
+            if not self.make_room(len(data)):
+                return
+            if self.opened != opened:
+                # encoded against the string table of the file before
+                data = self.encoder.encode(record)
+            self.write_out(data)
+        except RecursionError:
+            raise
+        except Exception:
+            # strings added to the table may not be in the file
+            self.encoder.discard()
+            self.handleError(record)
+
+
+class BufferedFileHandler(LogFileHandler):
+    """
+    File handler collecting formatted records in memory and writing
+    them in large chunks instead of one write per record.
+
+    The buffer is written when it holds 'buffer_size' characters,
+    when 'flush_interval' seconds have passed since the last write,
+    or straight away for records at 'flush_level' or above.
+    """
+
+    def __init__(self, filename, mode="a", encoding=None, delay=True,
+                 errors=None, daily_rollover: bool = False,
+                 max_bytes: int = 0, retention=None,
+                 buffer_size: int = 64 * 1024, flush_interval: float = 1.0,
+                 flush_level: int = logging.ERROR):
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._flush_at = time.monotonic() + flush_interval
+        self._stop_flusher = threading.Event()
+        self._flusher = None
+        super().__init__(filename, mode=mode, encoding=encoding,
+                         delay=delay, errors=errors, daily_rollover=daily_rollover,
+                         max_bytes=max_bytes, retention=retention)
+
+    def emit(self, record):
+        """
+        Formats the record into the buffer, writing the buffer
+        out once one of the flush conditions is hit.
+        """
+        if record.created >= self.rollover_at:
+            self.roll_over(record)
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+
+        self.buffer.append(msg)
+        self.buffered += len(msg)
+        if (record.levelno >= self.flush_level
+                or self.buffered >= self.buffer_size
+                or time.monotonic() >= self._flush_at):
+            self.flush()
+        elif self._flusher is None:
+            self.start_flusher()
+
+    def has_output(self) -> bool:
+        """
+        Returns whether anything was written or buffered for the current file.
+        """
+        return bool(self.buffer) or super().has_output()
+
+    def flush(self):
+        """
+        Writes everything buffered so far to file in a single write.
+        """
+        self.acquire()
+        try:
+            if self.buffer:
+                self.write("".join(self.buffer))
+                self.buffer.clear()
+                self.buffered = 0
+            self._flush_at = time.monotonic() + self.flush_interval
+        finally:
+            self.release()
+
+    def start_flusher(self):
+        """
+        Starts the thread writing out the buffer every 'flush_interval'
+        seconds, so quiet periods do not leave records in memory.
+        """
+        self._stop_flusher.clear()
+        self._flusher = threading.Thread(target=self._flush_periodically,
+                                         name="BufferedFileHandler-flush",
+                                         daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self.flush_interval):
+            self.flush()
+
+    def discard(self):
+        """
+        Drops the buffer, then closes the handler without writing anything.
+        """
+        self.acquire()
+        try:
+            self.buffer.clear()
+            self.buffered = 0
+            # the flush thread was not copied by fork
+            self._flusher = None
+        finally:
+            self.release()
+        super().discard()
+
+    def close(self):
+        """
+        Stops the flush thread & writes out the buffer before closing.
+        """
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._stop_flusher.set()
+            if flusher is not threading.current_thread():
+                flusher.join()
+        self.flush()
+        super().close()
+
+
+class LogRetention:
+    """
+    Background thread keeping a log folder within its limits, so
+    compressing & deleting files never holds up the logging thread.
+
+    Rotated segments handed to 'submit' are gzip-compressed, then the
+    oldest log files of 'log_dir' - text or binary, compressed or not -
+    are deleted until
+    all limits that are set are met:
+        max_files       INT number of log files kept
+        max_age_days    FLOAT age of the oldest log file kept
+        max_total_bytes INT size of all log files kept together
+    """
+
+    SEGMENT_PATTERN = r"\.\d+\.logb?$"
+    LOG_EXTENSIONS = (".log", ".log.gz", ".logb", ".logb.gz")
+
+    def __init__(self, log_dir: str, max_files: int = 0, max_age_days: float = 0,
+                 max_total_bytes: int = 0, compress: bool = True):
+        # absolute, as the file being written to is compared by its full path
+        self.log_dir = os.path.abspath(log_dir)
+        self.max_files = max_files
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.compress = compress
+        self.jobs = None
+        self.leftovers_checked = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, segment: str = None, keep: str = None):
+        """
+        Asks the retention thread to compress 'segment' if given,
+        then to prune the log folder - never deleting 'keep'.
+        """
+        with self._lock:
+            if self._thread is None:
+                import queue
+
+                self.jobs = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._run,
+                                                name="LogRetention",
+                                                daemon=True)
+                self._thread.start()
+            self.jobs.put((segment, keep))
+
+    def close(self):
+        """
+        Waits for every job submitted so far, then stops the thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self.jobs.put(None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            segment, keep = job
+            try:
+                if segment is not None and self.compress:
+                    self.compress_file(segment)
+                self.prune(keep)
+            except OSError:
+                # another process may be tidying the same folder
+                continue
+
+    @staticmethod
+    def compress_file(path: str):
+        """
+        Replaces 'path' with a gzip-compressed copy named 'path.gz'.
+        """
+        import gzip
+        import shutil
+
+        if not os.path.exists(path):
+            # already compressed as a leftover
+            return
+
+        with open(path, "rb") as source, gzip.open(f"{path}.gz.tmp", "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.replace(f"{path}.gz.tmp", f"{path}.gz")
+        os.remove(path)
+
+    def log_files(self) -> list:
+        """
+        Returns (modified time, size, path) of every log file in the folder,
+        oldest first.
+        """
+        files = []
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.LOG_EXTENSIONS):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, os.path.abspath(entry.path)))
+        return sorted(files)
+
+    def prune(self, keep: str = None):
+        """
+        Compresses segments left over by earlier runs the first time,
+        then deletes the oldest log files until the folder is within its limits.
+        """
+        if not os.path.isdir(self.log_dir):
+            return
+        files = self.log_files()
+        if self.compress and not self.leftovers_checked:
+            self.leftovers_checked = True
+            leftovers = [path for _, _, path in files if re.search(self.SEGMENT_PATTERN, path)]
+            for path in leftovers:
+                self.compress_file(path)
+            if leftovers:
+                files = self.log_files()
+
+        if keep is not None:
+            keep = os.path.abspath(keep)
+        files = [file for file in files if file[2] != keep]
+        count = len(files)
+        total = sum(size for _, size, _ in files)
+        if keep is not None and os.path.exists(keep):
+            count += 1
+            total += os.path.getsize(keep)
+        oldest_kept = time.time() - self.max_age_days * 86400
+
+        for mtime, size, path in files:
+            if not ((self.max_files and count > self.max_files)
+                    or (self.max_age_days and mtime < oldest_kept)
+                    or (self.max_total_bytes and total > self.max_total_bytes)):
+                break
+            os.remove(path)
+            count -= 1
+            total -= size
@@ -7,18 +7,121 @@
 # ===========================================================================
 
 import os
+import sys
+import time
+import atexit
+import threading
 import logging
+import inspect
+import weakref
 import functools
-from datetime import date
+import collections
 from dataclasses import dataclass
-import traceback
 
-import pprint
-pp = pprint.PrettyPrinter(indent=4)
+from v4_Testing.log_handlers import (LocalQueueHandler, FileQueueListener, LogFileHandler,
+                                    BufferedFileHandler, BinaryFileHandler, LogRetention,
+                                    RingBufferHandler, RepeatFilter, DUMPED_MARK)
+from v4_Testing.call_stats import (CallSite, CallSampler, CallTimer, CallProfiler,
+                                   CallMemory, format_duration, format_size)
 
-today = date.today()
+# nothing in here should touch the disk or build loggers on import:
+# files & handlers are only set up once a ConfiguredLogger is created
 ConfiguredLoggingObject = logging.Logger
 
+# set to the pid of the process writing the log file for its worker
+# processes - inherited by the workers, whether forked or spawned,
+# but also by any other program that process starts
+PROCESS_LISTENER_ENV = "LOG_HELPER_PROCESS_LISTENER"
+
+# queue handed over by configure_worker in a worker process
+worker_queue = None
+# most records a worker holds until configure_worker hands over the queue,
+# the oldest dropped first
+MAX_HELD_RECORDS = 10_000
+
+# attribute set on exceptions log_exception has logged, so an exception
+# going up through nested wrappers is only logged by the first one
+LOGGED_MARK = "_log_helper_logged"
+# logged exceptions that refuse the attribute, by id - weakly referenced
+# when they allow it, the oldest forgotten first
+unmarkable_exceptions = collections.OrderedDict()
+MAX_UNMARKABLE = 256
+
+
+def in_worker_process() -> bool:
+    """
+    Returns whether this process sends its file records to the
+    process listener of a parent process instead of writing them.
+    """
+    if worker_queue is not None:
+        return True
+    listener_pid = os.environ.get(PROCESS_LISTENER_ENV)
+    if listener_pid is None:
+        return False
+    # only a child multiprocessing started in the listening process is a
+    # worker - not any other program that inherited the variable
+    multiprocessing = sys.modules.get("multiprocessing")
+    parent = multiprocessing.parent_process() if multiprocessing is not None else None
+    return parent is not None and str(parent.pid) == listener_pid
+
+
+def configure_worker(log_queue) -> None:
+    """
+    Initializer for worker processes - sends the file records of every
+    ConfiguredLogger in the worker, built before or after this call,
+    to 'log_queue' as returned by ConfiguredLogger.start_process_listener:
+        ProcessPoolExecutor(initializer=configure_worker, initargs=(log_queue,))
+    """
+    global worker_queue
+    worker_queue = log_queue
+    for logger_obj in list(ConfiguredLogger.instances.values()):
+        logger_obj.use_worker_queue(log_queue)
+
+
+def mark_logged(err: BaseException) -> bool:
+    """
+    Marks 'err' as logged & returns whether it was not logged before.
+    Nothing is kept per exception beyond the mark on the exception itself,
+    bar the last few exceptions that cannot be marked.
+    """
+    try:
+        if getattr(err, LOGGED_MARK, False):
+            return False
+        setattr(err, LOGGED_MARK, True)
+        return True
+    except (AttributeError, TypeError):
+        pass
+
+    key = id(err)
+    # ids are reused once an exception is gone - check it is the same one
+    ref = unmarkable_exceptions.get(key)
+    if ref is not None and ref() is err:
+        unmarkable_exceptions.move_to_end(key)
+        return False
+    try:
+        ref = weakref.ref(err)
+    except TypeError:
+        # no weak references either - kept alive until forgotten
+        def ref():
+            return err
+    unmarkable_exceptions[key] = ref
+    unmarkable_exceptions.move_to_end(key)
+    if len(unmarkable_exceptions) > MAX_UNMARKABLE:
+        unmarkable_exceptions.popitem(last=False)
+    return True
+
+
+def get_caller_info(func) -> tuple:
+    """
+    Returns the (path name, line number, function name) records about
+    'func' should report, worked out from its code object.
+    Returns None if 'func' has no code object (builtins, partials, ...).
+    """
+    code = getattr(inspect.unwrap(func), "__code__", None)
+    if code is None:
+        return None
+    return code.co_filename, code.co_firstlineno, code.co_name
+
 
 # ===========================================================================
 # https://docs.python.org/3.12/howto/logging-cookbook.html#how-to-treat-a-logger-like-an-output-stream
@@ -33,10 +136,9 @@ class ConfiguredLogger:
     # file_name_in: str = "Test_File_As_Class"
     file_name_in: str
     file_mode: str = "a"
-    log_loc: str = f"{os.getcwd()}/logs"
+    log_loc: str = None     # defaults to the logs folder of the working directory
     datefmt: str = "%Y-%m-%d %H:%M"
 
-    new_exception: int = 0
     fresh_start: int = 1
 
     init_file_setup: int = 1
@@ -49,6 +151,74 @@ class ConfiguredLogger:
     console_lvl: int = logging.WARNING
     console_format: str = logging.Formatter("%(asctime)s [%(levelname)-8s] %(message)s\n")
 
+    # when set, file records are queued & written by a dedicated thread
+    use_queue: bool = False
+
+    # when set, records go to the file of the day they were made
+    daily_rollover: bool = True
+
+    # when set, the log file is moved aside to a gzip-compressed segment
+    # once it grows past roughly this many bytes
+    max_bytes: int = 0
+    # when set, the oldest files in log_loc are deleted to stay within these
+    # limits - note this counts the files of every logger sharing log_loc
+    max_files: int = 0
+    max_age_days: float = 0
+    max_total_bytes: int = 0
+
+    # when set, the file is written in the compact binary format of log_binary
+    # - '.logb' instead of '.log', decoded with 'python -m v4_Testing.log_binary'
+    binary_format: bool = False
+
+    # when set, text file records are written in chunks of roughly this many bytes
+    buffer_size: int = 0
+    flush_interval: float = 1.0
+
+    # when set, the file gets one JSON object per record instead of
+    # log_file_format - see log_formatters.JsonLinesFormatter.
+    # json_fields are the fields written, in order - its defaults when None
+    json_lines: bool = False
+    json_fields: tuple = None
+
+    # when set, log_file_format & console_format are compiled once into a
+    # faster formatter with the same output - see log_formatters.CompiledFormatter
+    compiled_formats: bool = False
+
+    # when set, the last this many records are kept in memory at DEBUG
+    # level & written to file just before the traceback of an exception,
+    # so file_lvl can stay at WARNING without losing the context
+    flight_recorder: int = 0
+
+    # when set, the traceback of an exception caught by the wrappers is only
+    # snapshotted where it is caught, & rendered when its record is written,
+    # with repeated frames collapsed - see log_traceback.TracebackSnapshot.
+    # traceback_locals caps the repr of each local variable shown in it,
+    # 0 leaving locals out
+    deferred_traceback: bool = False
+    traceback_locals: int = 0
+
+    # when set, records identical to the one before - same level, template
+    # & arguments - are held back & summed up as "Last message repeated
+    # N times over T" once a different record comes or coalesce_interval passes
+    coalesce_repeats: bool = False
+    coalesce_interval: float = 60.0
+
+    # when set, an email is sent to these addresses from a background thread
+    # when func_wrapper asks for a log review & when sol_wrapper ends the run,
+    # attaching the log of the current run - or with email_content="errors"
+    # only its ERROR records & worse. email_settings are passed on to
+    # log_mailer.LogMailer, e.g. host, port, smtp_factory or batch_interval.
+    # Emails still queued when the program exits are given at most
+    # email_exit_timeout seconds to go out - nothing else waits on them
+    email_to: tuple = ()
+    email_from: str = "log_helper@localhost"
+    email_content: str = "run"
+    email_settings: dict = None
+    email_exit_timeout: float = 5.0
+
+    # every instance in this process - re-pointed by configure_worker
+    instances = weakref.WeakValueDictionary()
+
     # TODO: write class input that will trigger enabling of logs after creation
 
     # logging levels:  https://docs.python.org/3/library/logging.html#logging-levels
@@ -59,11 +229,32 @@ class ConfiguredLogger:
         formatting for file and console needs.
         """
 
-        self.file_name_out: str = f"{self.log_loc}/{today}_{self.file_name_in}.log"
+        if self.json_fields is not None:
+            from v4_Testing.log_formatters import JsonLinesFormatter
 
-        # if file for writing logs does not exist, create it
-        if not os.path.exists(self.log_loc):
-            os.makedirs(self.log_loc)
+            JsonLinesFormatter.check_fields(self.json_fields)
+
+        if self.log_loc is None:
+            self.log_loc = f"{os.getcwd()}/logs"
+        extension = "logb" if self.binary_format else "log"
+        self.file_name_pattern: str = f"{self.log_loc}/{{date}}_{self.file_name_in}.{extension}"
+        self.file_handler = None
+        self.file_sink = None
+        self.console_handler = None
+        self.flight_handler = None
+        self.queue_listener = None
+        # the writer thread is started & stopped from any thread
+        self.queue_lock = threading.Lock()
+        self.process_queue = None
+        self.process_listener = None
+        self.mailer = None
+        self.repeat_filter = None
+        self.worker: bool = in_worker_process()
+        self.effective_lvl: int = logging.NOTSET
+        self.call_sites: list = []
+        ConfiguredLogger.instances[id(self)] = self
+        if self.use_queue:
+            atexit.register(self.stop_file_queue)
 
         self.logger = logging.getLogger(__name__)    # root logger from main script
         self.logger.setLevel(logging.DEBUG)
@@ -74,9 +265,29 @@ class ConfiguredLogger:
         if self.init_console_setup:
             self.setup_console_logging()
 
+        if self.flight_recorder:
+            self.setup_flight_recorder()
+
+        if self.coalesce_repeats:
+            self.setup_repeat_filter()
+
+        if self.email_to and not self.worker:
+            self.setup_email()
+
+        self.refresh_effective_level()
         self.logger.info("Logging setup!")
 
 
+    @property
+    def file_name_out(self) -> str:
+        """
+        Path of the log file records are currently written to.
+        """
+        if self.file_handler is not None:
+            return self.file_handler.baseFilename
+        return self.file_name_pattern.replace("{date}", time.strftime("%Y-%m-%d"))
+
+
     def __enter__(self):
         """
         Allows for use of 'with' statement.
@@ -110,6 +321,10 @@ class ConfiguredLogger:
         """
         Setup logging to console.
         """
+        if self.compiled_formats:
+            from v4_Testing.log_formatters import CompiledFormatter
+
+            self.console_format = CompiledFormatter.from_formatter(self.console_format)
         self.console_handler = logging.StreamHandler()
         self.console_handler.setLevel(self.console_lvl)
         self.console_handler.setFormatter(self.console_format)
@@ -121,13 +336,165 @@ class ConfiguredLogger:
         """
         Setup logging to file.
         """
-        self.file_handler = logging.FileHandler(self.file_name_out, mode=self.file_mode)
+        retention = None
+        if self.max_bytes or self.max_files or self.max_age_days or self.max_total_bytes:
+            retention = LogRetention(self.log_loc,
+                                     max_files=self.max_files,
+                                     max_age_days=self.max_age_days,
+                                     max_total_bytes=self.max_total_bytes)
+
+        if self.binary_format:
+            self.file_handler = BinaryFileHandler(self.file_name_pattern,
+                                                  mode=self.file_mode,
+                                                  daily_rollover=self.daily_rollover,
+                                                  max_bytes=self.max_bytes,
+                                                  retention=retention)
+        elif self.buffer_size:
+            self.file_handler = BufferedFileHandler(self.file_name_pattern,
+                                                    mode=self.file_mode,
+                                                    daily_rollover=self.daily_rollover,
+                                                    max_bytes=self.max_bytes,
+                                                    retention=retention,
+                                                    buffer_size=self.buffer_size,
+                                                    flush_interval=self.flush_interval)
+        else:
+            self.file_handler = LogFileHandler(self.file_name_pattern,
+                                               mode=self.file_mode,
+                                               daily_rollover=self.daily_rollover,
+                                               max_bytes=self.max_bytes,
+                                               retention=retention)
+        if self.json_lines:
+            from v4_Testing.log_formatters import JsonLinesFormatter
+
+            self.log_file_format = JsonLinesFormatter(self.json_fields
+                                                      or JsonLinesFormatter.DEFAULT_FIELDS)
+        elif self.compiled_formats:
+            from v4_Testing.log_formatters import CompiledFormatter
+
+            self.log_file_format = CompiledFormatter.from_formatter(self.log_file_format)
         self.file_handler.setLevel(self.file_lvl)
         self.file_handler.setFormatter(self.log_file_format)
+
+        # handler attached to the logger for file output
+        self.file_sink = self.file_handler
+        if self.worker:
+            self.file_sink = self.make_worker_sink()
+        elif self.use_queue:
+            import queue
+
+            self.stop_file_queue()
+            self.queue_handler = LocalQueueHandler(queue.SimpleQueue())
+            self.queue_handler.setLevel(self.file_lvl)
+            self.file_sink = self.queue_handler
+
         self.enable_file_logging()
         self.logger.info("File logging setup")
 
 
+    def setup_flight_recorder(self):
+        """
+        Setup keeping the last 'flight_recorder' records in memory.
+        """
+        self.flight_handler = RingBufferHandler(self.flight_recorder)
+        self.logger.addHandler(self.flight_handler)
+        self.refresh_effective_level()
+        self.logger.info("Flight recorder setup")
+
+
+    def setup_repeat_filter(self):
+        """
+        Setup holding back repeated records in front of every handler.
+        """
+        self.repeat_filter = RepeatFilter(self.logger, self.coalesce_interval)
+        self.logger.addFilter(self.repeat_filter)
+        self.logger.info("Repeat coalescing setup")
+
+
+    def setup_email(self):
+        """
+        Setup emailing the logs from a background thread.
+        """
+        from v4_Testing.log_mailer import LogMailer
+
+        self.mailer = LogMailer(self.email_to, self.email_from,
+                                **(self.email_settings or {}))
+        atexit.register(self.stop_email)
+        self.logger.info("Email setup")
+
+
+    def email_logs(self, subject: str, body: str = "", key=None):
+        """
+        Queues an email with the log of the current run attached -
+        read & sent by the mail thread, so this never blocks.
+        Alerts with the same 'key' are only sent once in a while.
+        """
+        if self.mailer is None:
+            return
+        path = self.file_name_out
+        body = f"{body}\nLog file:\n{path}".lstrip()
+        self.mailer.submit(subject, body,
+                           functools.partial(self.read_run_log, path),
+                           key=key)
+
+
+    def read_run_log(self, path: str) -> list:
+        """
+        Returns the (file name, bytes) to attach for the current
+        run of log file 'path', as set by email_content.
+        Binary files are attached whole.
+        """
+        name = os.path.basename(path)
+        if self.binary_format:
+            with open(path, "rb") as log_file:
+                return [(name, log_file.read())]
+
+        from v4_Testing.log_query import LogReader
+
+        errors_only = self.email_content == "errors"
+        with LogReader(path) as reader:
+            if not reader.runs:
+                return []
+            texts = [record.text for record in reader.records(-1)
+                     if not errors_only or record.levelno >= logging.ERROR]
+        if errors_only:
+            root, extension = os.path.splitext(name)
+            name = f"{root}_errors{extension}"
+        return [(name, "\n".join(texts).encode("utf-8") + b"\n")]
+
+
+    def stop_email(self):
+        """
+        Sends any email still queued, waiting at most email_exit_timeout
+        seconds for it - run at exit, after which no more emails are sent.
+        """
+        if self.mailer is not None:
+            self.mailer.close(self.email_exit_timeout)
+
+
+    def dump_flight_recorder(self):
+        """
+        Writes the records kept in memory that were below the file level,
+        after a marker, then starts recording afresh.
+        They go the way of any file record - through the writer thread,
+        or to the parent of a worker - after the ones logged before,
+        marked to be written whatever the file level.
+        """
+        if self.flight_handler is None or self.file_handler is None:
+            return
+        records = [record for record in self.flight_handler.take()
+                   if record.levelno < self.file_lvl]
+        if not records:
+            return
+
+        path_name, line_no, func_name = get_caller_info(self.dump_flight_recorder)
+        marker = logging.LogRecord(self.logger.name, logging.DEBUG, path_name, line_no,
+                                   "%s Last %s records before the exception %s",
+                                   ('='*3, len(records), '='*3), None, func=func_name)
+        for record in [marker, *records]:
+            setattr(record, DUMPED_MARK, True)
+            self.file_sink.handle(record)
+
+
     # def enable_console_logging(self, program_start: int = 1):
     def enable_console_logging(self):
         """
@@ -136,6 +503,7 @@ class ConfiguredLogger:
 
         if self.console_handler not in self.logger.handlers:
             self.logger.addHandler(self.console_handler)
+            self.refresh_effective_level()
             self.logger.debug("Console logging enabled")
 
 
@@ -144,10 +512,13 @@ class ConfiguredLogger:
         Setup logging to file.
         """
 
-        if self.file_handler not in self.logger.handlers:
-            self.logger.addHandler(self.file_handler)
-            self.logger.debug("%s Starting of Logs %s",
-                                '='*3, '='*3)
+        if self.file_sink not in self.logger.handlers:
+            self.start_file_queue()
+            self.logger.addHandler(self.file_sink)
+            self.refresh_effective_level()
+            if not self.worker:
+                self.logger.debug("%s Starting of Logs %s",
+                                    '='*3, '='*3)
             self.logger.debug("File logging enabled")
 
 
@@ -158,6 +529,7 @@ class ConfiguredLogger:
 
         if self.console_handler in self.logger.handlers:
             self.logger.removeHandler(self.console_handler)
+            self.refresh_effective_level()
             if self.logger.handlers:
                 self.logger.debug("Console logging disabled")
 
@@ -167,86 +539,746 @@ class ConfiguredLogger:
         Disable logging to file.
         """
 
-        if self.file_handler in self.logger.handlers:
-            self.logger.removeHandler(self.file_handler)
+        if self.file_sink in self.logger.handlers:
+            self.logger.removeHandler(self.file_sink)
+            self.refresh_effective_level()
             if self.logger.handlers:
                 self.logger.debug("File logging disabled")
+            self.stop_file_queue()
 
 
     def disable_all_logging(self):
         """
         Disables all logging - file and console.
         """
-        if self.file_handler in self.logger.handlers:
+        self.log_call_summaries()
+        for site in self.call_sites:
+            if site.memory is not None:
+                site.memory.stop_tracing()
+        if self.repeat_filter is not None:
+            self.repeat_filter.flush()
+            self.logger.removeFilter(self.repeat_filter)
+        self.stop_process_listener()
+        if self.file_sink in self.logger.handlers:
             self.logger.debug("Disabling all logging ...")
-            self.logger.debug("%s Ending of Logs %s",
-                              '='*3, '='*3)
+            if not self.worker:
+                self.logger.debug("%s Ending of Logs %s",
+                                  '='*3, '='*3)
+        self.write_held_records()
         for handler in self.logger.handlers[:]:
             handler.close()
             self.logger.removeHandler(handler)
+        self.refresh_effective_level()
+        self.stop_file_queue()
+        if self.file_handler is not None:
+            self.file_handler.close()
+        if self.mailer is not None:
+            # sent by the mail thread - the run never waits on SMTP
+            self.mailer.flush()
+
+
+    def set_console_level(self, lvl: int):
+        """
+        Changes the level of records logged to console.
+        """
+        self.console_lvl = lvl
+        if self.console_handler is not None:
+            self.console_handler.setLevel(lvl)
+        self.refresh_effective_level()
+
+
+    def set_file_level(self, lvl: int):
+        """
+        Changes the level of records logged to file.
+        """
+        self.file_lvl = lvl
+        if self.file_handler is not None:
+            self.file_handler.setLevel(lvl)
+        if self.file_sink is not None:
+            self.file_sink.setLevel(lvl)
+        self.refresh_effective_level()
 
 
-    def func_wrapper(self, func):
+    def refresh_effective_level(self):
+        """
+        Caches the lowest level any handler would accept, so the wrappers
+        can cheaply tell whether a record would be emitted at all.
+        Must be called whenever handlers or their levels change.
+        Every instance shares the same logger, so the level is cached
+        on all of them - handlers added by one change what the others emit.
+        """
+        # same walk as logging.Logger.callHandlers
+        handler_lvls = []
+        current = self.logger
+        while current:
+            handler_lvls.extend(handler.level for handler in current.handlers)
+            if not current.propagate:
+                break
+            current = current.parent
+        if not handler_lvls and logging.lastResort:
+            handler_lvls.append(logging.lastResort.level)
+
+        effective_lvl = max(self.logger.getEffectiveLevel(),
+                            min(handler_lvls, default=logging.CRITICAL + 1),
+                            self.logger.manager.disable + 1)
+        for logger_obj in list(ConfiguredLogger.instances.values()):
+            # instances still being set up have no logger yet
+            if getattr(logger_obj, "logger", None) is self.logger:
+                logger_obj.effective_lvl = effective_lvl
+        self.effective_lvl = effective_lvl
+
+
+    def start_file_queue(self):
+        """
+        Starts the writer thread draining queued records to file.
+        Does nothing unless 'use_queue' is set.
+        """
+        with self.queue_lock:
+            if self.use_queue and self.queue_listener is None:
+                self.queue_listener = FileQueueListener(self.queue_handler.queue,
+                                                        self.file_handler)
+                self.queue_listener.start()
+
+
+    def flush_file_logging(self):
+        """
+        Makes sure every record logged so far is written to file,
+        draining the queue & any write buffer.
+        """
+        queue_listener = self.queue_listener
+        if queue_listener is not None:
+            queue_listener.flush()
+        if self.file_handler is not None:
+            self.file_handler.flush()
+
+
+    def stop_file_queue(self):
+        """
+        Drains any queued records to file then stops the writer thread.
+        """
+        with self.queue_lock:
+            if self.queue_listener is not None:
+                self.queue_listener.stop()
+                self.queue_listener = None
+                self.file_handler.flush()
+
+
+    def start_process_listener(self, context=None):
+        """
+        Starts writing the file records sent by worker processes and
+        returns the queue they are sent on, to be handed to configure_worker.
+        Loggers in worker processes started from here on never open
+        the log file - only this process writes it.
+        'context' is the multiprocessing context the workers are started
+        with, if not the default one.
+        """
+        if self.process_listener is None:
+            if context is None:
+                import multiprocessing as context
+
+            self.process_queue = context.Queue()
+            self.process_listener = FileQueueListener(self.process_queue, self.file_handler)
+            self.process_listener.start()
+            os.environ[PROCESS_LISTENER_ENV] = str(os.getpid())
+        return self.process_queue
+
+
+    def stop_process_listener(self):
+        """
+        Writes out the records sent by worker processes so far,
+        then stops listening. Workers should be done logging by then.
+        """
+        if self.process_listener is not None:
+            self.process_listener.stop()
+            self.process_listener = None
+            self.process_queue.close()
+            self.process_queue.join_thread()
+            self.process_queue = None
+            if os.environ.get(PROCESS_LISTENER_ENV) == str(os.getpid()):
+                del os.environ[PROCESS_LISTENER_ENV]
+            self.file_handler.flush()
+
+
+    def make_worker_sink(self) -> logging.Handler:
+        """
+        Returns the handler sending file records of a worker process
+        to the parent. Until configure_worker hands over the queue -
+        a module level logger is built before it runs in spawned
+        workers - the last MAX_HELD_RECORDS records are held in memory,
+        and written to this process's own file if it never comes.
+        """
+        if worker_queue is not None:
+            import logging.handlers
+
+            sink = logging.handlers.QueueHandler(worker_queue)
+            sink.setLevel(self.file_lvl)
+        else:
+            sink = RingBufferHandler(MAX_HELD_RECORDS, self.file_lvl)
+            atexit.register(self.write_held_records)
+        return sink
+
+
+    def write_held_records(self):
+        """
+        Writes the records a worker still holds to its own file, when
+        configure_worker never handed over the queue to send them on.
+        """
+        if not isinstance(self.file_sink, RingBufferHandler) or self.file_handler is None:
+            return
+        records = self.file_sink.take()
+        if not records:
+            return
+        # never truncate the file the parent may be writing
+        self.file_handler.mode = self.file_handler.mode.replace("w", "a")
+        for record in records:
+            self.file_handler.handle(record)
+        self.file_handler.flush()
+
+
+    def use_worker_queue(self, log_queue):
+        """
+        Sends file records to 'log_queue' from now on,
+        to be written by the process listener of the parent.
+        """
+        import logging.handlers
+
+        sink = logging.handlers.QueueHandler(log_queue)
+        sink.setLevel(self.file_lvl)
+        old_sink, self.file_sink = self.file_sink, sink
+        if old_sink in self.logger.handlers:
+            self.logger.removeHandler(old_sink)
+            self.logger.addHandler(sink)
+
+        if self.worker:
+            # records held since the worker started
+            if isinstance(old_sink, RingBufferHandler):
+                for record in old_sink.take():
+                    sink.handle(record)
+        else:
+            # copies inherited from the parent by fork - the parent writes
+            # anything they hold, and their threads do not exist here
+            self.use_queue = False
+            self.queue_listener = None
+            self.process_listener = None
+            self.process_queue = None
+            if self.file_handler is not None:
+                self.file_handler.discard()
+            self.worker = True
+        self.refresh_effective_level()
+
+
+    def log_as(self, caller: tuple, lvl: int, msg: str, *args, extra: dict = None,
+               exc_info: tuple = None):
+        """
+        Logs a record reporting 'caller' as where it came from,
+        skipping the stack walk logging would otherwise do.
+        'caller' is a tuple returned by get_caller_info.
+        """
+        if caller is None:
+            self.logger.log(lvl, msg, *args, exc_info=exc_info, extra=extra, stacklevel=2)
+        elif self.logger.isEnabledFor(lvl):
+            self.logger.handle(self.logger.makeRecord(self.logger.name, lvl,
+                                                      caller[0], caller[1],
+                                                      msg, args, exc_info,
+                                                      caller[2], extra))
+
+
+    def log_exception(self, func, err: Exception, flush: bool = True):
+        """
+        Logs an exception raised within a wrapped function to file only,
+        then points the console at the log file for review.
+        Meant to be called from within the 'except' block.
+        Each exception is logged once - by the innermost wrapper it goes
+        through - while any later exception is logged in turn.
+        With 'flush' the records are on disk before returning - leave it
+        off on an event loop, where waiting on the writer would block.
+        """
+        if mark_logged(err):
+            # self.logger.debug(pprint.pformat(err))
+            self.disable_console_logging()
+
+            # reported as coming from the wrapped function, so they can be
+            # found by its name like the start & end of its calls
+            caller = get_caller_info(func)
+            extra = {"wrapped_func": f"{func.__module__}.{func.__name__}"}
+            self.log_as(caller, logging.DEBUG,
+                        "%s exception within %s.%s:\t%s",
+                        type(err).__name__,
+                        func.__module__,
+                        func.__name__,
+                        str(err),
+                        extra=extra)
+            self.dump_flight_recorder()
+
+            # self.logger.warning("%s message:\t%s", type(err).__name__, str(err))
+            if self.deferred_traceback:
+                from v4_Testing.log_traceback import TracebackSnapshot
+
+                snapshot = TracebackSnapshot(err, self.traceback_locals)
+                if self.json_lines:
+                    # written to the exception field by JsonLinesFormatter
+                    self.log_as(caller, logging.ERROR, "%s: %s", type(err).__name__, str(err),
+                                extra=dict(extra, exc_snapshot=snapshot))
+                else:
+                    self.log_as(caller, logging.ERROR, "\n%s", snapshot, extra=extra)
+            else:
+                self.log_as(caller, logging.ERROR, "%s: %s", type(err).__name__, str(err),
+                            extra=extra, exc_info=(type(err), err, err.__traceback__))
+
+            # # using exception method to log error also posts to console - defeating the purpose
+            # self.logger.exception("%s within %s.%s:\t%s",
+            #                       type(err).__name__,
+            #                       func.__module__,
+            #                       func.__name__,
+            #                       str(err)
+            #                       )
+
+            if self.init_console_setup:
+                self.enable_console_logging()
+            self.log_as(caller, logging.CRITICAL,
+                        "Log review needed!\nBe sure to check your logs:\n%s",
+                        # next(iter([handler.baseFilename
+                        #         for handler in self.logger.handlers
+                        #         if isinstance(handler, logging.FileHandler)
+                        #         ])
+                        # )
+                        self.file_name_out,
+                        extra=extra)
+            if flush:
+                self.flush_file_logging()
+            self.email_logs(f"Log review needed - {type(err).__name__} in "
+                            f"{func.__module__}.{func.__name__}",
+                            f"{type(err).__name__}:\t{err}",
+                            key=(type(err).__name__, func.__module__, func.__qualname__))
+            # self.logger.info("Exception args:\t%s", err.args)
+            # self.logger.critical(pprint.pformat(str(err)))
+
+
+    def call_started(self, site: CallSite):
+        """
+        Logs the start of a call to a wrapped function when needed.
+        Returns what call_ended needs to know about the start:
+        the start time when timing or logging the call, else False.
+        """
+        if site.timer is not None:
+            return time.perf_counter_ns()
+
+        log_call = self.effective_lvl <= logging.DEBUG
+        if log_call and site.sampler is not None:
+            log_call = site.sampler.should_log()
+            if site.sampler.summary_due():
+                self.log_call_summary(site)
+        if not log_call:
+            return False
+        self.log_as(site.caller, logging.DEBUG,
+                    "Starting:\t%s.%s", site.module, site.name,
+                    extra={"wrapped_func": site.qualified_name})
+        return time.perf_counter_ns()
+
+
+    def call_ended(self, site: CallSite, started):
+        """
+        Logs the end of a call to a wrapped function when needed.
+        'started' is what call_started returned for the call.
+        """
+        if site.timer is not None:
+            site.timer.add(time.perf_counter_ns() - started)
+            if site.timer.summary_due():
+                self.log_call_summary(site)
+        elif started:
+            # self.logger.debug(f"Ending {func.__qualname__} from module:\t{func.__module__}")
+            self.log_as(site.caller, logging.DEBUG,
+                        "Ending:\t%s.%s", site.module, site.name,
+                        extra={"wrapped_func": site.qualified_name,
+                               "duration_ns": time.perf_counter_ns() - started})
+
+
+    def log_call_summary(self, site: CallSite):
+        """
+        Logs the calls left out, the call timings and the memory
+        taken by the calls since the last summary.
+        """
+        if site.sampler is not None:
+            suppressed = site.sampler.take_suppressed()
+            if suppressed:
+                self.log_as(site.caller, logging.DEBUG,
+                            "Suppressed %s call records of %s.%s",
+                            suppressed, site.module, site.name)
+
+        if site.timer is not None:
+            timing = site.timer.take_summary()
+            if timing:
+                self.log_as(site.caller, logging.INFO,
+                            "Timing of %s.%s over %s calls:\t"
+                            "min %s | mean %s | p50 %s | p95 %s | p99 %s | max %s",
+                            site.module, site.name, timing["count"],
+                            *(format_duration(timing[key])
+                              for key in ("min", "mean", "p50", "p95", "p99", "max")))
+
+        if site.memory is not None:
+            memory = site.memory.take_summary()
+            if memory:
+                self.log_as(site.caller, logging.INFO,
+                            "Memory of %s.%s over %s calls:\t"
+                            "net %s | mean net %s | max net %s | max peak %s",
+                            site.module, site.name, memory["count"],
+                            *(format_size(memory[key])
+                              for key in ("net", "mean", "max_net", "max_peak")))
+
+
+    def log_call_summaries(self):
+        """
+        Logs the summary of every sampled, timed or memory tracked function.
+        """
+        for site in self.call_sites:
+            self.log_call_summary(site)
+
+
+    def func_wrapper(self, func=None, *, sample_every: int = 0,
+                     max_per_second: int = 0, first_n: int = 0,
+                     timing: bool = False, summary_interval: float = 60.0,
+                     profile_every: int = 0, profile_threshold: float = 0.1,
+                     profile_top: int = 20, profile_dump: bool = False,
+                     track_memory: bool = False, memory_threshold: int = 1_000_000,
+                     memory_top: int = 10):
         """
         Wrapper function to provide start and end logging
         when running functions without interfering with
         other arguments or returned data.
+
+        Can be used bare or with options to limit the start and end
+        records of hot functions - exceptions are always logged:
+            sample_every        INT log 1 in every N calls
+            max_per_second      INT log at most N calls each second
+            first_n             INT log only the first N calls
+            timing              BOOL time calls instead of logging
+                                start and end, logging a summary
+                                of the durations at INFO
+            summary_interval    FLOAT seconds between summaries of the
+                                calls left out or timed
+
+        Plain functions can also have some calls profiled with cProfile,
+        logging where the time of the slow ones went at INFO:
+            profile_every       INT profile 1 in every N calls
+            profile_threshold   FLOAT seconds a profiled call has to take
+                                for its profile to be kept
+            profile_top         INT functions logged, by cumulative time
+            profile_dump        BOOL write the profile to a '.pstats' file
+                                next to the log file instead
+
+        Plain functions can also have the memory of their calls traced
+        with tracemalloc, to find leaks - the bytes left allocated & the
+        peak of each call are summarised at INFO when logging is disabled:
+            track_memory        BOOL trace the memory taken by each call
+            memory_threshold    INT bytes the calls can leave allocated,
+                                together, before the allocation sites that
+                                grew are logged at WARNING - 0 for never
+            memory_top          INT allocation sites logged
         """
+        if func is None:
+            return functools.partial(self.func_wrapper,
+                                     sample_every=sample_every,
+                                     max_per_second=max_per_second,
+                                     first_n=first_n,
+                                     timing=timing,
+                                     summary_interval=summary_interval,
+                                     profile_every=profile_every,
+                                     profile_threshold=profile_threshold,
+                                     profile_top=profile_top,
+                                     profile_dump=profile_dump,
+                                     track_memory=track_memory,
+                                     memory_threshold=memory_threshold,
+                                     memory_top=memory_top)
+
+        sampler = None
+        if sample_every or max_per_second or first_n:
+            sampler = CallSampler(sample_every=sample_every,
+                                  max_per_second=max_per_second,
+                                  first_n=first_n,
+                                  summary_interval=summary_interval)
+        timer = CallTimer(summary_interval=summary_interval) if timing else None
+        profiler = None
+        if profile_every:
+            profiler = CallProfiler(profile_every,
+                                    threshold=profile_threshold,
+                                    top=profile_top,
+                                    dump=profile_dump)
+        memory = None
+        if track_memory:
+            memory = CallMemory(threshold=memory_threshold, top=memory_top)
+
+        site = CallSite(func, get_caller_info(func), sampler=sampler, timer=timer,
+                        profiler=profiler, memory=memory)
+        if sampler is not None or timer is not None or memory is not None:
+            self.call_sites.append(site)
+
+        if (profiler is not None or memory is not None) and (
+                inspect.iscoroutinefunction(func)
+                or inspect.isasyncgenfunction(func)
+                or inspect.isgeneratorfunction(func)):
+            # the profiler & tracemalloc would also see whatever
+            # runs while they are suspended
+            raise ValueError("profile_every & track_memory only work on plain functions")
+        if inspect.iscoroutinefunction(func):
+            return self.wrap_coroutine_function(site)
+        if inspect.isasyncgenfunction(func):
+            return self.wrap_async_gen_function(site)
+        if inspect.isgeneratorfunction(func):
+            return self.wrap_generator_function(site)
+
         @functools.wraps(func)
         def log_func_wrapper(*args, **kwargs):
+            if self.effective_lvl > site.min_lvl:
+                # nothing would accept records about the call - skip them
+                try:
+                    return func(*args, **kwargs)
+                except Exception as err:
+                    self.log_exception(func, err)
+                    raise
+
             # self.logger.debug("Starting %s from module:\t%s.%s",
             #                   func.__qualname__,
             #                   func.__module__,
             #                   func.__name__)
-            self.logger.debug("Starting:\t%s.%s", func.__module__, func.__name__)
+            started = self.call_started(site)
+            profiling = site.profiler.start() if site.profiler is not None else None
+            memory = site.memory.start() if site.memory is not None else None
             try:
                 rtn_data = func(*args, **kwargs)
             except Exception as err:
-                if self.new_exception == 0:
-                    self.new_exception = 1
-                    # self.logger.debug(pprint.pformat(err))
-                    self.disable_console_logging()
-
-                    self.logger.debug("%s exception within %s.%s:\t%s",
-                                    type(err).__name__,
-                                    func.__module__,
-                                    func.__name__,
-                                    str(err)
-                                    )
-
-                    # self.logger.warning("%s message:\t%s", type(err).__name__, str(err))
-                    self.logger.error("\n%s", traceback.format_exc())
-                    
-                    # # using exception method to log error also posts to console - defeating the purpose
-                    # self.logger.exception("%s within %s.%s:\t%s",
-                    #                       type(err).__name__,
-                    #                       func.__module__,
-                    #                       func.__name__,
-                    #                       str(err)
-                    #                       )
-                    
-                    if self.init_console_setup:
-                        self.enable_console_logging()
-                    self.logger.critical("Log review needed!\nBe sure to check your logs:\n%s",
-                                        # next(iter([handler.baseFilename
-                                        #         for handler in self.logger.handlers
-                                        #         if isinstance(handler, logging.FileHandler)
-                                        #         ])
-                                        # )
-                                        self.file_name_out
-                    )
-                    # self.logger.info("Exception args:\t%s", err.args)
-                    # self.logger.critical(pprint.pformat(str(err)))
-
+                self.log_exception(func, err)
                 raise
             else:
                 return rtn_data
             finally:
-                # self.logger.debug(f"Ending {func.__qualname__} from module:\t{func.__module__}")
-                self.logger.debug("Ending:\t%s.%s", func.__module__, func.__name__)
+                if memory is not None:
+                    self.memory_ended(site, memory)
+                if profiling is not None:
+                    self.profile_ended(site, profiling)
+                self.call_ended(site, started)
         return log_func_wrapper
 
 
+    def profile_ended(self, site: CallSite, profiling: tuple):
+        """
+        Stops profiling a call to a wrapped function, then logs where its
+        time went if it was slow - or writes the profile next to the log file.
+        'profiling' is what CallProfiler.start returned for the call.
+        """
+        duration, profile = site.profiler.stop(profiling)
+        if profile is None:
+            return
+        if site.profiler.dump:
+            site.profiler.dumped += 1
+            path = (f"{os.path.splitext(self.file_name_out)[0]}_{site.name}"
+                    f"_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}"
+                    f"_{site.profiler.dumped}.pstats")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profile.dump_stats(path)
+            self.log_as(site.caller, logging.INFO,
+                        "Slow call of %s.%s took %s - profile written to %s",
+                        site.module, site.name, format_duration(duration), path)
+        else:
+            self.log_as(site.caller, logging.INFO,
+                        "Slow call of %s.%s took %s - top %s functions by cumulative time:\n%s",
+                        site.module, site.name, format_duration(duration),
+                        site.profiler.top, site.profiler.report(profile))
+
+
+    def memory_ended(self, site: CallSite, memory: list):
+        """
+        Stops tracing the memory of a call to a wrapped function, then logs
+        the allocation sites that grew if the calls went over the threshold.
+        'memory' is what CallMemory.start returned for the call.
+        """
+        grown = site.memory.stop(memory)
+        if grown is None:
+            return
+        growth, sites = grown
+        self.log_as(site.caller, logging.WARNING,
+                    "Calls of %s.%s left %s allocated - top %s allocation sites "
+                    "grown since the last report:\n%s",
+                    site.module, site.name, format_size(growth), len(sites),
+                    "\n".join(f"  {stat}" for stat in sites))
+
+
+    def wrap_coroutine_function(self, site: CallSite):
+        """
+        func_wrapper for 'async def' functions - the call is only over
+        once the coroutine has been awaited to the end.
+        """
+        func = site.func
+
+        @functools.wraps(func)
+        async def log_coro_wrapper(*args, **kwargs):
+            if self.effective_lvl > site.min_lvl:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as err:
+                    self.log_exception(func, err, flush=False)
+                    raise
+
+            started = self.call_started(site)
+            try:
+                return await func(*args, **kwargs)
+            except Exception as err:
+                self.log_exception(func, err, flush=False)
+                raise
+            finally:
+                self.call_ended(site, started)
+        return log_coro_wrapper
+
+
+    def iteration_ended(self, site: CallSite, started, items: int,
+                        inside: int, outcome: str):
+        """
+        Logs the end of iterating over a wrapped generator when needed,
+        with how it ended, the items it yielded & the time spent inside it.
+        'started' is what call_started returned when iteration started.
+        """
+        if site.timer is not None:
+            site.timer.add(inside)
+            if site.timer.summary_due():
+                self.log_call_summary(site)
+        elif started:
+            self.log_as(site.caller, logging.DEBUG,
+                        "Ending:\t%s.%s\t%s after %s items, %s inside",
+                        site.module, site.name, outcome, items,
+                        format_duration(inside),
+                        extra={"wrapped_func": site.qualified_name,
+                               "duration_ns": inside})
+
+
+    def wrap_generator_function(self, site: CallSite):
+        """
+        func_wrapper for generator functions - the call lasts from the
+        first item asked for until the generator is exhausted or closed.
+        Items are passed on one at a time as they are produced, and
+        values sent & exceptions thrown in are passed on untouched.
+        """
+        func = site.func
+
+        @functools.wraps(func)
+        def log_gen_wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            if self.effective_lvl > site.min_lvl:
+                try:
+                    return (yield from gen)
+                except Exception as err:
+                    self.log_exception(func, err)
+                    raise
+
+            started = self.call_started(site)
+            items = inside = 0
+            outcome = "closed"
+            try:
+                step = time.perf_counter_ns()
+                try:
+                    value = next(gen)
+                finally:
+                    inside += time.perf_counter_ns() - step
+                while True:
+                    items += 1
+                    try:
+                        sent = yield value
+                    except GeneratorExit:
+                        gen.close()
+                        raise
+                    except BaseException as thrown:
+                        step = time.perf_counter_ns()
+                        try:
+                            value = gen.throw(thrown)
+                        finally:
+                            inside += time.perf_counter_ns() - step
+                    else:
+                        step = time.perf_counter_ns()
+                        try:
+                            value = gen.send(sent)
+                        finally:
+                            inside += time.perf_counter_ns() - step
+            except StopIteration as stop:
+                outcome = "exhausted"
+                return stop.value
+            except Exception as err:
+                outcome = "failed"
+                self.log_exception(func, err)
+                raise
+            finally:
+                self.iteration_ended(site, started, items, inside, outcome)
+        return log_gen_wrapper
+
+
+    def wrap_async_gen_function(self, site: CallSite):
+        """
+        func_wrapper for async generator functions - same as
+        wrap_generator_function, with the time spent inside
+        including what the generator awaits.
+        """
+        func = site.func
+
+        @functools.wraps(func)
+        async def log_async_gen_wrapper(*args, **kwargs):
+            agen = func(*args, **kwargs)
+            if self.effective_lvl > site.min_lvl:
+                # nothing to time - only pass the items on
+                try:
+                    value = await agen.__anext__()
+                    while True:
+                        try:
+                            sent = yield value
+                        except GeneratorExit:
+                            await agen.aclose()
+                            raise
+                        except BaseException as thrown:
+                            value = await agen.athrow(thrown)
+                        else:
+                            value = await agen.asend(sent)
+                except StopAsyncIteration:
+                    return
+                except Exception as err:
+                    self.log_exception(func, err, flush=False)
+                    raise
+
+            started = self.call_started(site)
+            items = inside = 0
+            outcome = "closed"
+            try:
+                step = time.perf_counter_ns()
+                try:
+                    value = await agen.__anext__()
+                finally:
+                    inside += time.perf_counter_ns() - step
+                while True:
+                    items += 1
+                    try:
+                        sent = yield value
+                    except GeneratorExit:
+                        await agen.aclose()
+                        raise
+                    except BaseException as thrown:
+                        step = time.perf_counter_ns()
+                        try:
+                            value = await agen.athrow(thrown)
+                        finally:
+                            inside += time.perf_counter_ns() - step
+                    else:
+                        step = time.perf_counter_ns()
+                        try:
+                            value = await agen.asend(sent)
+                        finally:
+                            inside += time.perf_counter_ns() - step
+            except StopAsyncIteration:
+                outcome = "exhausted"
+                return
+            except Exception as err:
+                outcome = "failed"
+                self.log_exception(func, err, flush=False)
+                raise
+            finally:
+                self.iteration_ended(site, started, items, inside, outcome)
+        return log_async_gen_wrapper
+
+
     def sol_wrapper(self, using_exit:bool = False):
         """
         Wrapper function to provide start and end logging
@@ -270,13 +1302,79 @@ class ConfiguredLogger:
                 else:
                     return rtn_data
                 finally:
+                    self.log_call_summaries()
                     self.logger.debug("Ending:\t%s.%s",
                                       func.__module__,
                                       func.__name__)
+                    self.email_logs(f"Run ended - {func.__module__}.{func.__name__}")
 
                     if not using_exit:
                         self.__exit__(None, None, None)
 
+            @functools.wraps(func)
+            async def sol_coro_wrapper(*args, **kwargs):
+                """
+                Same as sol_func_wrapper for asyncio entry points. Closing
+                the logs is done in a worker thread to keep the event loop free.
+                """
+                import asyncio
+
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as err:
+                    self.logger.info("%s exception forced script to close ...",
+                                     type(err).__name__)
+                finally:
+                    self.log_call_summaries()
+                    self.logger.debug("Ending:\t%s.%s",
+                                      func.__module__,
+                                      func.__name__)
+                    self.email_logs(f"Run ended - {func.__module__}.{func.__name__}")
+
+                    if not using_exit:
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, self.__exit__, None, None, None)
+
+            @functools.wraps(func)
+            async def sol_async_gen_wrapper(*args, **kwargs):
+                """
+                Same as sol_coro_wrapper for async generator entry points.
+                """
+                import asyncio
+
+                agen = func(*args, **kwargs)
+                try:
+                    value = await agen.__anext__()
+                    while True:
+                        try:
+                            sent = yield value
+                        except GeneratorExit:
+                            await agen.aclose()
+                            raise
+                        except BaseException as thrown:
+                            value = await agen.athrow(thrown)
+                        else:
+                            value = await agen.asend(sent)
+                except StopAsyncIteration:
+                    return
+                except Exception as err:
+                    self.logger.info("%s exception forced script to close ...",
+                                     type(err).__name__)
+                finally:
+                    self.log_call_summaries()
+                    self.logger.debug("Ending:\t%s.%s",
+                                      func.__module__,
+                                      func.__name__)
+                    self.email_logs(f"Run ended - {func.__module__}.{func.__name__}")
+
+                    if not using_exit:
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, self.__exit__, None, None, None)
+
+            if inspect.iscoroutinefunction(func):
+                return sol_coro_wrapper
+            if inspect.isasyncgenfunction(func):
+                return sol_async_gen_wrapper
             return sol_func_wrapper
         return actual_decorator
 
@@ -285,29 +1383,35 @@ class ConfiguredLogger:
 # Example usage
 # =========================================
 
-# TODO: write class input that will trigger enabling of logs after creation
-logger_obj = ConfiguredLogger(file_name_in="EXAMPLE_Class_Log_File",
-                              file_mode="w",
-                              init_console_setup=1)
+def example() -> None:
+    """
+    Sets up a logger for the example then runs a few
+    test logs to confirm use - ending in a failure.
+    """
+    # TODO: write class input that will trigger enabling of logs after creation
+    logger_obj = ConfiguredLogger(file_name_in="EXAMPLE_Class_Log_File",
+                                  file_mode="w",
+                                  init_console_setup=1)
 
-log_obj = logger_obj.logger
-func_wrapper = logger_obj.func_wrapper
-sol_wrapper = logger_obj.sol_wrapper
+    log_obj = logger_obj.logger
+    func_wrapper = logger_obj.func_wrapper
+    sol_wrapper = logger_obj.sol_wrapper
 
+    @sol_wrapper(using_exit=False)
+    @func_wrapper
+    def main() -> None:
+        """
+        Takes in a logging object pre-defined for formatting
+        then runs a few test functions to confirm use.
+        """
+        log_obj.debug("This is a debug test ...")
+        log_obj.info("This is a info test ...")
+        log_obj.warning("This is a warning test ...")
 
-@sol_wrapper(using_exit=False)
-@func_wrapper
-def main() -> None:
-    """
-    Takes in a logging object pre-defined for formatting
-    then runs a few test functions to confirm use.
-    """
-    log_obj.debug("This is a debug test ...")
-    log_obj.info("This is a info test ...")
-    log_obj.warning("This is a warning test ...")
+        assert True is False, "Just testing failure! Does it still finish solution wrap?"
 
-    assert True is False, "Just testing failure! Does it still finish solution wrap?"
+    main()
 
 if __name__ == "__main__":
 
-    main()
+    example()
@@ -0,0 +1,208 @@
+"Module providing the email delivery of log files for the logging helper."
+# ===========================================================================
+# More information on sending email can be found here:
+#   https://docs.python.org/3/library/smtplib.html
+#   https://docs.python.org/3/library/email.examples.html
+# ===========================================================================
+
+import sys
+import time
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class Mail:
+    """
+    One alert waiting to be sent. 'attachments' is called on the
+    mail thread & returns (file name, bytes) pairs to attach.
+    'repeats' counts the alerts like it left out since the last one sent.
+    """
+    subject: str
+    body: str = ""
+    attachments: object = None
+    repeats: int = 0
+
+
+class LogMailer:
+    """
+    Background thread emailing log alerts, so the program never waits
+    on an SMTP server:
+    - alerts submitted within 'batch_interval' seconds of each other
+      go out together in one email
+    - an alert with the same 'key' as one sent less than
+      'dedupe_interval' seconds ago is left out, and counted in the next
+    - attachments are gzip-compressed, a file attached by several
+      alerts of a batch only once
+    - failed deliveries are tried again up to 'max_attempts' times,
+      waiting twice as long each time from 'retry_delay' up to 'max_retry_delay'
+
+    'smtp_factory' returns a connected smtplib.SMTP-like object, used as a
+    context manager - by default a plain connection to 'host' & 'port'.
+    """
+
+    def __init__(self, to_addrs, from_addr: str, host: str = "localhost", port: int = 25,
+                 timeout: float = 10.0, smtp_factory=None, subject_prefix: str = "Logs",
+                 batch_interval: float = 5.0, dedupe_interval: float = 600.0,
+                 max_attempts: int = 5, retry_delay: float = 1.0,
+                 max_retry_delay: float = 60.0):
+        self.to_addrs = [to_addrs] if isinstance(to_addrs, str) else list(to_addrs)
+        self.from_addr = from_addr
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory or self.connect
+        self.subject_prefix = subject_prefix
+        self.batch_interval = batch_interval
+        self.dedupe_interval = dedupe_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.pending = []
+        # key: (time of the last alert sent, alerts left out since)
+        self.last_sent = {}
+        self.sent = 0
+        self.failed = 0
+        self.closing = False
+        self.flushing = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def connect(self):
+        import smtplib
+
+        return smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+    def submit(self, subject: str, body: str = "", attachments=None, key=None) -> bool:
+        """
+        Queues an alert for the mail thread & returns straight away.
+        Returns whether it was queued - not when left out as
+        a repeat of 'key' or after close.
+        """
+        with self._condition:
+            if self.closing:
+                return False
+            repeats = 0
+            if key is not None:
+                now = time.monotonic()
+                last = self.last_sent.get(key)
+                if last is not None:
+                    if now - last[0] < self.dedupe_interval:
+                        self.last_sent[key] = (last[0], last[1] + 1)
+                        return False
+                    repeats = last[1]
+                self.last_sent[key] = (now, 0)
+            self.pending.append(Mail(subject, body, attachments, repeats))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="LogMailer",
+                                                daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return True
+
+    def flush(self):
+        """
+        Has the mail thread send what is queued without waiting
+        for the batch to fill, and returns straight away.
+        """
+        with self._condition:
+            if self.pending:
+                self.flushing = True
+                self._condition.notify_all()
+
+    def close(self, timeout: float = 30.0) -> bool:
+        """
+        Sends what is queued without waiting for the batch to fill, then
+        stops the thread - waiting at most 'timeout' seconds for it.
+        Returns whether everything queued was dealt with in time.
+        """
+        with self._condition:
+            self.closing = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.pending and not self.closing:
+                    self._condition.wait()
+                if not self.pending:
+                    return
+                # give the alerts coming along with this one time to join it
+                deadline = time.monotonic() + self.batch_interval
+                while not self.closing and not self.flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self.pending = self.pending, []
+                self.flushing = False
+            try:
+                self.deliver(batch)
+            except Exception as err:
+                # the thread has to keep going for the alerts after these
+                self.failed += len(batch)
+                sys.stderr.write(f"--- Could not email {len(batch)} log alerts: {err!r}\n")
+
+    def deliver(self, batch: list):
+        """
+        Sends 'batch' as one email, trying again with backoff on failure.
+        """
+        message = self.build_message(batch)
+        delay = self.retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self.smtp_factory() as smtp:
+                    smtp.send_message(message)
+            except OSError as err:
+                # smtplib.SMTPException is an OSError too
+                if attempt == self.max_attempts:
+                    self.failed += len(batch)
+                    sys.stderr.write(f"--- Could not email {len(batch)} log alerts: {err}\n")
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            else:
+                self.sent += len(batch)
+                return
+
+    def build_message(self, batch: list):
+        """
+        Returns the email for a batch of alerts - their text in the body,
+        every file they attach compressed, each file once.
+        """
+        import gzip
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        if len(batch) == 1:
+            message["Subject"] = f"{self.subject_prefix}: {batch[0].subject}"
+        else:
+            message["Subject"] = f"{self.subject_prefix}: {len(batch)} alerts"
+        message["From"] = self.from_addr
+        message["To"] = ", ".join(self.to_addrs)
+
+        parts = []
+        files = {}
+        for mail in batch:
+            text = f"{mail.subject}\n{mail.body}".rstrip()
+            if mail.repeats:
+                text += f"\n({mail.repeats} more like it left out)"
+            if mail.attachments is not None:
+                try:
+                    # later alerts have the more recent copy of a file
+                    files.update(mail.attachments())
+                except Exception as err:
+                    text += f"\n(attachments could not be read: {err})"
+            parts.append(text)
+        message.set_content("\n\n".join(parts) + "\n")
+
+        for file_name, data in files.items():
+            message.add_attachment(gzip.compress(data), maintype="application",
+                                   subtype="gzip", filename=f"{file_name}.gz")
+        return message
@@ -0,0 +1,522 @@
+"""
+Indexed queries over the log files of a log folder.
+
+Run from the repo root:
+    python -m v4_Testing.log_query [LOG_DIR] [--level ERROR] [--function NAME]
+                                   [--since 3d] [--until TIME] [--run -1]
+
+e.g. every ERROR record or worse from function 'main' in the last 3 days:
+    python -m v4_Testing.log_query logs --level ERROR --function main --since 3d
+
+A sidecar index ('.log_index.json' in LOG_DIR) records for blocks of every
+'*.log' & '*.log.gz' file their time range, levels, function names & runs,
+with runs starting at each "=== Starting of Logs ===" marker. Queries only
+read the blocks that can match. Each query first brings the index up to
+date, parsing only what was appended to a file since it was last indexed;
+the last record of a file is never indexed, as it may still be written
+to, but is always read by queries.
+
+Files written with the default log_file_format or with json_lines are
+understood - lines that do not start a record belong to the one before.
+
+LogReader reads a single uncompressed file run by run from Python,
+mapping it into memory, e.g. the records of the last run:
+    with LogReader("logs/2024-02-17_app.log") as reader:
+        for record in reader.records(-1):
+            ...
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass
+
+INDEX_NAME = ".log_index.json"
+INDEX_VERSION = 1
+# rough size of the parts of a file summed up by each index block
+BLOCK_BYTES = 64 * 1024
+# bytes at the start of a file telling whether it was started over
+HEAD_BYTES = 64
+
+START_MARKER = "=== Starting of Logs ==="
+END_MARKER = "=== Ending of Logs ==="
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+# "%(asctime)s %(levelname)-8s | %(filename)-20s:%(lineno)-5s | %(funcName)-25s %(message)s"
+TEXT_HEADER = re.compile(rb"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) (\w+) *\| (.*?) *:(\d+) *\| ")
+FUNC_WIDTH = 25
+NOT_BLANK = re.compile(rb"\S")
+
+
+@dataclass
+class LogEntry:
+    """
+    One record of a log file, parsed back from its text.
+    'time' is in the asctime layout "YYYY-MM-DD HH:MM:SS,mmm", so times
+    compare as strings. 'run' counts the start of logs markers of the file
+    up to the record - 0 before the first one.
+    """
+    time: str
+    level: str
+    filename: str
+    line: int
+    function: str
+    message: str
+    text: str
+    path: str
+    offset: int
+    run: int = 0
+
+    @property
+    def levelno(self) -> int:
+        return LEVELS.get(self.level, 0)
+
+
+def starts_record(line: bytes) -> bool:
+    """
+    Returns whether 'line' is the first line of a record.
+    """
+    return line.startswith(b'{"') or TEXT_HEADER.match(line) is not None
+
+
+def parse_entry(lines: list, path: str, offset: int) -> LogEntry:
+    """
+    Returns the record made of 'lines', or None if it cannot be parsed.
+    """
+    text = b"".join(lines).decode("utf-8", "replace").rstrip("\n")
+    if lines[0].startswith(b'{"'):
+        import json
+
+        try:
+            fields = json.loads(lines[0])
+        except ValueError:
+            return None
+        # ISO 8601 time back to the asctime layout
+        iso_time = fields.get("time", "")
+        message = fields.get("message", "")
+        if fields.get("exception"):
+            message = f"{message}\n{fields['exception']}"
+        return LogEntry(f"{iso_time[:10]} {iso_time[11:19]},{iso_time[20:23]}",
+                        fields.get("level", ""), fields.get("module", ""),
+                        fields.get("line", 0), fields.get("function") or "",
+                        message, text, path, offset)
+
+    header = TEXT_HEADER.match(lines[0])
+    if header is None:
+        return None
+    rest = text[header.end():]
+    function = rest.split(" ", 1)[0].split("\n", 1)[0]
+    return LogEntry(header.group(1).decode(), header.group(2).decode(),
+                    header.group(3).decode("utf-8", "replace"), int(header.group(4)),
+                    function, rest[max(len(function), FUNC_WIDTH) + 1:],
+                    text, path, offset)
+
+
+def iter_entries(lines, path: str, offset: int = 0, run: int = 0):
+    """
+    Yields the records made of the byte 'lines' read from 'path'
+    starting at 'offset', with the run each belongs to.
+    Lines before the first record are skipped.
+    """
+    pending = []
+    start = offset
+    for line in lines:
+        if starts_record(line):
+            if pending:
+                entry = parse_entry(pending, path, start)
+                if entry is not None:
+                    run = set_run(entry, run)
+                    yield entry
+            pending = [line]
+            start = offset
+        elif pending:
+            pending.append(line)
+        offset += len(line)
+    if pending:
+        entry = parse_entry(pending, path, start)
+        if entry is not None:
+            set_run(entry, run)
+            yield entry
+
+
+def set_run(entry: LogEntry, run: int) -> int:
+    """
+    Sets the run of 'entry' given the run of the record before,
+    and returns it.
+    """
+    if entry.message == START_MARKER:
+        run += 1
+    entry.run = run
+    return run
+
+
+def open_log(path: str):
+    """
+    Opens a log file for reading bytes, compressed or not.
+    """
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_head(path: str) -> str:
+    """
+    Returns the first bytes of a log file, as hex.
+    """
+    with open_log(path) as log_file:
+        return log_file.read(HEAD_BYTES).hex()
+
+
+def read_lines(log_file, start: int, end: int = None):
+    """
+    Yields the lines of an open log file from byte 'start' to 'end'.
+    """
+    log_file.seek(start)
+    position = start
+    for line in log_file:
+        if end is not None and position >= end:
+            return
+        position += len(line)
+        yield line
+
+
+def map_lines(data, start: int, end: int):
+    """
+    Yields the lines of the mapped 'data' from byte 'start' to 'end'.
+    """
+    while start < end:
+        stop = data.find(b"\n", start, end)
+        stop = end if stop < 0 else stop + 1
+        yield data[start:stop]
+        start = stop
+
+
+@dataclass
+class LogRun:
+    """
+    Where a run - from one start of logs marker to the next - is in a file.
+    'ended' tells whether its end of logs marker was written.
+    Run 0 holds the records before the first marker, if there are any.
+    """
+    number: int
+    start: int
+    end: int
+    ended: bool
+
+
+class LogReader:
+    """
+    Reads the records of one log file run by run, mapping the file
+    into memory: only the markers are searched for up front, and
+    records are parsed as they are iterated over.
+    The file is read as it was when opened - records appended
+    since are not seen.
+    """
+
+    def __init__(self, path: str):
+        import mmap
+
+        self.path = path
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # empty files cannot be mapped
+            self.data = b""
+        self._runs = None
+
+    def close(self):
+        if not isinstance(self.data, bytes):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def find_markers(self, marker: str, start: int = 0, end: int = None):
+        """
+        Yields the offsets of the records between 'start' & 'end'
+        whose message is 'marker'.
+        """
+        data = self.data
+        end = len(data) if end is None else end
+        needle = marker.encode()
+        found = data.find(needle, start, end)
+        while found >= 0:
+            line_start = data.rfind(b"\n", 0, found) + 1
+            line_end = data.find(b"\n", found)
+            line = data[line_start:len(data) if line_end < 0 else line_end + 1]
+            # not a marker logged inside some other message
+            if starts_record(line):
+                entry = parse_entry([line], self.path, line_start)
+                if entry is not None and entry.message == marker:
+                    yield line_start
+            found = data.find(needle, found + len(needle), end)
+
+    @property
+    def runs(self) -> list:
+        """
+        The LogRuns of the file, in order.
+        """
+        if self._runs is None:
+            starts = list(self.find_markers(START_MARKER))
+            runs = []
+            first = starts[0] if starts else len(self.data)
+            if NOT_BLANK.search(self.data, 0, first):
+                runs.append(LogRun(0, 0, first, False))
+            for number, start in enumerate(starts, 1):
+                end = starts[number] if number < len(starts) else len(self.data)
+                ended = next(self.find_markers(END_MARKER, start, end), None) is not None
+                runs.append(LogRun(number, start, end, ended))
+            self._runs = runs
+        return self._runs
+
+    def run(self, number: int) -> LogRun:
+        """
+        Returns run 'number' - negative ones count back from the last run.
+        Raises IndexError if there is no such run.
+        """
+        runs = self.runs
+        if number < 0:
+            if -number <= len(runs):
+                return runs[number]
+        else:
+            for log_run in runs:
+                if log_run.number == number:
+                    return log_run
+        raise IndexError(f"No run {number} in {self.path}")
+
+    def records(self, run: int = None):
+        """
+        Yields the records of run 'run', or of the whole file,
+        as LogEntrys.
+        """
+        if run is None:
+            start, end, number = 0, len(self.data), 0
+        else:
+            log_run = self.run(run)
+            start, end = log_run.start, log_run.end
+            number = max(log_run.number - 1, 0)
+        yield from iter_entries(map_lines(self.data, start, end), self.path, start, number)
+
+
+class LogIndex:
+    """
+    Sidecar index over the log files of 'log_dir'.
+    """
+
+    def __init__(self, log_dir: str, index_path: str = None):
+        self.log_dir = log_dir
+        self.index_path = index_path or os.path.join(log_dir, INDEX_NAME)
+        self.files = {}
+        self.load()
+
+    def load(self):
+        """
+        Reads the index file, starting afresh if it is missing or unreadable.
+        """
+        import json
+
+        try:
+            with open(self.index_path, encoding="utf-8") as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if index.get("version") == INDEX_VERSION:
+            self.files = index["files"]
+
+    def save(self):
+        """
+        Writes the index file - replacing it in one go, so a reader
+        never sees half of it.
+        """
+        import json
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def log_files(self) -> list:
+        """
+        Returns the names of the text log files in the folder.
+        """
+        if not os.path.isdir(self.log_dir):
+            return []
+        return sorted(name for name in os.listdir(self.log_dir)
+                      if name.endswith((".log", ".log.gz")))
+
+    def update(self) -> bool:
+        """
+        Brings the index up to date with the folder, parsing only what
+        was added to each file since it was last indexed.
+        Returns whether anything changed - the index file is saved if so.
+        """
+        names = self.log_files()
+        changed = False
+        for name in set(self.files) - set(names):
+            del self.files[name]
+            changed = True
+        for name in names:
+            changed |= self.update_file(name)
+        if changed:
+            self.save()
+        return changed
+
+    def update_file(self, name: str) -> bool:
+        """
+        Indexes what was added to file 'name' since it was last indexed,
+        starting over if it was replaced or truncated since.
+        Returns whether its index changed.
+        """
+        path = os.path.join(self.log_dir, name)
+        stat = os.stat(path)
+        entry = self.files.get(name)
+        if entry is not None and (stat.st_size, stat.st_mtime) == (entry["size"], entry["mtime"]):
+            return False
+
+        head = read_head(path)
+        if (entry is None or entry["head"] != head[:len(entry["head"])]
+                or (not name.endswith(".gz") and stat.st_size < entry["end"])):
+            entry = {"head": head, "end": 0, "runs": [], "blocks": []}
+        entry.update(size=stat.st_size, mtime=stat.st_mtime, head=head)
+        self.files[name] = entry
+
+        with open_log(path) as log_file:
+            self.index_entries(entry, iter_entries(read_lines(log_file, entry["end"]), name,
+                                                   entry["end"], len(entry["runs"])))
+        return True
+
+    @staticmethod
+    def index_entries(entry: dict, entries):
+        """
+        Adds blocks summing up 'entries' to the index 'entry' of a file,
+        leaving out the last record - it may not be complete yet.
+        """
+        block = None
+        previous = None
+        for record in entries:
+            if previous is not None:
+                if block is None or previous.offset - block["start"] >= BLOCK_BYTES:
+                    block = {"start": previous.offset, "end": previous.offset,
+                             "min_time": previous.time, "max_time": previous.time,
+                             "levels": [], "functions": [],
+                             "runs": [previous.run, previous.run],
+                             # to carry on counting runs when reading the block
+                             "run_before": previous.run - (previous.message == START_MARKER)}
+                    entry["blocks"].append(block)
+                block["end"] = record.offset
+                block["min_time"] = min(block["min_time"], previous.time)
+                block["max_time"] = max(block["max_time"], previous.time)
+                block["runs"][1] = previous.run
+                if previous.level not in block["levels"]:
+                    block["levels"].append(previous.level)
+                if previous.function not in block["functions"]:
+                    block["functions"].append(previous.function)
+                if previous.message == START_MARKER:
+                    entry["runs"].append([previous.offset, previous.time])
+                entry["end"] = record.offset
+            previous = record
+
+    def query(self, level: str = None, function: str = None, since: str = None,
+              until: str = None, run: int = None, update: bool = True):
+        """
+        Yields the records of every file matching all the conditions given:
+            level       STR this level or worse
+            function    STR logged from this function
+            since       STR at this time or later, in the asctime layout
+            until       STR before this time, in the asctime layout
+            run         INT in this run of each file - negative ones
+                        count back from the last run
+        """
+        if update:
+            self.update()
+        min_level = LEVELS.get(level.upper(), 0) if level else 0
+
+        for name in sorted(self.files):
+            entry = self.files[name]
+            with open_log(os.path.join(self.log_dir, name)) as log_file:
+                # never indexed - the last record & anything added since
+                tail = list(iter_entries(read_lines(log_file, entry["end"]), name,
+                                         entry["end"], len(entry["runs"])))
+                wanted_run = run
+                if run is not None and run < 0:
+                    runs = tail[-1].run if tail else len(entry["runs"])
+                    wanted_run = runs + run + 1
+
+                for block in entry["blocks"]:
+                    if ((min_level and max(LEVELS.get(lvl, 0)
+                                           for lvl in block["levels"]) < min_level)
+                            or (function is not None and function not in block["functions"])
+                            or (since is not None and block["max_time"] < since)
+                            or (until is not None and block["min_time"] >= until)
+                            or (wanted_run is not None
+                                and not block["runs"][0] <= wanted_run <= block["runs"][1])):
+                        continue
+                    records = iter_entries(read_lines(log_file, block["start"], block["end"]),
+                                           name, block["start"], block["run_before"])
+                    yield from (record for record in records
+                                if self.matches(record, min_level, function,
+                                                since, until, wanted_run))
+                yield from (record for record in tail
+                            if self.matches(record, min_level, function,
+                                            since, until, wanted_run))
+
+    @staticmethod
+    def matches(record: LogEntry, min_level: int, function: str,
+                since: str, until: str, run: int) -> bool:
+        """
+        Returns whether 'record' meets every condition given.
+        """
+        return ((not min_level or record.levelno >= min_level)
+                and (function is None or record.function == function)
+                and (since is None or record.time >= since)
+                and (until is None or record.time < until)
+                and (run is None or record.run == run))
+
+
+def parse_time(text: str, now: float = None) -> str:
+    """
+    Returns 'text' in the asctime layout - either a time like
+    "2024-02-17 23:58" or an age like "3d", "12h" or "30m".
+    """
+    age = re.fullmatch(r"(\d+(?:\.\d+)?)([dhm])", text)
+    if age is None:
+        return text.replace("T", " ")
+    seconds = float(age.group(1)) * {"d": 86400, "h": 3600, "m": 60}[age.group(2)]
+    moment = (time.time() if now is None else now) - seconds
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(moment)) + \
+        f",{int(moment % 1 * 1000):03d}"
+
+
+def main(argv: list = None):
+    """
+    Prints the records of the log folder matching the conditions given.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Queries the log files of a folder.")
+    parser.add_argument("log_dir", nargs="?", default=os.path.join(os.getcwd(), "logs"))
+    parser.add_argument("--level", help="this level or worse, e.g. ERROR")
+    parser.add_argument("--function", help="logged from this function")
+    parser.add_argument("--since", help='a time like "2024-02-17 23:58" or an age like 3d')
+    parser.add_argument("--until", help='a time like "2024-02-17 23:58" or an age like 12h')
+    parser.add_argument("--run", type=int, help="run of each file, -1 for the last one")
+    args = parser.parse_args(argv)
+
+    index = LogIndex(args.log_dir)
+    for record in index.query(level=args.level, function=args.function,
+                              since=args.since and parse_time(args.since),
+                              until=args.until and parse_time(args.until),
+                              run=args.run):
+        print(f"{record.path}: {record.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"Module providing the deferred tracebacks of the logging helper."
+# ===========================================================================
+# More information on tracebacks can be found here:
+#   https://docs.python.org/3/library/traceback.html
+#   https://docs.python.org/3/library/reprlib.html
+# ===========================================================================
+
+import reprlib
+import linecache
+import traceback
+
+# most frames in a cycle of recursive calls looked for when collapsing
+MAX_CYCLE = 8
+# a cycle has to repeat this many times in a row to be collapsed
+MIN_REPEATS = 3
+
+# same wording as traceback between chained exceptions
+CAUSE_MESSAGE = "The above exception was the direct cause of the following exception:"
+CONTEXT_MESSAGE = "During handling of the above exception, another exception occurred:"
+
+
+class TracebackSnapshot:
+    """
+    Cheap copy of the traceback of an exception, taken where it is
+    caught: only the code object & line number of each frame are kept,
+    with the reprs of its locals when 'locals_repr' caps their size.
+
+    The text is only rendered when the snapshot is turned into a str -
+    logged as an argument, that is when the record is written, on the
+    writer thread with use_queue. Consecutive repeats of a frame or of
+    a cycle of frames, as in deep recursion, are collapsed into one
+    "[Previous N frames repeated M more times]" line.
+    """
+
+    def __init__(self, err: BaseException, locals_repr: int = 0, _seen: set = None):
+        seen = _seen if _seen is not None else set()
+        seen.add(id(err))
+        self.frames = []
+        repr_locals = self.make_repr(locals_repr) if locals_repr else None
+        tb = err.__traceback__
+        while tb is not None:
+            local_reprs = None
+            if repr_locals is not None:
+                local_reprs = [(name, repr_locals(value))
+                               for name, value in tb.tb_frame.f_locals.items()]
+            self.frames.append((tb.tb_frame.f_code, tb.tb_lineno, local_reprs))
+            tb = tb.tb_next
+        self.exception_only = "".join(traceback.format_exception_only(type(err), err))
+
+        # the exceptions this one was raised from, as traceback does
+        self.chained = None
+        self.chain_note = None
+        if err.__cause__ is not None and id(err.__cause__) not in seen:
+            self.chained = TracebackSnapshot(err.__cause__, locals_repr, seen)
+            self.chain_note = CAUSE_MESSAGE
+        elif (err.__context__ is not None and not err.__suppress_context__
+                and id(err.__context__) not in seen):
+            self.chained = TracebackSnapshot(err.__context__, locals_repr, seen)
+            self.chain_note = CONTEXT_MESSAGE
+        self._text = None
+
+    @staticmethod
+    def make_repr(size: int):
+        """
+        Returns a function giving the repr of a value in at most 'size'
+        characters - containers are cut short before being walked in full.
+        """
+        limits = reprlib.Repr()
+        limits.maxstring = limits.maxother = max(size, 4)
+
+        def capped_repr(value) -> str:
+            try:
+                text = limits.repr(value)
+            except Exception as err:
+                text = f"<repr failed: {type(err).__name__}>"
+            if len(text) > size:
+                text = text[:max(size - 3, 0)] + "..."
+            return text
+        return capped_repr
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self.render()
+        return self._text
+
+    def __reduce__(self):
+        # code objects cannot be pickled - sent to another process as its text
+        return str, (str(self),)
+
+    def render(self) -> str:
+        """
+        Returns the traceback text, with the exceptions it came from first.
+        """
+        lines = []
+        if self.chained is not None:
+            lines += [str(self.chained), "", self.chain_note, ""]
+        if self.frames:
+            lines.append("Traceback (most recent call last):")
+            lines.extend(self.render_frames())
+        lines.append(self.exception_only.rstrip("\n"))
+        return "\n".join(lines)
+
+    def render_frames(self) -> list:
+        """
+        Returns the lines of the frames, repeats collapsed.
+        """
+        lines = []
+        keys = [(code, line_no) for code, line_no, _ in self.frames]
+        pos = 0
+        while pos < len(keys):
+            cycle, repeats = self.find_cycle(keys, pos)
+            for code, line_no, local_reprs in self.frames[pos:pos + cycle]:
+                lines.extend(self.render_frame(code, line_no, local_reprs))
+            if repeats > 1:
+                frames = "frame" if cycle == 1 else f"{cycle} frames"
+                lines.append(f"  [Previous {frames} repeated {repeats - 1} more times]")
+            pos += cycle * repeats
+        return lines
+
+    @staticmethod
+    def find_cycle(keys: list, pos: int) -> tuple:
+        """
+        Returns the length of the cycle of frames starting at 'pos' &
+        how many times in a row it occurs - (1, 1) when nothing repeats
+        often enough to be worth collapsing.
+        """
+        best = (1, 1)
+        for cycle in range(1, MAX_CYCLE + 1):
+            block = keys[pos:pos + cycle]
+            if len(block) < cycle:
+                break
+            repeats = 1
+            while keys[pos + cycle * repeats:pos + cycle * (repeats + 1)] == block:
+                repeats += 1
+            # most frames left out wins
+            if repeats >= MIN_REPEATS and cycle * (repeats - 1) > best[0] * (best[1] - 1):
+                best = (cycle, repeats)
+        return best
+
+    @staticmethod
+    def render_frame(code, line_no: int, local_reprs: list) -> list:
+        lines = [f'  File "{code.co_filename}", line {line_no}, in {code.co_name}']
+        source = linecache.getline(code.co_filename, line_no).strip()
+        if source:
+            lines.append(f"    {source}")
+        for name, value in local_reprs or ():
+            lines.append(f"    {name} = {value}")
+        return lines
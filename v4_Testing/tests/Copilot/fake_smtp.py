@@ -0,0 +1,33 @@
+'Module providing a local stand-in for an SMTP server to the tests'
+import threading
+
+
+class FakeSMTP:
+    """
+    Local stand-in for smtplib.SMTP, keeping the messages it is given.
+    Fails the first 'failures' connections, and waits for 'release'
+    before sending when given one.
+    """
+
+    def __init__(self, failures: int = 0, release: threading.Event = None):
+        self.messages = []
+        self.connections = 0
+        self.failures = failures
+        self.release = release
+
+    def __call__(self):
+        self.connections += 1
+        if self.connections <= self.failures:
+            raise ConnectionRefusedError("SMTP server down")
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send_message(self, message):
+        if self.release is not None:
+            self.release.wait()
+        self.messages.append(message)
@@ -0,0 +1,251 @@
+'Module to test the per function bookkeeping of the logging wrappers'
+import unittest
+from unittest.mock import patch
+from v4_Testing.call_stats import (CallSampler, CallTimer, CallProfiler, CallMemory,
+                                   format_duration, format_size)
+
+
+class TestCallSampler(unittest.TestCase):
+    """Unit tests for the CallSampler class."""
+
+    def make_sampler(self, **kwargs):
+        return CallSampler(**kwargs)
+
+    def test_sample_every(self):
+        """
+        Only 1 in every N calls is logged, starting with the first.
+        """
+        sampler = self.make_sampler(sample_every=3)
+        logged = [sampler.should_log() for _ in range(7)]
+        self.assertEqual(logged, [True, False, False, True, False, False, True])
+        self.assertEqual(sampler.take_suppressed(), 4)
+        self.assertEqual(sampler.take_suppressed(), 0)
+
+    def test_first_n(self):
+        """
+        Only the first N calls are logged.
+        """
+        sampler = self.make_sampler(first_n=2)
+        logged = [sampler.should_log() for _ in range(5)]
+        self.assertEqual(logged, [True, True, False, False, False])
+        self.assertEqual(sampler.take_suppressed(), 3)
+
+    @patch("v4_Testing.call_stats.time.monotonic")
+    def test_max_per_second(self, monotonic_mock):
+        """
+        At most N calls are logged within the same second.
+        """
+        monotonic_mock.return_value = 100.1
+        sampler = self.make_sampler(max_per_second=2)
+        logged = [sampler.should_log() for _ in range(4)]
+        self.assertEqual(logged, [True, True, False, False])
+
+        monotonic_mock.return_value = 101.2
+        self.assertTrue(sampler.should_log())
+        self.assertEqual(sampler.take_suppressed(), 2)
+
+    @patch("v4_Testing.call_stats.time.monotonic")
+    def test_summary_due(self, monotonic_mock):
+        """
+        A summary is due once per summary interval.
+        """
+        monotonic_mock.return_value = 0
+        sampler = self.make_sampler(first_n=1, summary_interval=10)
+        self.assertFalse(sampler.summary_due())
+        monotonic_mock.return_value = 10
+        self.assertTrue(sampler.summary_due())
+        self.assertFalse(sampler.summary_due())
+
+
+class TestCallTimer(unittest.TestCase):
+    """Unit tests for the CallTimer class."""
+
+    def test_bucket_bounds(self):
+        """
+        Every duration falls within the bounds of its bucket.
+        """
+        for duration in list(range(100)) + [1_000, 12_345, 10**6, 987_654_321, 10**12]:
+            low, high = CallTimer.bucket_bounds(CallTimer.bucket_index(duration))
+            self.assertLessEqual(low, duration)
+            self.assertGreaterEqual(high, duration)
+            self.assertLessEqual(high - low, max(duration, 1) / CallTimer.SUB_BUCKETS)
+
+    def test_summary(self):
+        """
+        The summary gives count, min, max, mean and close percentiles.
+        """
+        timer = CallTimer()
+        for duration in range(1_000, 101_000, 1_000):
+            timer.add(duration)
+        summary = timer.take_summary()
+
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["min"], 1_000)
+        self.assertEqual(summary["max"], 100_000)
+        self.assertEqual(summary["mean"], 50_500)
+        for percent in CallTimer.PERCENTILES:
+            self.assertAlmostEqual(summary[f"p{percent}"], percent * 1_000,
+                                   delta=percent * 1_000 / CallTimer.SUB_BUCKETS)
+
+    def test_take_summary_starts_over(self):
+        """
+        Taking the summary forgets the recorded durations.
+        """
+        timer = CallTimer()
+        self.assertIsNone(timer.take_summary())
+        timer.add(5)
+        self.assertEqual(timer.take_summary()["p99"], 5)
+        self.assertIsNone(timer.take_summary())
+
+    def test_format_duration(self):
+        """
+        Durations are shown in the most readable unit.
+        """
+        self.assertEqual(format_duration(999), "999ns")
+        self.assertEqual(format_duration(1_500), "1.5us")
+        self.assertEqual(format_duration(2_000_000), "2ms")
+        self.assertEqual(format_duration(3_250_000_000), "3.25s")
+
+
+class TestCallProfiler(unittest.TestCase):
+    """Unit tests for the CallProfiler class."""
+
+    def test_sampled_calls(self):
+        """
+        Only 1 in every N calls is profiled.
+        """
+        profiler = CallProfiler(every=3, threshold=0)
+        profiled = []
+        for _ in range(9):
+            profiling = profiler.start()
+            profiled.append(profiling is not None)
+            if profiling is not None:
+                profiler.stop(profiling)
+        self.assertEqual(profiled, [True, False, False] * 3)
+
+    def test_one_at_a_time(self):
+        """
+        A call starting while another is profiled is left alone.
+        """
+        outer = CallProfiler(every=1, threshold=0)
+        inner = CallProfiler(every=1, threshold=0)
+        profiling = outer.start()
+        self.assertIsNone(inner.start())
+        outer.stop(profiling)
+        profiling = inner.start()
+        self.assertIsNotNone(profiling)
+        inner.stop(profiling)
+
+    def test_threshold(self):
+        """
+        The profile is only kept for calls slower than the threshold.
+        """
+        profiler = CallProfiler(every=1, threshold=60, top=5)
+        duration, profile = profiler.stop(profiler.start())
+        self.assertIsNone(profile)
+        self.assertGreater(duration, 0)
+
+        profiler = CallProfiler(every=1, threshold=0, top=5)
+        profiling = profiler.start()
+        sorted(range(1000))
+        _, profile = profiler.stop(profiling)
+        report = profiler.report(profile)
+        self.assertIn("cumulative", report)
+        self.assertIn("sorted", report)
+
+
+class TestCallMemory(unittest.TestCase):
+    """Unit tests for the CallMemory class."""
+
+    def make_memory(self, **kwargs) -> CallMemory:
+        memory = CallMemory(**kwargs)
+        self.addCleanup(memory.stop_tracing)
+        return memory
+
+    def test_net_and_peak(self):
+        """
+        A call keeping memory counts in net bytes, one freeing it only in the peak.
+        """
+        memory = self.make_memory(threshold=0)
+        kept = []
+        tracking = memory.start()
+        kept.append(bytearray(100_000))
+        self.assertIsNone(memory.stop(tracking))
+        tracking = memory.start()
+        bytearray(1_000_000)
+        memory.stop(tracking)
+
+        summary = memory.take_summary()
+        self.assertEqual(summary["count"], 2)
+        self.assertGreaterEqual(summary["net"], 100_000)
+        self.assertLess(summary["net"], 200_000)
+        self.assertGreaterEqual(summary["max_peak"], 1_000_000)
+        self.assertIsNone(memory.take_summary())
+
+    def test_nested_peak(self):
+        """
+        The peak of a call includes the peak of the calls it makes.
+        """
+        outer = self.make_memory(threshold=0)
+        inner = self.make_memory(threshold=0)
+        outer_tracking = outer.start()
+        inner_tracking = inner.start()
+        bytearray(1_000_000)
+        inner.stop(inner_tracking)
+        outer.stop(outer_tracking)
+        self.assertGreaterEqual(inner.take_summary()["max_peak"], 1_000_000)
+        self.assertGreaterEqual(outer.take_summary()["max_peak"], 1_000_000)
+
+    def test_threshold(self):
+        """
+        Growing over the threshold reports the allocation sites that grew.
+        """
+        memory = self.make_memory(threshold=500_000, top=3)
+        kept = []
+        reports = []
+        for _ in range(8):
+            tracking = memory.start()
+            kept.append(bytearray(100_000))
+            reports.append(memory.stop(tracking))
+
+        grown = [report for report in reports if report is not None]
+        self.assertEqual(len(grown), 1)
+        growth, sites = grown[0]
+        self.assertGreaterEqual(growth, 500_000)
+        self.assertLessEqual(len(sites), 3)
+        self.assertEqual(sites[0].traceback[0].filename, __file__)
+        self.assertGreaterEqual(sites[0].size_diff, 500_000)
+
+    def test_tracing_shared(self):
+        """
+        tracemalloc keeps running until every CallMemory using it stops,
+        and is never stopped if it was running before.
+        """
+        import tracemalloc
+
+        first = self.make_memory(threshold=0)
+        second = self.make_memory(threshold=0)
+        first.stop(first.start())
+        second.stop(second.start())
+        first.stop_tracing()
+        self.assertTrue(tracemalloc.is_tracing())
+        second.stop_tracing()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        first.stop(first.start())
+        first.stop_tracing()
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_format_size(self):
+        """
+        Sizes are shown in the most readable unit.
+        """
+        self.assertEqual(format_size(999), "999B")
+        self.assertEqual(format_size(-2048), "-2KiB")
+        self.assertEqual(format_size(3 << 20), "3MiB")
+
+
+if __name__ == "__main__":
+    unittest.main()
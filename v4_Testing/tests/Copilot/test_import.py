@@ -0,0 +1,51 @@
+'Module to test importing the logging helper'
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# modules the logging helper used to pull in on import without needing them
+HEAVY_MODULES = ["logging.handlers", "socket", "pickle", "pprint", "asyncio", "queue"]
+
+
+class TestImport(unittest.TestCase):
+    """Unit tests guarding what importing log_helper_class does."""
+
+    def import_in(self, cwd: str) -> dict:
+        """
+        Imports log_helper_class in a fresh interpreter running in 'cwd'
+        and returns which of the heavy modules got imported along with it.
+        """
+        code = ("import sys, json\n"
+                "import v4_Testing.log_helper_class\n"
+                f"print(json.dumps({{name: name in sys.modules for name in {HEAVY_MODULES!r}}}))\n")
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stderr, "")
+        return json.loads(result.stdout)
+
+    def test_no_side_effects(self):
+        """
+        Importing the module writes nothing to disk or console.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.import_in(tmp_dir)
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_no_heavy_imports(self):
+        """
+        Importing the module does not import modules it only needs later.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            imported = self.import_in(tmp_dir)
+        self.assertEqual([name for name, found in imported.items() if found], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+'Module to test the binary log format'
+import io
+import os
+import sys
+import json
+import logging
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from v4_Testing import log_binary
+from v4_Testing.log_binary import BinaryRecordEncoder, read_records
+from v4_Testing.log_handlers import BinaryFileHandler
+from v4_Testing.log_helper_class import ConfiguredLogger
+
+
+class TestBinaryFormat(unittest.TestCase):
+    """Unit tests for the binary log format & its decoder."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "binary.logb")
+        self.formatter = ConfiguredLogger.log_file_format
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_record(self, msg: str, *args, **kwargs):
+        record = logging.LogRecord("test_log_binary", kwargs.pop("level", logging.DEBUG),
+                                   "/src/module_a.py", 12, msg, args,
+                                   kwargs.pop("exc_info", None), func="func_a")
+        record.__dict__.update(kwargs)
+        return record
+
+    def write(self, records: list, mode: str = "a"):
+        handler = BinaryFileHandler(self.file_name, mode=mode)
+        for record in records:
+            handler.handle(record)
+        handler.close()
+
+    def check_round_trip(self, records: list):
+        decoded = list(read_records(self.file_name))
+        self.assertEqual([self.formatter.format(record) for record in decoded],
+                         [self.formatter.format(record) for record in records])
+        return decoded
+
+    def test_round_trip(self):
+        """
+        Decoded records give the same text as the records logged.
+        """
+        records = [self.make_record("Starting:\t%s.%s", "module_a", "func_a",
+                                    wrapped_func="module_a.func_a"),
+                   self.make_record("Values %s %r %d %s %s %s", "text", 1.5, -7, True, None,
+                                    2 ** 70, level=logging.WARNING),
+                   self.make_record("Long %s", "x" * 500),
+                   self.make_record("Mapping %(key)s", {"key": "value"}),
+                   self.make_record("No arguments, 100% literal"),
+                   self.make_record("Ending:\t%s.%s", "module_a", "func_a",
+                                    wrapped_func="module_a.func_a", duration_ns=1234)]
+        self.write(records)
+        decoded = self.check_round_trip(records)
+        self.assertEqual(decoded[-1].duration_ns, 1234)
+        self.assertEqual(decoded[-1].wrapped_func, "module_a.func_a")
+
+    def test_exception(self):
+        """
+        The formatted exception is kept.
+        """
+        try:
+            raise ValueError("Just testing failure!")
+        except ValueError:
+            record = self.make_record("Failed", level=logging.ERROR, exc_info=sys.exc_info())
+        self.write([record])
+        self.check_round_trip([record])
+
+    def test_compact(self):
+        """
+        Repeated records take a fraction of their text size.
+        """
+        records = [self.make_record("Starting:\t%s.%s", "module_a", "func_a",
+                                    wrapped_func="module_a.func_a")
+                   for _ in range(1000)]
+        self.write(records)
+        text_size = sum(len(self.formatter.format(record)) + 1 for record in records)
+        self.assertLess(os.path.getsize(self.file_name) * 5, text_size)
+
+    def test_appended_runs(self):
+        """
+        Every run appending to the file starts its own string table.
+        """
+        first = [self.make_record("First run %s", "a")]
+        second = [self.make_record("Second run %s", "b")]
+        self.write(first, mode="w")
+        self.write(second)
+        with open(self.file_name, "rb") as log_file:
+            self.assertEqual(log_file.read().count(log_binary.MAGIC), 2)
+        self.check_round_trip(first + second)
+
+    def test_table_full(self):
+        """
+        A new string table is started once the current one is full.
+        """
+        records = [self.make_record("Value %s", f"unique {num}") for num in range(50)]
+        with patch.object(log_binary, "MAX_STRINGS", log_binary.MAX_ARGS + 20):
+            self.write(records)
+        with open(self.file_name, "rb") as log_file:
+            self.assertGreater(log_file.read().count(log_binary.MAGIC), 2)
+        self.check_round_trip(records)
+
+    def test_rotation(self):
+        """
+        Rotated segments can each be decoded on their own.
+        """
+        handler = BinaryFileHandler(self.file_name, mode="w", max_bytes=200)
+        for num in range(30):
+            handler.handle(self.make_record("Record %s of %s", num, "run"))
+        handler.close()
+
+        segments = sorted(name for name in os.listdir(self.tmp_dir.name)
+                          if name != "binary.logb")
+        self.assertTrue(segments)
+        messages = []
+        for name in segments + ["binary.logb"]:
+            path = os.path.join(self.tmp_dir.name, name)
+            messages += [record.getMessage() for record in read_records(path)]
+        self.assertEqual(messages, [f"Record {num} of run" for num in range(30)])
+
+    def test_truncated(self):
+        """
+        A record cut short - still being written - is left out.
+        """
+        records = [self.make_record("Record %s", num) for num in range(3)]
+        self.write(records)
+        with open(self.file_name, "rb+") as log_file:
+            log_file.truncate(os.path.getsize(self.file_name) - 1)
+        self.check_round_trip(records[:2])
+
+    def test_table_reset_on_open(self):
+        """
+        The encoder's string table is forgotten when a new file is started.
+        """
+        encoder = BinaryRecordEncoder()
+        record = self.make_record("Same %s", "text")
+        first = encoder.encode(record)
+        self.assertLess(len(encoder.encode(record)), len(first))
+        encoder.reset()
+        self.assertEqual(encoder.encode(record), first)
+
+    def test_failed_write(self):
+        """
+        Strings of a record that failed to be written are written again
+        in a new table, so the records after it decode.
+        """
+        handler = BinaryFileHandler(self.file_name, mode="w")
+        handler.handle(self.make_record("Before %s", "failure"))
+        with patch.object(handler, "write_out", side_effect=OSError(28, "No space left")), \
+                patch.object(logging, "raiseExceptions", False):
+            handler.handle(self.make_record("Lost %s", "record"))
+        after = [self.make_record("After %s", "failure"), self.make_record("Lost %s", "record")]
+        for record in after:
+            handler.handle(record)
+        handler.close()
+
+        self.assertEqual([record.getMessage() for record in read_records(self.file_name)],
+                         ["Before failure", "After failure", "Lost record"])
+
+    def test_corrupt_entry(self):
+        """
+        An entry naming a string missing from the table is reported,
+        and decoding goes on from the next table.
+        """
+        encoder = BinaryRecordEncoder()
+        first = encoder.encode(self.make_record("First %s", "table"))
+        # the record without the strings it added to the table
+        orphan = encoder.encode(self.make_record("Orphan %s", "record"))
+        orphan = orphan[orphan.index(log_binary.TAG_RECORD):]
+        encoder.reset()
+        second = encoder.encode(self.make_record("Second %s", "table"))
+        with open(self.file_name, "wb") as log_file:
+            log_file.write(log_binary.MAGIC + first + orphan + log_binary.MAGIC + second)
+
+        errors = io.StringIO()
+        with patch.object(sys, "stderr", errors):
+            messages = [record.getMessage() for record in read_records(self.file_name)]
+        self.assertEqual(messages, ["First table", "Second table"])
+        self.assertIn("Unknown string ID", errors.getvalue())
+
+    def test_cli(self):
+        """
+        The decoder prints the text layout, or JSON lines.
+        """
+        records = [self.make_record("Ending:\t%s.%s", "module_a", "func_a",
+                                    wrapped_func="module_a.func_a", duration_ns=1234)]
+        self.write(records)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            log_binary.main([self.file_name])
+        self.assertEqual(output.getvalue(), self.formatter.format(records[0]) + "\n")
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            log_binary.main([self.file_name, "--json"])
+        fields = json.loads(output.getvalue())
+        self.assertEqual(fields["message"], "Ending:\tmodule_a.func_a")
+        self.assertEqual(fields["duration_ns"], 1234)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+'Module to test the formatters used by the logging helper'
+import sys
+import json
+import time
+import logging
+import unittest
+from unittest.mock import patch
+from v4_Testing.log_formatters import CompiledFormatter, JsonLinesFormatter
+from v4_Testing.log_helper_class import ConfiguredLogger
+
+
+class TestCompiledFormatter(unittest.TestCase):
+    """Unit tests for the CompiledFormatter class."""
+
+    # a minute boundary, and either side of it
+    MINUTE = time.mktime((2024, 2, 17, 23, 58, 0, 0, 0, -1))
+    TIMES = (MINUTE - 0.001, MINUTE, MINUTE + 1.5, MINUTE + 59.999)
+
+    def make_record(self, created: float, exc_info=None):
+        record = logging.LogRecord("test_log_formatters", logging.WARNING, "/src/module_a.py",
+                                   12, "Value %s", (42,), exc_info, func="func_a")
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        return record
+
+    def check_same_output(self, formatter: logging.Formatter):
+        compiled = CompiledFormatter.from_formatter(formatter)
+        self.assertIsInstance(compiled, CompiledFormatter)
+        for created in self.TIMES:
+            self.assertEqual(compiled.format(self.make_record(created)),
+                             formatter.format(self.make_record(created)))
+
+    def test_same_output(self):
+        """
+        The compiled formats give the same output as logging.Formatter.
+        """
+        for formatter in (ConfiguredLogger.log_file_format,
+                          ConfiguredLogger.console_format,
+                          logging.Formatter("%(asctime)s 100%% %(message)s", "%H:%M"),
+                          logging.Formatter("%(asctime)s %(message)s", "%H:%M:%S"),
+                          logging.Formatter("%(levelno)03d %(lineno)5d %(message)r")):
+            with self.subTest(fmt=formatter._fmt, datefmt=formatter.datefmt):
+                self.check_same_output(formatter)
+
+    def test_exception(self):
+        """
+        Exceptions follow the rendered record like with logging.Formatter.
+        """
+        try:
+            raise ValueError("Just testing failure!")
+        except ValueError:
+            exc_info = sys.exc_info()
+        formatter = ConfiguredLogger.log_file_format
+        self.assertEqual(CompiledFormatter.from_formatter(formatter).format(
+                             self.make_record(self.MINUTE, exc_info)),
+                         formatter.format(self.make_record(self.MINUTE, exc_info)))
+
+    def test_time_rendered_once_a_minute(self):
+        """
+        The date & time are only rendered when the minute changes.
+        """
+        formatter = CompiledFormatter("%(asctime)s %(message)s", "%Y-%m-%d %H:%M")
+        with patch("v4_Testing.log_formatters.time.strftime",
+                   side_effect=time.strftime) as strftime:
+            lines = [formatter.format(self.make_record(created)) for created in self.TIMES]
+        self.assertEqual(strftime.call_count, 2)
+        self.assertEqual(lines[1:], ["2024-02-17 23:58 Value 42"] * 3)
+
+    def test_other_formatters_kept(self):
+        """
+        Only plain '%' style formatters are compiled.
+        """
+        for formatter in (JsonLinesFormatter(),
+                          logging.Formatter("{asctime} {message}", style="{")):
+            self.assertIs(CompiledFormatter.from_formatter(formatter), formatter)
+
+
+class TestJsonLinesFormatter(unittest.TestCase):
+    """Unit tests for the JsonLinesFormatter class."""
+
+    def make_record(self, msg: str = "Value %s", args: tuple = (42,), **kwargs):
+        record = logging.LogRecord("test_log_formatters", logging.INFO, "/src/module_a.py",
+                                   12, msg, args, None, func="func_a")
+        record.__dict__.update(kwargs)
+        return record
+
+    def test_default_fields(self):
+        """
+        A record is one line of JSON with the default fields, in order.
+        """
+        record = self.make_record()
+        line = JsonLinesFormatter().format(record)
+        self.assertNotIn("\n", line)
+        fields = json.loads(line)
+        self.assertEqual(list(fields), ["time", "level", "module", "function",
+                                        "line", "message"])
+        self.assertEqual(fields["level"], "INFO")
+        self.assertEqual(fields["module"], "module_a")
+        self.assertEqual(fields["function"], "func_a")
+        self.assertEqual(fields["line"], 12)
+        self.assertEqual(fields["message"], "Value 42")
+
+    def test_time(self):
+        """
+        The time is the local ISO 8601 time of the record, with milliseconds.
+        """
+        record = self.make_record()
+        record.created = time.mktime((2024, 2, 17, 23, 58, 0, 0, 0, -1)) + 0.25
+        record.msecs = 250.0
+        fields = json.loads(JsonLinesFormatter(fields=("time",)).format(record))
+        self.assertTrue(fields["time"].startswith("2024-02-17T23:58:00.250"))
+
+    def test_escaping(self):
+        """
+        Quotes, new lines & non ASCII text are escaped.
+        """
+        message = 'Line "one"\nLine two: café'
+        line = JsonLinesFormatter(fields=("message",)).format(self.make_record(message, ()))
+        self.assertNotIn("\n", line)
+        self.assertEqual(json.loads(line), {"message": message})
+
+    def test_wrapper_fields(self):
+        """
+        The wrapped function & duration are written when the record has them.
+        """
+        record = self.make_record(wrapped_func="module_a.func_a", duration_ns=1500)
+        fields = json.loads(JsonLinesFormatter().format(record))
+        self.assertEqual(fields["wrapped_func"], "module_a.func_a")
+        self.assertEqual(fields["duration_ns"], 1500)
+
+    def test_exception(self):
+        """
+        The formatted exception is written when the record has one.
+        """
+        try:
+            raise ValueError("Just testing failure!")
+        except ValueError:
+            record = self.make_record(exc_info=sys.exc_info())
+        fields = json.loads(JsonLinesFormatter().format(record))
+        self.assertIn("Traceback (most recent call last)", fields["exception"])
+        self.assertIn("ValueError: Just testing failure!", fields["exception"])
+
+    def test_missing_values(self):
+        """
+        Values the record does not have are written as null.
+        """
+        record = self.make_record(funcName=None, process=None)
+        fields = json.loads(JsonLinesFormatter(fields=("function", "process")).format(record))
+        self.assertEqual(fields, {"function": None, "process": None})
+
+    def test_unknown_field(self):
+        """
+        Asking for a field that does not exist fails straight away.
+        """
+        with self.assertRaises(ValueError):
+            JsonLinesFormatter(fields=("time", "colour"))
+
+
+if __name__ == "__main__":
+    unittest.main()
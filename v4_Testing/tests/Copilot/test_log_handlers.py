@@ -0,0 +1,516 @@
+'Module to test the handlers used by the logging helper'
+import os
+import gzip
+import time
+import logging
+import threading
+import tempfile
+import unittest
+from unittest.mock import patch
+from v4_Testing.log_handlers import (LogFileHandler, BufferedFileHandler, LocalQueueHandler,
+                                    FileQueueListener, LogRetention, RingBufferHandler, RepeatFilter)
+
+
+class TestLogFileHandler(unittest.TestCase):
+    """Unit tests for the LogFileHandler class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "logs", "lazy.log")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_created_on_first_record(self):
+        """
+        The log folder and file are only created by the first record.
+        """
+        handler = LogFileHandler(self.file_name, mode="w")
+        self.assertFalse(os.path.exists(os.path.dirname(self.file_name)))
+
+        handler.handle(logging.makeLogRecord({"msg": "first record"}))
+        handler.close()
+        with open(self.file_name, encoding="utf-8") as log_file:
+            self.assertEqual(log_file.read(), "first record\n")
+
+
+class TestRingBufferHandler(unittest.TestCase):
+    """Unit tests for the RingBufferHandler class."""
+
+    def test_keeps_last_records(self):
+        """
+        Only the last records are kept, and taking them empties the buffer.
+        """
+        handler = RingBufferHandler(3)
+        for num in range(10):
+            handler.handle(logging.makeLogRecord({"msg": f"record {num}"}))
+
+        self.assertEqual([record.msg for record in handler.take()],
+                         ["record 7", "record 8", "record 9"])
+        self.assertEqual(handler.take(), [])
+
+    def test_arguments_as_logged(self):
+        """
+        Records show their arguments as they were when logged.
+        """
+        handler = RingBufferHandler(10)
+        progress = {"done": 0}
+        for num in range(3):
+            progress["done"] = num
+            handler.handle(logging.makeLogRecord({"msg": "Progress %s of %s",
+                                                  "args": (progress, "rows")}))
+        self.assertEqual([record.getMessage() for record in handler.take()],
+                         ["Progress {'done': 0} of rows", "Progress {'done': 1} of rows",
+                          "Progress {'done': 2} of rows"])
+
+
+class TestLocalQueueHandler(unittest.TestCase):
+    """Unit tests for the LocalQueueHandler class."""
+
+    def test_arguments_as_logged(self):
+        """
+        Changeable arguments are formatted when the record is queued,
+        others are left for the writer thread.
+        """
+        import queue
+
+        records = queue.SimpleQueue()
+        handler = LocalQueueHandler(records)
+        progress = [0]
+        for num in range(3):
+            progress[0] = num
+            handler.handle(logging.makeLogRecord({"msg": "Progress %s", "args": (progress,)}))
+        handler.handle(logging.makeLogRecord({"msg": "Done %s of %s", "args": (3, "rows")}))
+
+        queued = [records.get_nowait() for _ in range(4)]
+        self.assertEqual([record.getMessage() for record in queued],
+                         ["Progress [0]", "Progress [1]", "Progress [2]", "Done 3 of rows"])
+        self.assertIsNone(queued[0].args)
+        self.assertEqual(queued[3].args, (3, "rows"))
+
+
+class TestFileQueueListener(unittest.TestCase):
+    """Unit tests for the FileQueueListener class."""
+
+    def setUp(self):
+        import queue
+
+        self.handler = RingBufferHandler(100, logging.INFO)
+        self.queue_handler = LocalQueueHandler(queue.SimpleQueue())
+        self.listener = FileQueueListener(self.queue_handler.queue, self.handler)
+        self.listener.start()
+        self.addCleanup(self.listener.stop)
+
+    def test_flush_keeps_running(self):
+        """
+        Flushing waits for the queued records without stopping the writer thread.
+        """
+        thread = self.listener.thread
+        for num in range(50):
+            self.queue_handler.handle(logging.makeLogRecord({"msg": f"record {num}",
+                                                             "levelno": logging.INFO}))
+        self.listener.flush()
+
+        self.assertEqual(len(self.handler.take()), 50)
+        self.assertIs(self.listener.thread, thread)
+        self.assertTrue(thread.is_alive())
+
+    def test_handler_level(self):
+        """
+        Records below the handler level are not written.
+        """
+        for lvl in (logging.DEBUG, logging.INFO):
+            self.queue_handler.handle(logging.makeLogRecord({"msg": "record",
+                                                             "levelno": lvl}))
+        self.listener.flush()
+
+        self.assertEqual([record.levelno for record in self.handler.take()], [logging.INFO])
+
+    def test_flush_after_stop(self):
+        """
+        Flushing a stopped writer does not wait.
+        """
+        self.listener.stop()
+        self.listener.flush()
+
+
+class TestRepeatFilter(unittest.TestCase):
+    """Unit tests for the RepeatFilter class."""
+
+    def setUp(self):
+        self.logger = logging.Logger("test_repeat_filter")
+        self.handler = RingBufferHandler(100)
+        self.logger.addHandler(self.handler)
+        self.repeat_filter = RepeatFilter(self.logger, max_interval=60)
+        self.logger.addFilter(self.repeat_filter)
+
+    def messages(self) -> list:
+        return [record.getMessage() for record in self.handler.take()]
+
+    def log_at(self, created: float, msg: str, *args, level: int = logging.WARNING):
+        with patch("time.time", return_value=created), \
+                patch("time.time_ns", return_value=int(created * 1e9)):
+            self.logger.log(level, msg, *args)
+
+    def test_repeats_summed_up(self):
+        """
+        Repeats are held back until a different record comes along.
+        """
+        for num in range(5):
+            self.log_at(100 + num, "Retrying %s", "db")
+        self.log_at(110, "Retrying %s", "cache")
+        self.log_at(111, "Retrying %s", "cache", level=logging.ERROR)
+
+        self.assertEqual(self.messages(), ["Retrying db",
+                                           "Last message repeated 4 times over 4s",
+                                           "Retrying cache",
+                                           "Retrying cache"])
+
+    def test_time_limit(self):
+        """
+        Long runs of repeats are summed up every 'max_interval' seconds.
+        """
+        for num in range(0, 130, 10):
+            self.log_at(1000 + num, "Polling")
+        self.assertEqual(self.messages(), ["Polling",
+                                           "Last message repeated 6 times over 60s",
+                                           "Last message repeated 6 times over 60s"])
+        self.log_at(1125, "Polling")
+        self.repeat_filter.flush()
+        self.assertEqual(self.messages(), ["Last message repeated 1 times over 5s"])
+
+    def test_summary_level(self):
+        """
+        The summary has the level & location of the repeated record,
+        and exceptions are never held back.
+        """
+        self.log_at(100, "Failed")
+        self.log_at(101, "Failed")
+        self.repeat_filter.flush()
+        records = self.handler.take()
+        self.assertEqual(records[-1].levelno, logging.WARNING)
+        self.assertEqual(records[-1].funcName, records[0].funcName)
+
+        try:
+            raise ValueError("Just testing failure!")
+        except ValueError:
+            self.logger.exception("Failed")
+            self.logger.exception("Failed")
+        self.assertEqual(self.messages(), ["Failed", "Failed"])
+
+    def test_changed_arguments(self):
+        """
+        An argument changed between records is compared as it was logged.
+        """
+        progress = [0]
+        for num in range(5):
+            progress[0] = num
+            self.log_at(100 + num, "Progress %s", progress)
+        progress[0] = 4
+        self.log_at(105, "Progress %s", progress)
+        self.repeat_filter.flush()
+
+        messages = self.messages()
+        self.assertEqual(len(messages), 6)
+        self.assertEqual(messages[-1], "Last message repeated 1 times over 1s")
+
+
+class TestDailyRollover(unittest.TestCase):
+    """Unit tests for the daily rollover of the LogFileHandler class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pattern = os.path.join(self.tmp_dir.name, "{date}_rollover.log")
+        # one day & a few minutes before its midnight
+        self.day = time.mktime((2024, 2, 17, 23, 58, 0, 0, 0, -1))
+        self.next_day = time.mktime((2024, 2, 18, 0, 1, 0, 0, 0, -1))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_handler(self, handler_class=LogFileHandler, **kwargs):
+        with patch("v4_Testing.log_handlers.time.time", return_value=self.day):
+            handler = handler_class(self.pattern, mode="w", daily_rollover=True, **kwargs)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        return handler
+
+    def make_record(self, msg: str, created: float):
+        record = logging.makeLogRecord({"msg": msg, "levelno": logging.DEBUG,
+                                        "levelname": "DEBUG"})
+        record.created = created
+        return record
+
+    def read_log(self, date: str):
+        with open(self.pattern.replace("{date}", date), encoding="utf-8") as log_file:
+            return log_file.read()
+
+    def check_rollover(self, handler):
+        handler.handle(self.make_record("before midnight", self.day))
+        handler.handle(self.make_record("also before midnight", self.day + 60))
+        handler.handle(self.make_record("after midnight", self.next_day))
+        handler.handle(self.make_record("later that day", self.next_day + 60))
+        handler.close()
+
+        self.assertEqual(self.read_log("2024-02-17"),
+                         "DEBUG before midnight\n"
+                         "DEBUG also before midnight\n"
+                         "DEBUG === Ending of Logs ===\n")
+        self.assertEqual(self.read_log("2024-02-18"),
+                         "DEBUG === Starting of Logs ===\n"
+                         "DEBUG after midnight\n"
+                         "DEBUG later that day\n")
+
+    def test_file_name_dated(self):
+        """
+        The date placeholder is filled in with the current date.
+        """
+        handler = self.make_handler()
+        self.assertEqual(handler.baseFilename, self.pattern.replace("{date}", "2024-02-17"))
+        self.assertEqual(handler.rollover_at, time.mktime((2024, 2, 18, 0, 0, 0, 0, 0, -1)))
+
+    def test_rollover(self):
+        """
+        Records go to the file of their day, with markers at the boundary.
+        """
+        self.check_rollover(self.make_handler())
+
+    def test_rollover_buffered(self):
+        """
+        Buffered records go to the file of their day, with markers at the boundary.
+        """
+        self.check_rollover(self.make_handler(BufferedFileHandler,
+                                              buffer_size=10_000, flush_interval=60))
+
+    def test_no_rollover(self):
+        """
+        Without daily rollover everything goes to the first file.
+        """
+        with patch("v4_Testing.log_handlers.time.time", return_value=self.day):
+            handler = LogFileHandler(self.pattern, mode="w")
+        handler.handle(self.make_record("before midnight", self.day))
+        handler.handle(self.make_record("after midnight", self.next_day))
+        handler.close()
+        self.assertEqual(self.read_log("2024-02-17"), "before midnight\nafter midnight\n")
+
+
+class TestSizeRotation(unittest.TestCase):
+    """Unit tests for the size based rotation of the LogFileHandler class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "rotated.log")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self, name: str) -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as log_file:
+            return log_file.read()
+
+    def test_rotation(self):
+        """
+        Files are moved aside to compressed segments without losing records.
+        """
+        handler = LogFileHandler(self.file_name, mode="w", max_bytes=40,
+                                 retention=LogRetention(self.tmp_dir.name))
+        for num in range(10):
+            handler.handle(logging.makeLogRecord({"msg": f"record number {num}"}))
+        handler.close()
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                         ["rotated.1.log.gz", "rotated.2.log.gz", "rotated.3.log.gz",
+                          "rotated.4.log.gz", "rotated.log"])
+        text = "".join(self.read(name) for name in ["rotated.1.log.gz", "rotated.2.log.gz",
+                                                    "rotated.3.log.gz", "rotated.4.log.gz",
+                                                    "rotated.log"])
+        self.assertEqual(text, "".join(f"record number {num}\n" for num in range(10)))
+
+    def test_compressed_in_background(self):
+        """
+        Segments are compressed on the retention thread, not the logging one.
+        """
+        compress_threads = {}
+        compress_file = LogRetention.compress_file
+
+        def record_thread(path):
+            compress_threads[os.path.basename(path)] = threading.current_thread()
+            compress_file(path)
+
+        retention = LogRetention(self.tmp_dir.name)
+        handler = LogFileHandler(self.file_name, max_bytes=10, retention=retention)
+        with patch.object(LogRetention, "compress_file", side_effect=record_thread):
+            for num in range(3):
+                handler.handle(logging.makeLogRecord({"msg": f"record {num}"}))
+            handler.close()
+
+        self.assertEqual(sorted(compress_threads), ["rotated.1.log", "rotated.2.log"])
+        self.assertNotIn(threading.current_thread(), compress_threads.values())
+
+
+class TestLogRetention(unittest.TestCase):
+    """Unit tests for the LogRetention class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        now = time.time()
+        # oldest first, a day apart
+        self.names = ["a.log", "b.log.gz", "c.log", "d.log"]
+        for age, name in enumerate(reversed(self.names)):
+            path = os.path.join(self.tmp_dir.name, name)
+            with open(path, "w", encoding="utf-8") as log_file:
+                log_file.write("x" * 100)
+            os.utime(path, (now - age * 86400, now - age * 86400))
+        with open(os.path.join(self.tmp_dir.name, "notes.txt"), "w", encoding="utf-8"):
+            pass
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def prune(self, keep: str = None, **kwargs) -> list:
+        retention = LogRetention(self.tmp_dir.name, **kwargs)
+        retention.submit(keep=keep and os.path.join(self.tmp_dir.name, keep))
+        retention.close()
+        return sorted(os.listdir(self.tmp_dir.name))
+
+    def test_max_files(self):
+        """
+        The oldest log files are deleted down to the number kept.
+        """
+        self.assertEqual(self.prune(max_files=2), ["c.log", "d.log", "notes.txt"])
+
+    def test_max_age_days(self):
+        """
+        Log files older than the age kept are deleted.
+        """
+        self.assertEqual(self.prune(max_age_days=1.5), ["c.log", "d.log", "notes.txt"])
+
+    def test_max_total_bytes(self):
+        """
+        The oldest log files are deleted until the folder is small enough.
+        """
+        self.assertEqual(self.prune(max_total_bytes=350),
+                         ["b.log.gz", "c.log", "d.log", "notes.txt"])
+
+    def test_keep(self):
+        """
+        The file being written to is never deleted.
+        """
+        self.assertEqual(self.prune(keep="a.log", max_files=2),
+                         ["a.log", "d.log", "notes.txt"])
+
+    def test_keep_relative(self):
+        """
+        The file being written to is kept when the folder is given relative
+        to the working directory and the file by its full path.
+        """
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+        retention = LogRetention(".", max_files=1)
+        retention.submit(keep=os.path.abspath("a.log"))
+        retention.close()
+        self.assertEqual(sorted(os.listdir(".")), ["a.log", "notes.txt"])
+
+    def test_leftover_segments_compressed(self):
+        """
+        Segments left uncompressed by an earlier run are compressed.
+        """
+        with open(os.path.join(self.tmp_dir.name, "d.1.log"), "w", encoding="utf-8") as log_file:
+            log_file.write("leftover")
+        files = self.prune()
+        self.assertIn("d.1.log.gz", files)
+        self.assertNotIn("d.1.log", files)
+
+
+class TestBufferedFileHandler(unittest.TestCase):
+    """Unit tests for the BufferedFileHandler class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "buffered.log")
+        self.logger = logging.getLogger("test_log_handlers.buffered")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        for handler in self.logger.handlers[:]:
+            handler.close()
+            self.logger.removeHandler(handler)
+        self.tmp_dir.cleanup()
+
+    def add_handler(self, **kwargs):
+        handler = BufferedFileHandler(self.file_name, mode="w", **kwargs)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        self.logger.addHandler(handler)
+        return handler
+
+    def read_log(self):
+        with open(self.file_name, encoding="utf-8") as log_file:
+            return log_file.read()
+
+    def test_buffers_until_size(self):
+        """
+        Records stay in memory until the buffer size is reached.
+        """
+        handler = self.add_handler(buffer_size=200, flush_interval=60)
+        self.logger.debug("first")
+        self.assertFalse(os.path.exists(self.file_name))
+        self.assertEqual(handler.buffer, ["DEBUG first\n"])
+
+        for _ in range(20):
+            self.logger.debug("filler record")
+        self.assertIn("DEBUG first\n", self.read_log())
+        self.assertLess(handler.buffered, 200)
+
+    def test_single_write_per_flush(self):
+        """
+        All buffered records are written with a single write call.
+        """
+        handler = self.add_handler(buffer_size=10_000, flush_interval=60, delay=False)
+        for num in range(50):
+            self.logger.debug("record %s", num)
+
+        writes = []
+        write = handler.stream.write
+
+        def count_write(text):
+            writes.append(text)
+            return write(text)
+
+        handler.stream.write = count_write
+        handler.flush()
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.read_log().count("\n"), 50)
+
+    def test_flush_on_error(self):
+        """
+        ERROR records write out the buffer straight away.
+        """
+        self.add_handler(buffer_size=10_000, flush_interval=60)
+        self.logger.debug("before failure")
+        self.logger.error("failure")
+        self.assertEqual(self.read_log(), "DEBUG before failure\nERROR failure\n")
+
+    def test_flush_on_interval(self):
+        """
+        Quiet periods still get written once the interval passes.
+        """
+        handler = self.add_handler(buffer_size=10_000, flush_interval=0.01)
+        self.logger.debug("waiting")
+        handler._stop_flusher.wait(0.2)
+        self.assertEqual(self.read_log(), "DEBUG waiting\n")
+
+    def test_close_writes_buffer(self):
+        """
+        Closing the handler writes out anything left in the buffer.
+        """
+        handler = self.add_handler(buffer_size=10_000, flush_interval=60)
+        self.logger.debug("last words")
+        handler.close()
+        self.assertEqual(self.read_log(), "DEBUG last words\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
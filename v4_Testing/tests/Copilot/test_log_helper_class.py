@@ -1,7 +1,59 @@
 'Module to test logging wrapper class'
+import os
+import gzip
+import time
+import json
+import asyncio
+import inspect
+import logging
+import tempfile
+import threading
 import traceback
 import unittest
-from v4_Testing.log_helper_class import ConfiguredLogger
+from unittest.mock import patch
+import v4_Testing.log_helper_class as log_helper_class
+from v4_Testing.log_helper_class import ConfiguredLogger, get_caller_info
+from v4_Testing.log_handlers import BufferedFileHandler
+from v4_Testing.log_formatters import CompiledFormatter
+from v4_Testing.log_binary import read_records
+from v4_Testing.tests.Copilot.fake_smtp import FakeSMTP
+
+
+class TempLoggerTestCase(unittest.TestCase):
+    """
+    Base of the tests of ConfiguredLoggers writing to a temporary folder,
+    each disabled at the end of its test.
+    """
+
+    # settings of the logger built for every test as 'self.logger',
+    # over the defaults of make_logger - None to build them in the tests
+    logger_options = None
+    # turned off to keep records from the handlers of the test runner
+    propagate = True
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        if self.logger_options is not None:
+            self.logger = self.make_logger(**self.logger_options)
+
+    def make_logger(self, **kwargs) -> ConfiguredLogger:
+        """
+        Returns a logger writing to the temporary folder without console
+        output, unless 'kwargs' say otherwise.
+        """
+        options = {"file_mode": "w", "log_loc": self.tmp_dir.name, "init_console_setup": 0}
+        logger = ConfiguredLogger(**dict(options, **kwargs))
+        if not self.propagate:
+            logger.logger.propagate = False
+            self.addCleanup(setattr, logger.logger, "propagate", True)
+        self.addCleanup(logger.disable_all_logging)
+        return logger
+
+    def read_log(self, logger: ConfiguredLogger = None) -> str:
+        with open((logger or self.logger).file_name_out, encoding="utf-8") as log_file:
+            return log_file.read()
+
 
 class TestFunctionDecorator(unittest.TestCase):
     """Unit tests for the function decorator of the ConfiguredLogger class."""
@@ -199,5 +251,1319 @@ class TestConfiguredLogger(unittest.TestCase):
         pass
 
 
+class TestLogRetentionLogging(TempLoggerTestCase):
+    """Unit tests for pruning the log folder of a ConfiguredLogger."""
+
+    propagate = False
+
+    def setUp(self):
+        super().setUp()
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_relative_log_loc_keeps_live_file(self):
+        """
+        With a relative log_loc the file being written to is never pruned.
+        """
+        os.makedirs("logs")
+        with open(os.path.join("logs", "old.log"), "w", encoding="utf-8") as log_file:
+            log_file.write("old run")
+        logger = self.make_logger(file_name_in="Test_Retention_File",
+                                  log_loc="logs",
+                                  max_files=1)
+        for num in range(3):
+            logger.logger.info("Record %s", num)
+        logger.file_handler.retention.close()
+        logger.disable_all_logging()
+
+        self.assertEqual(os.listdir("logs"), [os.path.basename(logger.file_name_out)])
+        self.assertIn("Record 2", self.read_log(logger))
+
+
+class TestQueueLogging(TempLoggerTestCase):
+    """Unit tests for the queue-backed file output of the ConfiguredLogger class."""
+
+    logger_options = {"file_name_in": "Test_Queue_File", "use_queue": True}
+
+    def test_queue_handler_attached(self):
+        """
+        Only the queue handler is attached to the logger - the file handler
+        is served by the writer thread.
+        """
+        self.assertIn(self.logger.queue_handler, self.logger.logger.handlers)
+        self.assertNotIn(self.logger.file_handler, self.logger.logger.handlers)
+        self.assertIsNotNone(self.logger.queue_listener)
+
+    def test_written_by_writer_thread(self):
+        """
+        Records are written to file from the writer thread, not the caller.
+        """
+        writer_threads = []
+        emit = self.logger.file_handler.emit
+
+        def record_thread(record):
+            writer_threads.append(threading.current_thread())
+            emit(record)
+
+        self.logger.file_handler.emit = record_thread
+        self.logger.logger.debug("Queued record")
+        self.logger.stop_file_queue()
+
+        self.assertTrue(writer_threads)
+        self.assertNotIn(threading.current_thread(), writer_threads)
+        self.assertIn("Queued record", self.read_log())
+
+    def test_disable_all_logging_drains(self):
+        """
+        Disabling all logging drains the queue before closing the file.
+        """
+        for num in range(500):
+            self.logger.logger.debug("Record %s", num)
+        self.logger.disable_all_logging()
+
+        log_text = self.read_log()
+        self.assertIn("Record 499", log_text)
+        self.assertIn("=== Ending of Logs ===", log_text)
+        self.assertIsNone(self.logger.queue_listener)
+
+    def test_arguments_as_logged(self):
+        """
+        Arguments changed right after logging are written as they were logged.
+        """
+        progress = {"done": 0}
+        for num in range(200):
+            progress["done"] = num
+            self.logger.logger.debug("Progress %s", progress)
+        self.logger.stop_file_queue()
+
+        log_text = self.read_log()
+        for num in range(200):
+            self.assertIn(f"Progress {{'done': {num}}}", log_text)
+
+    def test_exit_drains(self):
+        """
+        Leaving a 'with' block drains the queue before closing the file.
+        """
+        with self.logger:
+            self.logger.logger.debug("Inside with block")
+
+        log_text = self.read_log()
+        self.assertIn("Inside with block", log_text)
+        self.assertIn("=== Ending of Logs ===", log_text)
+
+    def test_sol_wrapper_drains(self):
+        """
+        Finishing a sol_wrapper wrapped function drains the queue.
+        """
+        @self.logger.sol_wrapper(using_exit=False)
+        def test_function():
+            self.logger.logger.debug("Inside solution")
+
+        test_function()
+        log_text = self.read_log()
+        self.assertIn("Inside solution", log_text)
+        self.assertIn("=== Ending of Logs ===", log_text)
+
+    def test_exceptions_from_threads(self):
+        """
+        Exceptions raised on several threads at once are each logged
+        and raised, while the writer thread keeps running.
+        """
+        @self.logger.func_wrapper
+        def test_function(num):
+            raise ValueError(f"Failure {num}")
+
+        writer_thread = self.logger.queue_listener.thread
+        raised = []
+
+        def call(num):
+            try:
+                test_function(num)
+            except ValueError as err:
+                raised.append(err)
+
+        threads = [threading.Thread(target=call, args=(num,)) for num in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(raised), 8)
+        self.assertIs(self.logger.queue_listener.thread, writer_thread)
+        log_text = self.read_log()
+        for num in range(8):
+            self.assertIn(f"Failure {num}", log_text)
+
+
+class TestBufferedLogging(TempLoggerTestCase):
+    """Unit tests for the buffered file output of the ConfiguredLogger class."""
+
+    def check_exception_on_disk(self, **kwargs):
+        logger = self.make_logger(file_name_in="Test_Buffered_File",
+                                  buffer_size=64 * 1024,
+                                  flush_interval=60,
+                                  **kwargs)
+
+        @logger.func_wrapper
+        def test_function():
+            raise ValueError("Just testing failure!")
+
+        with self.assertRaises(ValueError):
+            try:
+                test_function()
+            finally:
+                log_text = self.read_log(logger)
+        self.assertIn("Log review needed!", log_text)
+        self.assertIn("ValueError: Just testing failure!", log_text)
+
+    def test_buffered_handler_used(self):
+        """
+        A buffer size selects the buffered file handler.
+        """
+        logger = self.make_logger(file_name_in="Test_Buffered_File", buffer_size=1024)
+        self.assertIsInstance(logger.file_handler, BufferedFileHandler)
+        self.assertEqual(logger.file_handler.buffer_size, 1024)
+
+    def test_exception_on_disk(self):
+        """
+        The exception path is written to file before the exception propagates.
+        """
+        self.check_exception_on_disk()
+
+    def test_exception_on_disk_with_queue(self):
+        """
+        The exception path is written to file before the exception propagates,
+        even when records go through the writer thread.
+        """
+        self.check_exception_on_disk(use_queue=True)
+
+
+class TestFlightRecorder(TempLoggerTestCase):
+    """Unit tests for the in-memory flight recorder of the ConfiguredLogger class."""
+
+    propagate = False
+
+    def make_logger(self, **kwargs):
+        return super().make_logger(file_name_in="Test_Flight_Recorder",
+                                   file_lvl=logging.WARNING,
+                                   flight_recorder=5,
+                                   **kwargs)
+
+    def check_dumped_before_traceback(self, **kwargs):
+        logger = self.make_logger(**kwargs)
+
+        @logger.func_wrapper
+        def test_function(num):
+            if num == 20:
+                raise ValueError("Just testing failure!")
+            logger.logger.debug("Step %s done", num)
+
+        logger.logger.warning("Normal warning")
+        with self.assertRaises(ValueError):
+            for num in range(21):
+                test_function(num)
+
+        log_text = self.read_log(logger)
+        self.assertIn("Normal warning", log_text)
+        # only the last records are kept
+        self.assertNotIn("Step 18 done", log_text)
+        self.assertIn("=== Last 5 records before the exception ===", log_text)
+        self.assertIn("Step 19 done", log_text)
+        self.assertLess(log_text.index("Normal warning"), log_text.index("Step 19 done"))
+        self.assertLess(log_text.index("Step 19 done"),
+                        log_text.index("ValueError exception within"))
+        self.assertLess(log_text.index("ValueError exception within"),
+                        log_text.index("Traceback (most recent call last)"))
+
+    def test_only_warnings_written(self):
+        """
+        Without an exception DEBUG records stay in memory, bounded.
+        """
+        logger = self.make_logger()
+        for num in range(100):
+            logger.logger.debug("Step %s done", num)
+        logger.logger.warning("Normal warning")
+
+        self.assertEqual(len(logger.flight_handler.records), 5)
+        log_text = self.read_log(logger)
+        self.assertIn("Normal warning", log_text)
+        self.assertNotIn("Step", log_text)
+
+    def test_dumped_before_traceback(self):
+        """
+        The recent DEBUG records are written just before the traceback.
+        """
+        self.check_dumped_before_traceback()
+
+    def test_dumped_before_traceback_with_queue(self):
+        """
+        The recent DEBUG records are written just before the traceback,
+        even when records go through the writer thread.
+        """
+        self.check_dumped_before_traceback(use_queue=True)
+
+    def test_async_dump_never_drains(self):
+        """
+        An exception on an event loop dumps the records through the
+        writer thread, without waiting on it.
+        """
+        logger = self.make_logger(use_queue=True)
+        writer_threads = []
+        emit = logger.file_handler.emit
+
+        def record_thread(record):
+            writer_threads.append(threading.current_thread())
+            emit(record)
+
+        logger.file_handler.emit = record_thread
+
+        @logger.func_wrapper
+        async def test_function():
+            logger.logger.debug("Step done")
+            raise ValueError("Just testing failure!")
+
+        with patch.object(logger, "flush_file_logging") as flush:
+            with self.assertRaises(ValueError):
+                asyncio.run(test_function())
+        flush.assert_not_called()
+        logger.stop_file_queue()
+        self.assertNotIn(threading.current_thread(), writer_threads)
+
+        logger.disable_all_logging()
+        log_text = self.read_log(logger)
+        self.assertLess(log_text.index("Step done"),
+                        log_text.index("Traceback (most recent call last)"))
+
+
+class TestJsonLinesLogging(TempLoggerTestCase):
+    """Unit tests for the JSON-lines file output of the ConfiguredLogger class."""
+
+    logger_options = {"file_name_in": "Test_Json_File", "json_lines": True}
+    propagate = False
+
+    def test_wrapped_call(self):
+        """
+        Every line is JSON, and the end of a wrapped call has its duration.
+        """
+        @self.logger.func_wrapper
+        def test_function():
+            pass
+
+        test_function()
+        self.logger.disable_all_logging()
+        records = [json.loads(line) for line in self.read_log().splitlines()]
+
+        self.assertEqual(records[0]["message"], "=== Starting of Logs ===")
+        ending = next(record for record in records
+                      if record["message"].startswith("Ending:"))
+        self.assertEqual(ending["function"], "test_function")
+        self.assertEqual(ending["wrapped_func"], f"{__name__}.test_function")
+        self.assertGreater(ending["duration_ns"], 0)
+
+    def check_wrapped_exception(self, logger):
+        @logger.func_wrapper
+        def test_function():
+            raise ValueError("Just testing failure!")
+
+        with self.assertRaises(ValueError):
+            test_function()
+        logger.disable_all_logging()
+        records = [json.loads(line) for line in self.read_log(logger).splitlines()]
+
+        error = next(record for record in records if record["level"] == "ERROR")
+        self.assertEqual(error["message"], "ValueError: Just testing failure!")
+        self.assertTrue(error["exception"].startswith("Traceback (most recent call last):"))
+        self.assertIn("in test_function", error["exception"])
+        self.assertEqual(error["function"], "test_function")
+        self.assertEqual(error["wrapped_func"], f"{__name__}.test_function")
+
+    def test_wrapped_exception(self):
+        """
+        The traceback of an exception caught by func_wrapper is in the
+        exception field of a record about the wrapped function.
+        """
+        self.check_wrapped_exception(self.logger)
+
+    def test_wrapped_exception_deferred(self):
+        """
+        So is a deferred traceback.
+        """
+        self.logger.disable_all_logging()
+        logger = self.make_logger(file_name_in="Test_Json_Deferred_File",
+                                  json_lines=True,
+                                  deferred_traceback=True)
+        self.check_wrapped_exception(logger)
+
+    def test_chosen_fields(self):
+        """
+        Only the chosen JSON fields are written, in the order given.
+        """
+        self.logger.disable_all_logging()
+        logger = self.make_logger(file_name_in="Test_Json_Fields_File",
+                                  json_lines=True,
+                                  json_fields=("level", "message", "thread"))
+        logger.logger.warning("Chosen fields")
+        logger.disable_all_logging()
+        records = [json.loads(line) for line in self.read_log(logger).splitlines()]
+
+        warning = next(record for record in records if record["level"] == "WARNING")
+        self.assertEqual(list(warning), ["level", "message", "thread"])
+        self.assertEqual(warning["message"], "Chosen fields")
+
+    def test_unknown_fields(self):
+        """
+        Unknown JSON fields are refused before anything is set up.
+        """
+        with self.assertRaisesRegex(ValueError, "Unknown JSON fields: colour"):
+            self.make_logger(file_name_in="Test_Json_Unknown_File",
+                             log_loc=os.path.join(self.tmp_dir.name, "unknown"),
+                             json_lines=True,
+                             json_fields=("message", "colour"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "unknown")))
+
+
+class TestCompiledFormats(TempLoggerTestCase):
+    """Unit tests for the compiled formats option of the ConfiguredLogger class."""
+
+    def test_formats_compiled(self):
+        """
+        Both the file & console formats are compiled.
+        """
+        logger = self.make_logger(file_name_in="Test_Compiled_File",
+                                  init_console_setup=1,
+                                  compiled_formats=True)
+        self.assertIsInstance(logger.file_handler.formatter, CompiledFormatter)
+        self.assertIsInstance(logger.console_handler.formatter, CompiledFormatter)
+        self.assertIs(ConfiguredLogger.log_file_format.__class__, logging.Formatter)
+
+
+class TestBinaryLogging(TempLoggerTestCase):
+    """Unit tests for the binary file output of the ConfiguredLogger class."""
+
+    propagate = False
+
+    def test_binary_file(self):
+        """
+        Records go to a '.logb' file the decoder reads back.
+        """
+        logger = self.make_logger(file_name_in="Test_Binary_File", binary_format=True)
+
+        @logger.func_wrapper
+        def test_function():
+            pass
+
+        test_function()
+        logger.disable_all_logging()
+
+        self.assertTrue(logger.file_name_out.endswith("_Test_Binary_File.logb"))
+        messages = [record.getMessage() for record in read_records(logger.file_name_out)]
+        self.assertEqual(messages[0], "=== Starting of Logs ===")
+        self.assertIn(f"Ending:\t{__name__}.test_function", messages)
+        self.assertEqual(messages[-1], "=== Ending of Logs ===")
+
+
+class FrozenError(Exception):
+    """Exception refusing new attributes."""
+
+    def __setattr__(self, name, value):
+        raise AttributeError(name)
+
+
+class TestExceptionLogging(TempLoggerTestCase):
+    """Unit tests for logging each exception once in the ConfiguredLogger class."""
+
+    logger_options = {"file_name_in": "Test_Exception_Logging"}
+    propagate = False
+
+    def test_nested_wrappers(self):
+        """
+        An exception going up through nested wrappers is logged once.
+        """
+        @self.logger.func_wrapper
+        def outer():
+            return middle()
+
+        @self.logger.func_wrapper
+        def middle():
+            return inner()
+
+        @self.logger.func_wrapper
+        def inner():
+            raise ValueError("Just testing failure!")
+
+        with self.assertRaises(ValueError):
+            outer()
+        log_text = self.read_log()
+        self.assertEqual(log_text.count("Traceback (most recent call last)"), 1)
+        self.assertIn("ValueError exception within test_log_helper_class.inner", log_text)
+
+    def test_later_exceptions_logged(self):
+        """
+        Every new exception is logged, not only the first one.
+        """
+        @self.logger.func_wrapper
+        def test_function(num):
+            raise ValueError(f"Failure {num}")
+
+        for num in range(3):
+            with self.assertRaises(ValueError):
+                test_function(num)
+        log_text = self.read_log()
+        self.assertEqual(log_text.count("Traceback (most recent call last)"), 3)
+        self.assertEqual(log_text.count("Log review needed!"), 3)
+        self.assertIn("ValueError: Failure 2", log_text)
+
+    def test_unmarkable_exceptions(self):
+        """
+        Exceptions refusing the mark are still logged once, and
+        remembering them stays bounded.
+        """
+        @self.logger.func_wrapper
+        def outer():
+            return inner()
+
+        @self.logger.func_wrapper
+        def inner():
+            raise FrozenError("Just testing failure!")
+
+        for _ in range(log_helper_class.MAX_UNMARKABLE + 10):
+            with self.assertRaises(FrozenError):
+                outer()
+        log_text = self.read_log()
+        self.assertEqual(log_text.count("Traceback (most recent call last)"),
+                         log_helper_class.MAX_UNMARKABLE + 10)
+        self.assertLessEqual(len(log_helper_class.unmarkable_exceptions),
+                             log_helper_class.MAX_UNMARKABLE)
+
+
+class TestDeferredTraceback(TempLoggerTestCase):
+    """Unit tests for the deferred tracebacks of the ConfiguredLogger class."""
+
+    propagate = False
+
+    def make_logger(self, **kwargs):
+        return super().make_logger(file_name_in="Test_Deferred_Traceback",
+                                   deferred_traceback=True,
+                                   **kwargs)
+
+    def run_recursion(self, logger, depth: int) -> str:
+        @logger.func_wrapper
+        def test_function():
+            return countdown(depth)
+
+        def countdown(num):
+            if num == 0:
+                raise ValueError("Just testing failure!")
+            return countdown(num - 1)
+
+        with self.assertRaises(ValueError):
+            test_function()
+        return self.read_log(logger)
+
+    def test_compact_traceback(self):
+        """
+        The traceback is written with recursion collapsed & capped locals.
+        """
+        log_text = self.run_recursion(self.make_logger(traceback_locals=20), 300)
+        self.assertIn("Traceback (most recent call last)", log_text)
+        self.assertIn("[Previous frame repeated 299 more times]", log_text)
+        self.assertIn("    num = 300", log_text)
+        self.assertIn("ValueError: Just testing failure!", log_text)
+        self.assertLess(log_text.index("Traceback (most recent call last)"),
+                        log_text.index("Log review needed!"))
+
+    def test_rendered_by_writer(self):
+        """
+        With use_queue the traceback is rendered on the writer thread.
+        """
+        from v4_Testing.log_traceback import TracebackSnapshot
+
+        threads = []
+        render = TracebackSnapshot.render
+
+        def record_thread(snapshot):
+            threads.append(threading.current_thread())
+            return render(snapshot)
+
+        with patch.object(TracebackSnapshot, "render", record_thread):
+            log_text = self.run_recursion(self.make_logger(use_queue=True), 5)
+        self.assertIn("ValueError: Just testing failure!", log_text)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+
+class TestRepeatCoalescing(TempLoggerTestCase):
+    """Unit tests for coalescing repeated records of the ConfiguredLogger class."""
+
+    logger_options = {"file_name_in": "Test_Coalescing", "coalesce_repeats": True}
+    propagate = False
+
+    def test_repeats_coalesced(self):
+        """
+        A record repeated in a row is written once, then summed up.
+        """
+        for _ in range(1000):
+            self.logger.logger.warning("Retrying connection to %s", "db")
+        self.logger.logger.info("Connected")
+
+        log_text = self.read_log()
+        self.assertEqual(log_text.count("Retrying connection to db"), 1)
+        self.assertIn("Last message repeated 999 times over ", log_text)
+        self.assertLess(log_text.index("Last message repeated"), log_text.index("Connected"))
+
+    def test_flushed_when_disabled(self):
+        """
+        Repeats still held back are summed up before the end of logs,
+        and nothing is held back once logging is disabled.
+        """
+        for _ in range(10):
+            self.logger.logger.warning("Retrying")
+        self.logger.disable_all_logging()
+
+        log_text = self.read_log()
+        self.assertLess(log_text.index("Last message repeated 9 times"),
+                        log_text.index("=== Ending of Logs ==="))
+        self.assertNotIn(self.logger.repeat_filter, self.logger.logger.filters)
+
+
+class TestEmailLogging(TempLoggerTestCase):
+    """Unit tests for emailing the logs of the ConfiguredLogger class."""
+
+    propagate = False
+
+    def setUp(self):
+        super().setUp()
+        self.smtp = FakeSMTP()
+
+    def make_logger(self, **kwargs):
+        logger = super().make_logger(file_name_in="Test_Email",
+                                     file_mode="a",
+                                     email_to=("ops@example.com",),
+                                     email_settings={"smtp_factory": self.smtp,
+                                                     "batch_interval": 60},
+                                     **kwargs)
+        self.addCleanup(logger.stop_email)
+        return logger
+
+    def attachment_text(self, message) -> str:
+        attachment = next(message.iter_attachments())
+        return gzip.decompress(attachment.get_content()).decode("utf-8")
+
+    def run_failing(self, logger):
+        @logger.sol_wrapper()
+        @logger.func_wrapper
+        def main():
+            logger.logger.debug("Working ...")
+            raise ValueError("Just testing failure!")
+
+        main()
+        # as at exit
+        logger.stop_email()
+
+    def test_review_and_run_end(self):
+        """
+        A log review & the end of the run are sent in one email
+        with the log of the run attached - not of earlier runs.
+        """
+        self.make_logger().disable_all_logging()
+        self.run_failing(self.make_logger())
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        message = self.smtp.messages[0]
+        body = message.get_body().get_content()
+        self.assertIn("Log review needed - ValueError in ", body)
+        self.assertIn("Run ended - ", body)
+        log_text = self.attachment_text(message)
+        self.assertEqual(log_text.count("=== Starting of Logs ==="), 1)
+        self.assertIn("Working ...", log_text)
+        self.assertIn("=== Ending of Logs ===", log_text)
+
+    def test_errors_only(self):
+        """
+        With email_content="errors" only ERROR records & worse are attached.
+        """
+        self.run_failing(self.make_logger(email_content="errors"))
+
+        message = self.smtp.messages[0]
+        self.assertTrue(next(message.iter_attachments()).get_filename()
+                        .endswith("_Test_Email_errors.log.gz"))
+        log_text = self.attachment_text(message)
+        self.assertIn("Traceback (most recent call last)", log_text)
+        self.assertIn("Log review needed!", log_text)
+        self.assertNotIn("Working ...", log_text)
+
+    def test_repeated_reviews(self):
+        """
+        A failure repeated over & over is only emailed once.
+        """
+        logger = self.make_logger()
+
+        @logger.func_wrapper
+        def test_function():
+            raise ValueError("Just testing failure!")
+
+        for _ in range(5):
+            with self.assertRaises(ValueError):
+                test_function()
+        logger.disable_all_logging()
+        logger.stop_email()
+
+        body = self.smtp.messages[0].get_body().get_content()
+        self.assertEqual(body.count("Log review needed"), 1)
+
+    def test_never_waits_on_smtp(self):
+        """
+        Ending the run returns straight away while the server refuses
+        connections, and alerts after disabling logging are still sent.
+        """
+        self.smtp.failures = 3
+        logger = self.make_logger(email_exit_timeout=10)
+        logger.mailer.retry_delay = 0.1
+
+        @logger.sol_wrapper(using_exit=True)
+        @logger.func_wrapper
+        def main():
+            raise ValueError("Just testing failure!")
+
+        started = time.perf_counter()
+        main()
+        logger.disable_all_logging()
+        self.assertLess(time.perf_counter() - started, 1)
+
+        logger.email_logs("After disabling logging")
+        self.assertTrue(logger.mailer.close(10))
+        body = "".join(message.get_body().get_content() for message in self.smtp.messages)
+        self.assertIn("Run ended - ", body)
+        self.assertIn("After disabling logging", body)
+
+
+class TestEffectiveLevel(TempLoggerTestCase):
+    """Unit tests for the cached effective level of the ConfiguredLogger class."""
+
+    logger_options = {"file_name_in": "Test_Level_File", "init_console_setup": 1}
+    # keep handlers of the test runner out of the picture
+    propagate = False
+
+    def setUp(self):
+        super().setUp()
+        self.logger.refresh_effective_level()
+
+    def test_refreshed_by_setters(self):
+        """
+        Level setters and enable / disable methods refresh the cached level.
+        """
+        self.assertEqual(self.logger.effective_lvl, logging.DEBUG)
+
+        self.logger.set_file_level(logging.INFO)
+        self.assertEqual(self.logger.effective_lvl, logging.INFO)
+
+        self.logger.disable_file_logging()
+        self.assertEqual(self.logger.effective_lvl, logging.WARNING)
+
+        self.logger.set_console_level(logging.ERROR)
+        self.assertEqual(self.logger.effective_lvl, logging.ERROR)
+
+        self.logger.enable_file_logging()
+        self.assertEqual(self.logger.effective_lvl, logging.INFO)
+
+    def test_skips_records_when_debug_off(self):
+        """
+        No start / end records are built when nothing would accept them.
+        """
+        @self.logger.func_wrapper
+        def test_function(value):
+            return value * 2
+
+        self.logger.set_file_level(logging.WARNING)
+        with patch.object(self.logger.logger, "debug") as debug_mock:
+            self.assertEqual(test_function(21), 42)
+        debug_mock.assert_not_called()
+
+    def test_exception_logged_when_debug_off(self):
+        """
+        Exceptions are still logged when the start / end records are skipped.
+        """
+        @self.logger.func_wrapper
+        def test_function():
+            raise ValueError("Just testing failure!")
+
+        self.logger.set_file_level(logging.WARNING)
+        with self.assertRaises(ValueError):
+            test_function()
+        self.logger.flush_file_logging()
+
+        log_text = self.read_log()
+        self.assertIn("ValueError: Just testing failure!", log_text)
+        self.assertIn("Log review needed!", log_text)
+        self.assertNotIn("Starting:", log_text)
+
+    def test_shared_with_other_instances(self):
+        """
+        Handlers added or removed by another instance refresh this one too.
+        """
+        self.logger.set_file_level(logging.WARNING)
+        self.logger.set_console_level(logging.WARNING)
+
+        @self.logger.func_wrapper
+        def test_function():
+            pass
+
+        other = self.make_logger(file_name_in="Test_Level_Other_File")
+        self.assertEqual(self.logger.effective_lvl, logging.DEBUG)
+        test_function()
+        other.disable_file_logging()
+        self.assertEqual(self.logger.effective_lvl, logging.WARNING)
+
+        self.assertIn("Starting:", self.read_log(other))
+
+
+class TestCallerInfo(TempLoggerTestCase):
+    """Unit tests for the caller info of the func_wrapper records."""
+
+    logger_options = {"file_name_in": "Test_Caller_File"}
+
+    def test_get_caller_info(self):
+        """
+        Caller info comes from the code object of the unwrapped function.
+        """
+        def test_function():
+            pass
+
+        code = test_function.__code__
+        expected = (code.co_filename, code.co_firstlineno, "test_function")
+        self.assertEqual(get_caller_info(test_function), expected)
+        self.assertEqual(get_caller_info(self.logger.func_wrapper(test_function)),
+                         expected)
+        self.assertIsNone(get_caller_info(len))
+
+    def test_records_report_wrapped_function(self):
+        """
+        Start / end records report the wrapped function without walking the stack.
+        """
+        @self.logger.func_wrapper
+        def test_function():
+            pass
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            with patch.object(self.logger.logger, "findCaller") as find_caller_mock:
+                test_function()
+        find_caller_mock.assert_not_called()
+
+        code = test_function.__wrapped__.__code__
+        for record in log.records:
+            self.assertEqual(record.funcName, "test_function")
+            self.assertEqual(record.lineno, code.co_firstlineno)
+            self.assertEqual(record.pathname, code.co_filename)
+            self.assertEqual(record.filename, "test_log_helper_class.py")
+
+
+class TestSampledFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the sampling options of the func_wrapper method."""
+
+    logger_options = {"file_name_in": "Test_Sampled_File"}
+
+    def test_sample_every(self):
+        """
+        Only sampled calls get start / end records and a summary
+        of the calls left out is logged when logging is disabled.
+        """
+        @self.logger.func_wrapper(sample_every=4)
+        def test_function():
+            pass
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            for _ in range(10):
+                test_function()
+            self.logger.log_call_summaries()
+
+        messages = [record.getMessage() for record in log.records]
+        module_name = f"{test_function.__module__}.test_function"
+        self.assertEqual(messages.count(f"Starting:\t{module_name}"), 3)
+        self.assertEqual(messages.count(f"Ending:\t{module_name}"), 3)
+        self.assertEqual(messages[-1], f"Suppressed 7 call records of {module_name}")
+
+    def test_periodic_summary(self):
+        """
+        The calls left out are summarised once the summary interval passes.
+        """
+        @self.logger.func_wrapper(first_n=1, summary_interval=0)
+        def test_function():
+            pass
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            test_function()
+            test_function()
+            test_function()
+
+        messages = [record.getMessage() for record in log.records]
+        module_name = f"{test_function.__module__}.test_function"
+        self.assertEqual(messages,
+                         [f"Starting:\t{module_name}",
+                          f"Ending:\t{module_name}",
+                          f"Suppressed 1 call records of {module_name}",
+                          f"Suppressed 1 call records of {module_name}"])
+
+    def test_exceptions_always_logged(self):
+        """
+        Exceptions of sampled out calls are still logged in full.
+        """
+        @self.logger.func_wrapper(first_n=1)
+        def test_function(fail):
+            if fail:
+                raise ValueError("Just testing failure!")
+
+        test_function(False)
+        with self.assertLogs(self.logger.logger, level="ERROR") as log:
+            with self.assertRaises(ValueError):
+                test_function(True)
+        self.assertIn("ValueError: Just testing failure!", log.output[0])
+
+
+class TestProfiledFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the profiling options of the func_wrapper method."""
+
+    logger_options = {"file_name_in": "Test_Profiled_File"}
+
+    def test_slow_calls_logged(self):
+        """
+        The profile of sampled calls over the threshold is logged at INFO.
+        """
+        def slow_part(num):
+            return sum(range(num))
+
+        @self.logger.func_wrapper(profile_every=2, profile_threshold=0.01, profile_top=5)
+        def test_function(num):
+            return slow_part(num)
+
+        with self.assertLogs(self.logger.logger, level="INFO") as log:
+            test_function(10)
+            for _ in range(4):
+                test_function(3_000_000)
+
+        self.assertEqual(len(log.records), 2)
+        message = log.records[0].getMessage()
+        self.assertRegex(message, r"^Slow call of .*\.test_function took \S+ - "
+                                  r"top 5 functions by cumulative time:\n")
+        self.assertIn("slow_part", message)
+        self.assertEqual(log.records[0].funcName, "test_function")
+
+    def test_dumped_next_to_log(self):
+        """
+        With profile_dump the profile is written to a '.pstats' file.
+        """
+        import pstats
+
+        @self.logger.func_wrapper(profile_every=1, profile_threshold=0, profile_dump=True)
+        def test_function():
+            return sorted(range(1000))
+
+        self.logger.set_file_level(logging.WARNING)
+        test_function()
+        dumps = [name for name in os.listdir(self.tmp_dir.name) if name.endswith(".pstats")]
+        self.assertEqual(len(dumps), 1)
+        self.assertIn("_Test_Profiled_File_test_function_", dumps[0])
+        stats = pstats.Stats(os.path.join(self.tmp_dir.name, dumps[0]))
+        self.assertTrue(any(name[2] == "test_function" for name in stats.stats))
+
+    def test_plain_functions_only(self):
+        """
+        Coroutines & generators cannot be profiled.
+        """
+        async def test_coroutine():
+            pass
+
+        with self.assertRaises(ValueError):
+            self.logger.func_wrapper(test_coroutine, profile_every=1)
+
+
+class TestMemoryTrackedFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the memory tracking options of the func_wrapper method."""
+
+    logger_options = {"file_name_in": "Test_Memory_File"}
+
+    def setUp(self):
+        super().setUp()
+        self.logger.set_file_level(logging.INFO)
+
+    def test_leak_reported(self):
+        """
+        Calls leaving memory allocated over the threshold log where it was allocated.
+        """
+        kept = []
+
+        @self.logger.func_wrapper(track_memory=True, memory_threshold=500_000, memory_top=3)
+        def test_function():
+            kept.append(bytearray(100_000))
+
+        with self.assertLogs(self.logger.logger, level="WARNING") as log:
+            for _ in range(8):
+                test_function()
+
+        self.assertEqual(len(log.records), 1)
+        message = log.records[0].getMessage()
+        self.assertRegex(message, r"^Calls of .*\.test_function left \S+ allocated - "
+                                  r"top \d allocation sites grown since the last report:\n")
+        self.assertIn(f"{__file__}:", message)
+        self.assertEqual(log.records[0].funcName, "test_function")
+
+    def test_summary_logged(self):
+        """
+        The memory taken by the calls is summarised when logging is disabled.
+        """
+        @self.logger.func_wrapper(track_memory=True, memory_threshold=0)
+        def test_function():
+            return len(bytearray(1_000_000))
+
+        for _ in range(3):
+            test_function()
+        with self.assertLogs(self.logger.logger, level="INFO") as log:
+            self.logger.log_call_summaries()
+        self.assertEqual(len(log.records), 1)
+        self.assertRegex(log.records[0].getMessage(),
+                         r"^Memory of .*\.test_function over 3 calls:\t"
+                         r"net \S+ \| mean net \S+ \| max net \S+ \| max peak 9\d\dKiB$")
+
+    def test_sol_wrapper_summary(self):
+        """
+        The summary is logged at the end of the run.
+        """
+        @self.logger.func_wrapper(track_memory=True)
+        def test_function():
+            return [None] * 1000
+
+        @self.logger.sol_wrapper(using_exit=False)
+        def main():
+            test_function()
+
+        main()
+        text = self.read_log()
+        self.assertIn(".test_function over 1 calls:", text)
+
+    def test_plain_functions_only(self):
+        """
+        The memory of coroutines & generators cannot be tracked.
+        """
+        def test_generator():
+            yield 1
+
+        with self.assertRaises(ValueError):
+            self.logger.func_wrapper(test_generator, track_memory=True)
+
+
+class TestTimedFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the timing option of the func_wrapper method."""
+
+    logger_options = {"file_name_in": "Test_Timed_File"}
+
+    def test_summary_instead_of_start_end(self):
+        """
+        Timed calls log one summary instead of start / end records.
+        """
+        @self.logger.func_wrapper(timing=True)
+        def test_function():
+            pass
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            for _ in range(5):
+                test_function()
+            self.logger.log_call_summaries()
+
+        self.assertEqual(len(log.records), 1)
+        self.assertEqual(log.records[0].levelno, logging.INFO)
+        self.assertEqual(log.records[0].funcName, "test_function")
+        self.assertRegex(log.records[0].getMessage(),
+                         r"^Timing of .*\.test_function over 5 calls:\t"
+                         r"min \S+ \| mean \S+ \| p50 \S+ \| p95 \S+ \| p99 \S+ \| max \S+$")
+
+    def test_summary_on_exit(self):
+        """
+        Leaving a 'with' block writes the timing summaries to file.
+        """
+        @self.logger.func_wrapper(timing=True)
+        def test_function():
+            pass
+
+        with self.logger:
+            test_function()
+
+        log_text = self.read_log()
+        self.assertIn("test_function over 1 calls", log_text)
+        self.assertNotIn("Starting:", log_text)
+
+    def test_periodic_summary(self):
+        """
+        A summary is logged once the summary interval passes, then starts over.
+        """
+        @self.logger.func_wrapper(timing=True, summary_interval=0)
+        def test_function():
+            pass
+
+        with self.assertLogs(self.logger.logger, level="INFO") as log:
+            test_function()
+            test_function()
+        self.assertEqual(len(log.records), 2)
+        for record in log.records:
+            self.assertIn("over 1 calls", record.getMessage())
+
+
+class TestAsyncFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the wrappers of 'async def' functions."""
+
+    logger_options = {"file_name_in": "Test_Async_File"}
+
+    def test_coroutine_function(self):
+        """
+        The end of a coroutine is logged once it has been awaited.
+        """
+        @self.logger.func_wrapper
+        async def test_function(value):
+            await asyncio.sleep(0)
+            self.logger.logger.debug("Awaited")
+            return value
+
+        self.assertTrue(inspect.iscoroutinefunction(test_function))
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            self.assertEqual(asyncio.run(test_function(42)), 42)
+
+        module_name = f"{test_function.__module__}.test_function"
+        self.assertEqual([record.getMessage() for record in log.records],
+                         [f"Starting:\t{module_name}",
+                          "Awaited",
+                          f"Ending:\t{module_name}"])
+
+    def test_coroutine_function_exception(self):
+        """
+        Exceptions raised while awaiting are logged with their traceback.
+        """
+        @self.logger.func_wrapper
+        async def test_function():
+            await asyncio.sleep(0)
+            raise ValueError("Just testing failure!")
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            with self.assertRaises(ValueError):
+                asyncio.run(test_function())
+
+        messages = [record.getMessage() for record in log.records]
+        self.assertIn("ValueError: Just testing failure!", messages[2])
+        self.assertTrue(messages[-2].startswith("Log review needed!"))
+        self.assertTrue(messages[-1].startswith("Ending:"))
+
+    def test_async_gen_function(self):
+        """
+        Async generators are logged around their iteration,
+        with sent values passed on.
+        """
+        @self.logger.func_wrapper
+        async def test_function():
+            received = yield 1
+            yield received * 2
+
+        async def run():
+            agen = test_function()
+            first = await agen.__anext__()
+            second = await agen.asend(21)
+            with self.assertRaises(StopAsyncIteration):
+                await agen.__anext__()
+            return first, second
+
+        self.assertTrue(inspect.isasyncgenfunction(test_function))
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            self.assertEqual(asyncio.run(run()), (1, 42))
+
+        module_name = f"{test_function.__module__}.test_function"
+        self.assertEqual(log.records[0].getMessage(), f"Starting:\t{module_name}")
+        self.assertRegex(log.records[1].getMessage(),
+                         rf"^Ending:\t{module_name}\texhausted after 2 items, \S+ inside$")
+        self.assertEqual(len(log.records), 2)
+
+    def test_async_gen_function_exception(self):
+        """
+        Exceptions raised while iterating are logged with their traceback.
+        """
+        @self.logger.func_wrapper
+        async def test_function():
+            yield 1
+            raise ValueError("Just testing failure!")
+
+        async def run():
+            return [value async for value in test_function()]
+
+        with self.assertLogs(self.logger.logger, level="ERROR") as log:
+            with self.assertRaises(ValueError):
+                asyncio.run(run())
+        self.assertIn("ValueError: Just testing failure!", log.output[0])
+
+    def test_async_gen_function_debug_off(self):
+        """
+        Nothing is timed or logged when DEBUG is off, but items & sent
+        values still come through, and exceptions are still logged.
+        """
+        @self.logger.func_wrapper
+        async def test_function():
+            received = yield 1
+            yield received * 2
+            raise ValueError("Just testing failure!")
+
+        async def run():
+            agen = test_function()
+            values = [await agen.__anext__(), await agen.asend(21)]
+            with self.assertRaises(ValueError):
+                await agen.__anext__()
+            return values
+
+        self.logger.logger.propagate = False
+        self.addCleanup(setattr, self.logger.logger, "propagate", True)
+        self.logger.set_file_level(logging.WARNING)
+        with patch.object(self.logger, "call_started") as started_mock, \
+                patch.object(self.logger, "log_exception") as log_exception_mock:
+            self.assertEqual(asyncio.run(run()), [1, 42])
+        started_mock.assert_not_called()
+        log_exception_mock.assert_called_once()
+
+    def test_sol_wrapper_coroutine_function(self):
+        """
+        Logs of an asyncio entry point are closed off the event loop thread.
+        """
+        exit_threads = []
+        exit_logger = self.logger.__exit__
+
+        def record_exit(*args):
+            exit_threads.append(threading.current_thread())
+            return exit_logger(*args)
+
+        @self.logger.sol_wrapper(using_exit=False)
+        @self.logger.func_wrapper
+        async def test_function():
+            await asyncio.sleep(0)
+            raise ValueError("Just testing failure!")
+
+        with patch.object(self.logger, "__exit__", side_effect=record_exit):
+            self.assertIsNone(asyncio.run(test_function()))
+
+        self.assertEqual(len(exit_threads), 1)
+        self.assertNotEqual(exit_threads[0], threading.current_thread())
+        self.assertFalse(self.logger.logger.handlers)
+        log_text = self.read_log()
+        self.assertIn("ValueError exception forced script to close ...", log_text)
+        self.assertIn("=== Ending of Logs ===", log_text)
+
+
+class TestGeneratorFunctionDecorator(TempLoggerTestCase):
+    """Unit tests for the wrapper of generator functions."""
+
+    logger_options = {"file_name_in": "Test_Generator_File"}
+
+    def setUp(self):
+        super().setUp()
+        self.produced = []
+
+        @self.logger.func_wrapper
+        def test_function(count):
+            for num in range(count):
+                self.produced.append(num)
+                received = yield num
+                if received is not None:
+                    self.produced.append(received)
+            return "done"
+
+        self.test_function = test_function
+        self.module_name = f"{test_function.__module__}.test_function"
+
+    def test_exhausted(self):
+        """
+        Iteration is logged from the first item until the generator is exhausted.
+        """
+        self.assertTrue(inspect.isgeneratorfunction(self.test_function))
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            gen = self.test_function(3)
+            self.assertFalse(log.records or self.produced)
+
+            self.assertEqual(next(gen), 0)
+            self.assertEqual(len(log.records), 1)
+            self.assertEqual(log.records[0].getMessage(), f"Starting:\t{self.module_name}")
+            # items are produced one at a time - nothing is buffered
+            self.assertEqual(self.produced, [0])
+
+            self.assertEqual(list(gen), [1, 2])
+        self.assertRegex(log.records[1].getMessage(),
+                         rf"^Ending:\t{self.module_name}\texhausted after 3 items, \S+ inside$")
+        self.assertEqual(log.records[1].funcName, "test_function")
+
+    def test_closed(self):
+        """
+        Closing the generator early is logged with the items yielded so far.
+        """
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            gen = self.test_function(10)
+            next(gen)
+            next(gen)
+            gen.close()
+        self.assertRegex(log.records[-1].getMessage(),
+                         rf"^Ending:\t{self.module_name}\tclosed after 2 items")
+        self.assertEqual(self.produced, [0, 1])
+
+    def test_send_and_return_value(self):
+        """
+        Sent values reach the generator and its return value is kept.
+        """
+        gen = self.test_function(2)
+        next(gen)
+        self.assertEqual(gen.send("sent"), 1)
+        with self.assertRaises(StopIteration) as stop:
+            next(gen)
+        self.assertEqual(stop.exception.value, "done")
+        self.assertEqual(self.produced, [0, "sent", 1])
+
+    def test_exception_while_iterating(self):
+        """
+        Exceptions raised while iterating are logged with their traceback.
+        """
+        @self.logger.func_wrapper
+        def failing_function():
+            yield 1
+            raise ValueError("Just testing failure!")
+
+        with self.assertLogs(self.logger.logger, level="DEBUG") as log:
+            with self.assertRaises(ValueError):
+                list(failing_function())
+
+        messages = [record.getMessage() for record in log.records]
+        self.assertTrue(any("ValueError: Just testing failure!" in message
+                            for message in messages))
+        self.assertRegex(messages[-1], r"\tfailed after 1 items")
+
+    def test_debug_off(self):
+        """
+        Nothing is logged when DEBUG is off but items still come through.
+        """
+        self.logger.logger.propagate = False
+        self.logger.set_file_level(logging.WARNING)
+        try:
+            with patch.object(self.logger, "log_as") as log_as_mock:
+                gen = self.test_function(3)
+                self.assertEqual(next(gen), 0)
+                self.assertEqual(gen.send("sent"), 1)
+                self.assertEqual(list(gen), [2])
+            log_as_mock.assert_not_called()
+            self.assertEqual(self.produced, [0, "sent", 1, 2])
+        finally:
+            self.logger.logger.propagate = True
+
+    def test_timing(self):
+        """
+        Timed generators record the time spent inside them.
+        """
+        @self.logger.func_wrapper(timing=True)
+        def timed_function():
+            yield 1
+            yield 2
+
+        self.assertEqual(list(timed_function()), [1, 2])
+        site = self.logger.call_sites[-1]
+        self.assertEqual(site.timer.count, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
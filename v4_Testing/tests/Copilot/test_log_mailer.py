@@ -0,0 +1,186 @@
+'Module to test the email delivery of logs'
+import io
+import gzip
+import time
+import threading
+import unittest
+from unittest.mock import patch
+from v4_Testing.log_mailer import LogMailer
+from v4_Testing.tests.Copilot.fake_smtp import FakeSMTP
+
+
+class TestLogMailer(unittest.TestCase):
+    """Unit tests for the LogMailer class."""
+
+    def make_mailer(self, smtp: FakeSMTP, **kwargs) -> LogMailer:
+        kwargs.setdefault("batch_interval", 0)
+        mailer = LogMailer("ops@example.com", "app@example.com",
+                           smtp_factory=smtp, **kwargs)
+        self.addCleanup(mailer.close, 5)
+        return mailer
+
+    def test_sent(self):
+        """
+        An alert is sent with its file attached, compressed.
+        """
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp)
+        self.assertTrue(mailer.submit("Log review needed", "ValueError: bad",
+                                      lambda: [("app.log", b"line 1\nline 2\n")]))
+        self.assertTrue(mailer.close(5))
+
+        self.assertEqual(len(smtp.messages), 1)
+        message = smtp.messages[0]
+        self.assertEqual(message["Subject"], "Logs: Log review needed")
+        self.assertEqual(message["To"], "ops@example.com")
+        self.assertIn("ValueError: bad", message.get_body().get_content())
+        attachment = next(message.iter_attachments())
+        self.assertEqual(attachment.get_filename(), "app.log.gz")
+        self.assertEqual(gzip.decompress(attachment.get_content()), b"line 1\nline 2\n")
+
+    def test_batched(self):
+        """
+        Alerts close together go out in one email, each file attached once.
+        """
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp, batch_interval=60)
+        for num in range(3):
+            mailer.submit(f"Alert {num}", attachments=lambda num=num: [("app.log", b"%d" % num)])
+        mailer.close(5)
+
+        self.assertEqual(len(smtp.messages), 1)
+        message = smtp.messages[0]
+        self.assertEqual(message["Subject"], "Logs: 3 alerts")
+        body = message.get_body().get_content()
+        for num in range(3):
+            self.assertIn(f"Alert {num}", body)
+        attachments = list(message.iter_attachments())
+        self.assertEqual(len(attachments), 1)
+        # the most recent copy of the file
+        self.assertEqual(gzip.decompress(attachments[0].get_content()), b"2")
+
+    def test_deduplicated(self):
+        """
+        Repeats of an alert are left out for a while, then counted.
+        """
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp, dedupe_interval=60)
+        self.assertTrue(mailer.submit("Failed", key="ValueError"))
+        self.assertFalse(mailer.submit("Failed", key="ValueError"))
+        self.assertFalse(mailer.submit("Failed", key="ValueError"))
+        self.assertTrue(mailer.submit("Other failure", key="KeyError"))
+
+        # as if the interval was over
+        sent_at, repeats = mailer.last_sent["ValueError"]
+        mailer.last_sent["ValueError"] = (sent_at - 60, repeats)
+        self.assertTrue(mailer.submit("Failed again", key="ValueError"))
+        mailer.close(5)
+
+        body = "".join(message.get_body().get_content() for message in smtp.messages)
+        self.assertEqual(body.count("Failed"), 2)
+        self.assertIn("Failed again\n(2 more like it left out)", body)
+        self.assertEqual(mailer.sent, 3)
+
+    def test_retried(self):
+        """
+        Failed deliveries are tried again, backing off, until they give up.
+        """
+        smtp = FakeSMTP(failures=2)
+        mailer = self.make_mailer(smtp, retry_delay=0.01)
+        mailer.submit("Alert")
+        mailer.close(5)
+        self.assertEqual(smtp.connections, 3)
+        self.assertEqual(len(smtp.messages), 1)
+
+        smtp = FakeSMTP(failures=10)
+        mailer = self.make_mailer(smtp, retry_delay=0.01, max_attempts=3)
+        mailer.submit("Alert")
+        mailer.close(5)
+        self.assertEqual(smtp.connections, 3)
+        self.assertEqual(mailer.failed, 1)
+
+    def test_never_blocks(self):
+        """
+        Submitting returns straight away while the server hangs,
+        and close only waits as long as it is told to.
+        """
+        release = threading.Event()
+        smtp = FakeSMTP(release=release)
+        mailer = self.make_mailer(smtp)
+        started = time.perf_counter()
+        for num in range(10):
+            mailer.submit(f"Alert {num}")
+        self.assertFalse(mailer.close(0.1))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertFalse(mailer.submit("After close"))
+
+        release.set()
+        self.assertTrue(mailer.close(5))
+        self.assertEqual(mailer.sent, 10)
+
+    def test_unreadable_attachment(self):
+        """
+        An attachment that cannot be read is noted in the body instead.
+        """
+        def missing():
+            raise FileNotFoundError("app.log")
+
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp)
+        mailer.submit("Alert", attachments=missing)
+        mailer.close(5)
+        message = smtp.messages[0]
+        self.assertIn("attachments could not be read", message.get_body().get_content())
+        self.assertEqual(list(message.iter_attachments()), [])
+
+        def unparsable():
+            raise ValueError("not a log file")
+
+        mailer = self.make_mailer(smtp)
+        mailer.submit("Alert", attachments=unparsable)
+        mailer.close(5)
+        self.assertIn("not a log file", smtp.messages[1].get_body().get_content())
+
+    def test_keeps_going_after_failure(self):
+        """
+        An alert that cannot be sent at all does not stop the ones after it.
+        """
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp)
+        build_message = mailer.build_message
+        broken = threading.Event()
+
+        def build_once_broken(batch):
+            if not broken.is_set():
+                broken.set()
+                raise TypeError("cannot build")
+            return build_message(batch)
+
+        mailer.build_message = build_once_broken
+        with patch("sys.stderr", io.StringIO()) as stderr:
+            mailer.submit("Broken")
+            self.assertTrue(broken.wait(5))
+            mailer.submit("Fine")
+            self.assertTrue(mailer.close(5))
+        self.assertEqual(mailer.failed, 1)
+        self.assertEqual(len(smtp.messages), 1)
+        self.assertIn("Fine", smtp.messages[0].get_body().get_content())
+        self.assertIn("cannot build", stderr.getvalue())
+
+    def test_flush(self):
+        """
+        Flushing sends what is queued straight away & keeps the thread going.
+        """
+        smtp = FakeSMTP()
+        mailer = self.make_mailer(smtp, batch_interval=60)
+        mailer.submit("First")
+        mailer.flush()
+        deadline = time.monotonic() + 5
+        while not smtp.messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(smtp.messages), 1)
+        self.assertTrue(mailer.submit("Second"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+'Module to test the indexed log queries'
+import io
+import os
+import gzip
+import logging
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from v4_Testing import log_query
+from v4_Testing.log_query import LogIndex, LogReader, parse_time
+from v4_Testing.log_formatters import JsonLinesFormatter
+from v4_Testing.log_helper_class import ConfiguredLogger
+
+START = "=== Starting of Logs ==="
+END = "=== Ending of Logs ==="
+
+
+class LogFileTestCase(unittest.TestCase):
+    """Writes log files like ConfiguredLogger's for the tests."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_dir = self.tmp_dir.name
+        self.file_name = os.path.join(self.log_dir, "2024-02-17_app.log")
+        self.formatter = ConfiguredLogger.log_file_format
+        self.created = 1_708_210_680.0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_line(self, msg: str, level: int = logging.DEBUG, func: str = "func_a",
+                  formatter: logging.Formatter = None) -> str:
+        record = logging.LogRecord("app", level, "/src/module_a.py", 12, msg, None, None,
+                                   func=func)
+        self.created += 1
+        record.created = self.created
+        record.msecs = 0.0
+        return (formatter or self.formatter).format(record) + "\n"
+
+    def write_run(self, messages: list, path: str = None, mode: str = "a", **kwargs):
+        """Writes a run of records between the start & end of logs markers."""
+        lines = [self.make_line(START, **kwargs)]
+        lines += [self.make_line(*message, **kwargs) if isinstance(message, tuple)
+                  else self.make_line(message, **kwargs) for message in messages]
+        lines.append(self.make_line(END, **kwargs))
+        with open(path or self.file_name, mode, encoding="utf-8") as log_file:
+            log_file.writelines(lines)
+
+
+
+class TestLogQuery(LogFileTestCase):
+    """Unit tests for the log index & its queries."""
+
+    def messages(self, **conditions) -> list:
+        return [record.message for record in LogIndex(self.log_dir).query(**conditions)]
+
+    def test_query_conditions(self):
+        """
+        Records are found by level, function, time & run.
+        """
+        self.write_run(["one", ("bad one", logging.ERROR)])
+        since = parse_time("0m", now=self.created + 1)
+        self.write_run(["two", ("bad two", logging.CRITICAL, "func_b")])
+
+        self.assertEqual(self.messages(level="error"), ["bad one", "bad two"])
+        self.assertEqual(self.messages(function="func_b"), ["bad two"])
+        self.assertEqual(self.messages(since=since), [START, "two", "bad two", END])
+        self.assertEqual(self.messages(until=since), [START, "one", "bad one", END])
+        self.assertEqual(self.messages(run=1, level="ERROR"), ["bad one"])
+        self.assertEqual(self.messages(run=-1, level="ERROR"), ["bad two"])
+
+    def test_multiline_records(self):
+        """
+        Lines that do not start a record belong to the one before.
+        """
+        self.write_run(["Traceback:\n  File 'a.py'\nValueError: bad", "after"])
+        records = list(LogIndex(self.log_dir).query())
+        self.assertEqual(records[1].message, "Traceback:\n  File 'a.py'\nValueError: bad")
+        self.assertEqual(records[2].message, "after")
+        self.assertEqual(records[2].line, 12)
+        self.assertEqual(records[2].filename, "module_a.py")
+
+    def test_blocks_pruned(self):
+        """
+        Only the blocks that can match are read.
+        """
+        self.write_run([f"row {num}" for num in range(3000)] + [("bad", logging.ERROR)])
+        index = LogIndex(self.log_dir)
+        index.update()
+        self.assertGreater(len(index.files["2024-02-17_app.log"]["blocks"]), 2)
+
+        with patch.object(log_query, "parse_entry", wraps=log_query.parse_entry) as parse:
+            self.assertEqual(self.messages(level="ERROR"), ["bad"])
+        self.assertLess(parse.call_count, 1500)
+
+    def test_incremental_update(self):
+        """
+        Updating parses only what was appended, and the last record -
+        never indexed - is still found while the file is being written.
+        """
+        self.write_run(["one"])
+        index = LogIndex(self.log_dir)
+        self.assertTrue(index.update())
+        self.assertFalse(index.update())
+        end = index.files["2024-02-17_app.log"]["end"]
+
+        with open(self.file_name, "a", encoding="utf-8") as log_file:
+            log_file.write(self.make_line(START) + self.make_line("still writing"))
+        index = LogIndex(self.log_dir)
+        with patch.object(log_query, "parse_entry", wraps=log_query.parse_entry) as parse:
+            records = list(index.query(run=-1))
+        self.assertEqual([record.message for record in records], [START, "still writing"])
+        self.assertEqual(records[-1].run, 2)
+        # the records indexed before are not read again
+        parsed = b"".join(b"".join(call.args[0]) for call in parse.call_args_list)
+        self.assertNotIn(b" one\n", parsed)
+        self.assertGreater(index.files["2024-02-17_app.log"]["end"], end)
+
+    def test_file_rewritten(self):
+        """
+        A file started over is indexed afresh, a deleted one is forgotten.
+        """
+        self.write_run([f"old {num}" for num in range(50)])
+        LogIndex(self.log_dir).update()
+        self.write_run(["new"], mode="w")
+        self.assertEqual(self.messages(), [START, "new", END])
+
+        os.remove(self.file_name)
+        index = LogIndex(self.log_dir)
+        self.assertEqual(list(index.query()), [])
+        self.assertEqual(index.files, {})
+
+    def test_json_lines_and_gzip(self):
+        """
+        JSON lines files & compressed files are read like text ones.
+        """
+        self.write_run(["json", ("bad json", logging.ERROR)],
+                       formatter=JsonLinesFormatter())
+        archive = os.path.join(self.log_dir, "2024-02-16_app.log.gz")
+        with gzip.open(archive, "wt", encoding="utf-8") as log_file:
+            log_file.write(self.make_line("zipped", logging.ERROR, "func_z"))
+            log_file.write(self.make_line("last zipped", logging.ERROR, "func_z"))
+
+        records = list(LogIndex(self.log_dir).query(level="ERROR"))
+        self.assertEqual([record.message for record in records],
+                         ["zipped", "last zipped", "bad json"])
+        self.assertEqual(records[0].function, "func_z")
+        self.assertEqual(records[2].time[:4], "2024")
+
+    def test_logger_output(self):
+        """
+        The files written by ConfiguredLogger are understood.
+        """
+        for _ in range(2):
+            logger = ConfiguredLogger(file_name_in="app",
+                                      file_mode="a",
+                                      log_loc=self.log_dir,
+                                      init_console_setup=0)
+            logger.logger.propagate = False
+            logger.logger.error("Failed %s", "once")
+            logger.disable_all_logging()
+            logger.logger.propagate = True
+
+        records = list(LogIndex(self.log_dir).query(level="ERROR", run=-1))
+        self.assertEqual([record.message for record in records], ["Failed once"])
+        self.assertEqual(records[0].run, 2)
+        self.assertEqual(records[0].function, "test_logger_output")
+
+    def test_wrapped_exception_by_function(self):
+        """
+        The records of an exception caught by func_wrapper are found
+        by the name of the wrapped function.
+        """
+        logger = ConfiguredLogger(file_name_in="app",
+                                  file_mode="w",
+                                  log_loc=self.log_dir,
+                                  init_console_setup=0)
+        logger.logger.propagate = False
+        self.addCleanup(setattr, logger.logger, "propagate", True)
+
+        @logger.func_wrapper
+        def fetch_data():
+            raise ValueError("Just testing failure!")
+
+        with self.assertRaises(ValueError):
+            fetch_data()
+        logger.disable_all_logging()
+
+        records = list(LogIndex(self.log_dir).query(level="ERROR", function="fetch_data"))
+        self.assertEqual([record.level for record in records], ["ERROR", "CRITICAL"])
+        self.assertIn("ValueError: Just testing failure!", records[0].message)
+        self.assertTrue(records[1].message.startswith("Log review needed!"))
+
+    def test_parse_time(self):
+        """
+        Ages count back from now, times are taken as they are.
+        """
+        now = 1_708_210_680.5
+        self.assertEqual(parse_time("1d", now=now),
+                         parse_time("24h", now=now))
+        self.assertLess(parse_time("1h", now=now), parse_time("30m", now=now))
+        self.assertTrue(parse_time("0m", now=now).endswith(",500"))
+        self.assertEqual(parse_time("2024-02-17T23:58"), "2024-02-17 23:58")
+
+    def test_cli(self):
+        """
+        The CLI prints the matching records with their file.
+        """
+        self.write_run([("bad", logging.ERROR, "main"), ("worse", logging.ERROR)])
+        output = io.StringIO()
+        with redirect_stdout(output):
+            log_query.main([self.log_dir, "--level", "ERROR", "--function", "main"])
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("2024-02-17_app.log: "))
+        self.assertTrue(lines[0].endswith(" bad"))
+        self.assertTrue(os.path.exists(os.path.join(self.log_dir, log_query.INDEX_NAME)))
+
+
+class TestLogReader(LogFileTestCase):
+    """Unit tests for reading log files run by run."""
+
+    def read(self, run: int = None) -> list:
+        with LogReader(self.file_name) as reader:
+            return [record.message for record in reader.records(run)]
+
+    def test_runs(self):
+        """
+        Runs start at each start of logs marker, and end at the next one.
+        """
+        self.write_run(["one", f"quoting {START}"])
+        self.write_run(["two"])
+        with open(self.file_name, "a", encoding="utf-8") as log_file:
+            log_file.write(self.make_line(START) + self.make_line("crashed"))
+
+        with LogReader(self.file_name) as reader:
+            runs = reader.runs
+            self.assertEqual([log_run.number for log_run in runs], [1, 2, 3])
+            self.assertEqual([log_run.ended for log_run in runs], [True, True, False])
+            self.assertEqual(runs[0].start, 0)
+            self.assertEqual(runs[-1].end, os.path.getsize(self.file_name))
+            self.assertEqual(runs[0].end, runs[1].start)
+
+        self.assertEqual(self.read(1), [START, "one", f"quoting {START}", END])
+        self.assertEqual(self.read(2), [START, "two", END])
+        self.assertEqual(self.read(-1), [START, "crashed"])
+        self.assertEqual(len(self.read()), 9)
+
+    def test_records_lazy(self):
+        """
+        Records are parsed as they are iterated over, with their run & offset.
+        """
+        self.write_run(["one"])
+        self.write_run([f"row {num}" for num in range(100)])
+        with LogReader(self.file_name) as reader:
+            self.assertEqual(len(reader.runs), 2)
+            with patch.object(log_query, "parse_entry", wraps=log_query.parse_entry) as parse:
+                records = reader.records(2)
+                first = next(records)
+                self.assertLessEqual(parse.call_count, 2)
+            self.assertEqual(first.run, 2)
+            self.assertEqual(first.offset, reader.run(2).start)
+            self.assertEqual([record.run for record in records], [2] * 101)
+
+    def test_before_first_run(self):
+        """
+        Records before the first marker make up run 0.
+        """
+        with open(self.file_name, "w", encoding="utf-8") as log_file:
+            log_file.write(self.make_line("stray"))
+        self.write_run(["one"])
+        self.assertEqual(self.read(0), ["stray"])
+        self.assertEqual(self.read(-1), [START, "one", END])
+        with self.assertRaises(IndexError):
+            self.read(2)
+
+    def test_empty_file(self):
+        """
+        An empty file has no runs.
+        """
+        open(self.file_name, "w").close()
+        with LogReader(self.file_name) as reader:
+            self.assertEqual(reader.runs, [])
+            self.assertEqual(list(reader.records()), [])
+            with self.assertRaises(IndexError):
+                reader.run(-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+'Module to test the deferred tracebacks'
+import pickle
+import traceback
+import unittest
+from unittest.mock import patch
+from v4_Testing.log_traceback import TracebackSnapshot
+
+
+def recurse(num: int):
+    if num == 0:
+        raise ValueError("Just testing failure!")
+    return recurse(num - 1)
+
+
+def ping(num: int):
+    if num == 0:
+        raise ValueError("Just testing failure!")
+    return pong(num - 1)
+
+
+def pong(num: int):
+    return ping(num)
+
+
+def caught(func, *args) -> BaseException:
+    try:
+        func(*args)
+    except Exception as err:
+        return err
+    raise AssertionError("no exception raised")
+
+
+class TestTracebackSnapshot(unittest.TestCase):
+    """Unit tests for the TracebackSnapshot class."""
+
+    def test_same_as_traceback(self):
+        """
+        Without repeats the text has the frames & exception traceback gives.
+        """
+        err = caught(recurse, 2)
+        text = str(TracebackSnapshot(err))
+        expected = traceback.format_exception(err)
+        self.assertTrue(text.startswith("Traceback (most recent call last):\n"))
+        self.assertTrue(text.endswith("ValueError: Just testing failure!"))
+        for line in expected[1:-1]:
+            # traceback adds '^^^' markers under the failing expression
+            file_line = line.splitlines()[0]
+            self.assertIn(file_line, text)
+        self.assertEqual(text.count('  File "'), 4)
+
+    def test_recursion_collapsed(self):
+        """
+        A frame repeated by deep recursion is written once.
+        """
+        text = str(TracebackSnapshot(caught(recurse, 500)))
+        self.assertEqual(text.count("in recurse"), 2)
+        self.assertIn("  [Previous frame repeated 499 more times]", text)
+        self.assertLess(len(text), 1000)
+
+    def test_cycle_collapsed(self):
+        """
+        A cycle of frames repeated by mutual recursion is written once.
+        """
+        text = str(TracebackSnapshot(caught(ping, 200)))
+        self.assertIn("  [Previous 2 frames repeated 199 more times]", text)
+        self.assertLess(text.count("in ping"), 4)
+
+    def test_locals_capped(self):
+        """
+        Locals are only shown when asked for, each repr cut to size.
+        """
+        def failing():
+            big_text = "x" * 10_000
+            big_list = list(range(10_000))
+            raise ValueError("Just testing failure!")
+
+        err = caught(failing)
+        self.assertNotIn("big_text", str(TracebackSnapshot(err)))
+        text = str(TracebackSnapshot(err, locals_repr=30))
+        lines = [line.strip() for line in text.splitlines()]
+        big_text = next(line for line in lines if line.startswith("big_text = "))
+        big_list = next(line for line in lines if line.startswith("big_list = "))
+        self.assertEqual(len(big_text), len("big_text = ") + 30)
+        self.assertLessEqual(len(big_list), len("big_list = ") + 30)
+
+    def test_chained(self):
+        """
+        The exception another was raised from comes first.
+        """
+        def failing():
+            try:
+                {}["key"]
+            except KeyError as err:
+                raise ValueError("Just testing failure!") from err
+
+        text = str(TracebackSnapshot(caught(failing)))
+        self.assertLess(text.index("KeyError: 'key'"),
+                        text.index("The above exception was the direct cause"))
+        self.assertTrue(text.endswith("ValueError: Just testing failure!"))
+
+    def test_rendered_once_when_needed(self):
+        """
+        Nothing is rendered until the text is asked for, and only once.
+        """
+        snapshot = TracebackSnapshot(caught(recurse, 3))
+        with patch.object(TracebackSnapshot, "render", wraps=snapshot.render) as render:
+            self.assertEqual(render.call_count, 0)
+            self.assertEqual(str(snapshot), str(snapshot))
+        self.assertEqual(render.call_count, 1)
+
+    def test_pickled_as_text(self):
+        """
+        A snapshot sent to another process arrives as its text.
+        """
+        snapshot = TracebackSnapshot(caught(recurse, 3))
+        self.assertEqual(pickle.loads(pickle.dumps(snapshot)), str(snapshot))
+
+
+if __name__ == "__main__":
+    unittest.main()
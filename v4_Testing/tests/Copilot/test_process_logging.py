@@ -0,0 +1,244 @@
+'Module to test logging from worker processes'
+import os
+import sys
+import queue
+import logging
+import weakref
+import subprocess
+import tempfile
+import unittest
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+import v4_Testing.log_helper_class as log_helper_class
+from v4_Testing.log_helper_class import ConfiguredLogger, configure_worker
+
+FILE_NAME = "Test_Process_File"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# logger of each worker process, built on first use like a module level one
+worker_loggers = {}
+# logger built by the test before the workers are forked
+forked_logger = None
+
+
+def get_worker_logger(log_loc: str) -> ConfiguredLogger:
+    if log_loc not in worker_loggers:
+        worker_loggers[log_loc] = ConfiguredLogger(file_name_in=FILE_NAME,
+                                                   file_mode="w",
+                                                   log_loc=log_loc,
+                                                   init_console_setup=0)
+    return worker_loggers[log_loc]
+
+
+def square_in_worker(logger_obj: ConfiguredLogger, value: int) -> int:
+    @logger_obj.func_wrapper
+    def square(num):
+        logger_obj.logger.debug("Squaring %s in %s", num, os.getpid())
+        return num * num
+
+    return square(value)
+
+
+def spawned_task(log_loc: str, value: int) -> int:
+    return square_in_worker(get_worker_logger(log_loc), value)
+
+
+def forked_task(value: int) -> int:
+    return square_in_worker(forked_logger, value)
+
+
+class TestProcessLogging(unittest.TestCase):
+    """Unit tests for logging from worker processes through the parent."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.logger = ConfiguredLogger(file_name_in=FILE_NAME,
+                                       file_mode="w",
+                                       log_loc=self.tmp_dir.name,
+                                       init_console_setup=0)
+        self.logger.logger.propagate = False
+
+    def tearDown(self):
+        global forked_logger
+        forked_logger = None
+        self.logger.disable_all_logging()
+        self.logger.logger.propagate = True
+        self.tmp_dir.cleanup()
+
+    def read_log(self):
+        with open(self.logger.file_name_out, encoding="utf-8") as log_file:
+            return log_file.read()
+
+    def run_pool(self, method: str, task, *args):
+        context = multiprocessing.get_context(method)
+        log_queue = self.logger.start_process_listener(context)
+        with ProcessPoolExecutor(max_workers=2,
+                                 mp_context=context,
+                                 initializer=configure_worker,
+                                 initargs=(log_queue,)) as pool:
+            results = list(pool.map(task, *args))
+        self.logger.disable_all_logging()
+        return results
+
+    def check_log(self, values: range):
+        log_text = self.read_log()
+        for num in values:
+            self.assertIn(f"Squaring {num} in ", log_text)
+        self.assertEqual(log_text.count("Starting:\t"), len(values))
+        self.assertEqual(log_text.count("Ending:\t"), len(values))
+        # only the parent marks the start & end of logs
+        self.assertEqual(log_text.count("=== Starting of Logs ==="), 1)
+        self.assertEqual(log_text.count("=== Ending of Logs ==="), 1)
+        self.assertTrue(log_text.rstrip().endswith("=== Ending of Logs ==="))
+
+    def test_spawned_workers(self):
+        """
+        Loggers built in spawned workers send their records to the parent.
+        """
+        values = range(20)
+        results = self.run_pool("spawn", spawned_task,
+                                [self.tmp_dir.name] * len(values), values)
+        self.assertEqual(results, [num * num for num in values])
+        self.check_log(values)
+
+    def test_forked_workers(self):
+        """
+        Loggers inherited by forked workers send their records to the parent.
+        """
+        global forked_logger
+        forked_logger = self.logger
+        self.logger.logger.debug("Before the workers")
+        values = range(20)
+        results = self.run_pool("fork", forked_task, values)
+        self.assertEqual(results, [num * num for num in values])
+        self.check_log(values)
+        self.assertEqual(self.read_log().count("Before the workers"), 1)
+
+    def in_worker(self):
+        """
+        Makes this process look like a worker started by
+        a listening process with pid 1, for the rest of the test.
+        """
+        patches = [patch.dict(os.environ, {log_helper_class.PROCESS_LISTENER_ENV: "1"}),
+                   patch("multiprocessing.parent_process", return_value=SimpleNamespace(pid=1)),
+                   patch.object(log_helper_class, "worker_queue", None),
+                   patch.object(ConfiguredLogger, "instances", weakref.WeakValueDictionary())]
+        for context in patches:
+            context.start()
+            self.addCleanup(context.stop)
+
+    def make_worker_logger(self, log_loc: str) -> ConfiguredLogger:
+        worker_logger = ConfiguredLogger(file_name_in=FILE_NAME,
+                                         file_mode="w",
+                                         log_loc=log_loc,
+                                         init_console_setup=0)
+        self.assertTrue(worker_logger.worker)
+        return worker_logger
+
+    def test_held_until_configured(self):
+        """
+        A logger built in a worker before configure_worker runs holds its
+        records in memory, then sends them on to the queue it is given.
+        """
+        worker_dir = os.path.join(self.tmp_dir.name, "worker")
+        log_queue = queue.SimpleQueue()
+        self.in_worker()
+        worker_logger = self.make_worker_logger(worker_dir)
+        worker_logger.logger.debug("Before configure_worker")
+        configure_worker(log_queue)
+        worker_logger.logger.debug("After configure_worker")
+        worker_logger.disable_all_logging()
+
+        messages = []
+        while not log_queue.empty():
+            messages.append(log_queue.get().getMessage())
+        self.assertLess(messages.index("Before configure_worker"),
+                        messages.index("After configure_worker"))
+        self.assertFalse(os.path.exists(worker_dir))
+
+    def test_held_written_without_queue(self):
+        """
+        Records held by a worker never handed a queue are written to its
+        own file in the end, and only the last ones are held.
+        """
+        worker_dir = os.path.join(self.tmp_dir.name, "worker")
+        self.in_worker()
+        with patch.object(log_helper_class, "MAX_HELD_RECORDS", 5):
+            worker_logger = self.make_worker_logger(worker_dir)
+        for num in range(10):
+            worker_logger.logger.debug("Held %s", num)
+        self.assertEqual(len(worker_logger.file_sink.records), 5)
+        worker_logger.disable_all_logging()
+
+        with open(worker_logger.file_name_out, encoding="utf-8") as log_file:
+            log_text = log_file.read()
+        self.assertNotIn("Held 4", log_text)
+        self.assertIn("Held 9", log_text)
+
+    def test_flight_recorder_from_worker(self):
+        """
+        Records dumped by the flight recorder of a worker are written by
+        the parent, however far below its file level they are.
+        """
+        self.logger.set_file_level(logging.WARNING)
+        log_queue = self.logger.start_process_listener()
+        self.in_worker()
+        worker_logger = ConfiguredLogger(file_name_in=FILE_NAME,
+                                         file_mode="w",
+                                         log_loc=os.path.join(self.tmp_dir.name, "worker"),
+                                         init_console_setup=0,
+                                         file_lvl=logging.WARNING,
+                                         flight_recorder=5)
+        configure_worker(log_queue)
+
+        @worker_logger.func_wrapper
+        def test_function():
+            worker_logger.logger.debug("Step done in worker")
+            raise ValueError("Just testing failure!")
+
+        with self.assertRaises(ValueError):
+            test_function()
+        self.logger.stop_process_listener()
+        worker_logger.disable_all_logging()
+
+        log_text = self.read_log()
+        self.assertIn("=== Last 5 records before the exception ===", log_text)
+        self.assertIn("Step done in worker", log_text)
+
+    def test_other_programs_not_workers(self):
+        """
+        A program started by the listening process that is not one of its
+        multiprocessing workers writes its own file.
+        """
+        self.logger.start_process_listener()
+        child_dir = os.path.join(self.tmp_dir.name, "child")
+        code = ("from v4_Testing.log_helper_class import ConfiguredLogger\n"
+                f"logger = ConfiguredLogger(file_name_in={FILE_NAME!r}, log_loc={child_dir!r},\n"
+                "                          init_console_setup=0)\n"
+                "print(logger.worker)\n"
+                "logger.logger.debug('From the child')\n"
+                "logger.disable_all_logging()\n")
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        result = subprocess.run([sys.executable, "-c", code], env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+        self.assertEqual(len(os.listdir(child_dir)), 1)
+
+    def test_listener_stopped(self):
+        """
+        Disabling all logging stops the listener & forgets the listening process.
+        """
+        self.logger.start_process_listener()
+        self.assertEqual(os.environ[log_helper_class.PROCESS_LISTENER_ENV], str(os.getpid()))
+        self.assertFalse(log_helper_class.in_worker_process())
+
+        self.logger.disable_all_logging()
+        self.assertIsNone(self.logger.process_listener)
+        self.assertNotIn(log_helper_class.PROCESS_LISTENER_ENV, os.environ)
+
+
+if __name__ == "__main__":
+    unittest.main()